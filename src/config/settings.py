@@ -6,9 +6,10 @@ from PyQt5.QtWidgets import (QVBoxLayout, QHBoxLayout, QLabel,
                             QCheckBox, QSpinBox, QMessageBox, QTextBrowser,
                             QProgressDialog, QMainWindow)
 from PyQt5.QtCore import QSettings, QDate, Qt, QRegExp
-from PyQt5.QtGui import QRegExpValidator, QTextCharFormat, QColor, QPixmap
+from PyQt5.QtGui import QRegExpValidator, QPixmap
 from core.database import (add_donation_date, get_donation_dates, delete_donation_date, 
-                     get_db_path)
+                     get_db_path, get_db_connection, is_yearly_storage)
+from core.constants import StorageEngine
 import os
 import shutil
 from datetime import datetime
@@ -16,7 +17,10 @@ import sqlite3
 from core.managers.year_manager import YearManager
 from core.logger import logger
 from core.themes import THEMES
-from core.delete_db_logic import get_base_path
+from core.delete_db_logic import get_base_path, get_available_years
+from core.path_resolver import invalidate_paths
+from core.donation_index import get_donation_index, invalidate_donation_dates
+from gui.widgets.calendar_decorator import CalendarDecorator
 
 class SettingsDialog(HemodosDialog):
     def __init__(self, parent=None):
@@ -220,6 +224,28 @@ class SettingsDialog(HemodosDialog):
         
         # Aggiungi il gruppo al layout principale
         layout.addWidget(autosave_group)
+        
+        # Archivio prenotazioni
+        storage_group = QGroupBox("Archivio Prenotazioni")
+        storage_layout = QFormLayout()
+        
+        self.storage_combo = QComboBox()
+        self.storage_combo.addItem("Un database per ogni giorno", StorageEngine.DAILY.value)
+        self.storage_combo.addItem("Un database per anno", StorageEngine.YEARLY.value)
+        if is_yearly_storage():
+            self.storage_combo.setCurrentIndex(1)
+            # La migrazione verso l'archivio annuale non è reversibile da qui
+            self.storage_combo.setEnabled(False)
+        storage_layout.addRow("Modalità:", self.storage_combo)
+        
+        storage_help = QLabel("L'archivio annuale raccoglie tutte le prenotazioni dell'anno "
+                              "in hemodos_AAAA.db. Al salvataggio i database giornalieri "
+                              "esistenti vengono importati automaticamente.")
+        storage_help.setWordWrap(True)
+        storage_layout.addRow(storage_help)
+        
+        storage_group.setLayout(storage_layout)
+        layout.addWidget(storage_group)
         layout.addStretch()
         
         saving_tab.setLayout(layout)
@@ -300,6 +326,13 @@ class SettingsDialog(HemodosDialog):
             self.settings.setValue("cloud_path", self.path_edit.text())
             self.settings.setValue("autosave_enabled", self.autosave_check.isChecked())
             self.settings.setValue("autosave_interval", self.interval_spin.value())
+            invalidate_paths()
+            
+            # Passaggio all'archivio annuale: importa prima i database giornalieri
+            if (self.storage_combo.currentData() == StorageEngine.YEARLY.value
+                    and not is_yearly_storage()):
+                if not self.migrate_to_yearly_storage():
+                    return
             
             # Trova la MainWindow
             main_window = None
@@ -325,6 +358,43 @@ class SettingsDialog(HemodosDialog):
             logger.error(f"Errore durante il salvataggio delle impostazioni: {str(e)}")
             QMessageBox.critical(self, "Errore", f"Errore durante il salvataggio: {str(e)}")
 
+    def migrate_to_yearly_storage(self):
+        """Importa i database giornalieri nell'archivio annuale e lo attiva"""
+        from core.year_store import find_daily_databases, migrate_daily_databases
+        
+        years = get_available_years()
+        total_files = sum(len(find_daily_databases(year)) for year in years)
+        
+        progress = QProgressDialog("Migrazione all'archivio annuale...", None, 0, max(total_files, 1), self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        
+        try:
+            completed = 0
+            for year in years:
+                base = completed
+                migrate_daily_databases(
+                    year,
+                    progress_callback=lambda done, total, base=base: progress.setValue(base + done)
+                )
+                completed += len(find_daily_databases(year))
+            
+            progress.setValue(max(total_files, 1))
+            self.settings.setValue("storage_engine", StorageEngine.YEARLY.value)
+            logger.info("Archivio prenotazioni annuale attivato")
+            return True
+            
+        except Exception as e:
+            progress.cancel()
+            logger.error(f"Errore nella migrazione all'archivio annuale: {str(e)}")
+            QMessageBox.critical(
+                self,
+                "Errore",
+                "Errore nella migrazione all'archivio annuale: "
+                f"{str(e)}\n\nSalvando di nuovo la migrazione riprenderà dal punto di interruzione."
+            )
+            return False
+
     def init_general_tab(self):
         """Inizializza la tab Generali"""
         general_tab = QWidget()
@@ -356,6 +426,7 @@ class SettingsDialog(HemodosDialog):
         # Calendario
         self.donation_calendar = QCalendarWidget()
         self.donation_calendar.setGridVisible(True)
+        self.calendar_decorator = CalendarDecorator(self.donation_calendar, self._saved_dates_for_month)
         left_column.addWidget(self.donation_calendar)
         
         # Pulsanti
@@ -402,26 +473,20 @@ class SettingsDialog(HemodosDialog):
             logger.error(f"Errore nel cambio anno: {str(e)}")
 
     def highlight_saved_dates(self):
-        """Evidenzia le date salvate nel calendario"""
+        """Evidenzia le date salvate nel mese visualizzato dal calendario"""
         try:
-            # Reset formato precedente
-            self.donation_calendar.setDateTextFormat(QDate(), QTextCharFormat())
-            
-            # Formato per le date di donazione
-            highlight_format = QTextCharFormat()
-            highlight_format.setBackground(QColor("#c2fc03"))  # Verde lime
-            highlight_format.setForeground(QColor("#000000"))  # Testo nero
-            
-            # Applica il formato a tutte le date nella lista
-            for i in range(self.donation_dates_list.count()):
-                date_str = self.donation_dates_list.item(i).text()
-                date = QDate.fromString(date_str, "dd/MM/yyyy")
-                if date.isValid():
-                    self.donation_calendar.setDateTextFormat(date, highlight_format)
-                
+            self.calendar_decorator.refresh()
         except Exception as e:
             logger.error(f"Errore nell'evidenziazione delle date: {str(e)}")
 
+    def _saved_dates_for_month(self, year, month):
+        """Date della lista (dd/MM/yyyy) che cadono nel mese indicato, in formato yyyy-MM-dd"""
+        suffix = f"/{month:02d}/{year}"
+        for i in range(self.donation_dates_list.count()):
+            date_str = self.donation_dates_list.item(i).text()
+            if date_str.endswith(suffix):
+                yield QDate.fromString(date_str, "dd/MM/yyyy").toString("yyyy-MM-dd")
+
     def get_current_year(self):
         # Prima prova a ottenere l'anno dal database aperto
         settings = QSettings('Hemodos', 'DatabaseSettings')
@@ -464,17 +529,12 @@ class SettingsDialog(HemodosDialog):
             # Percorso del database delle date di donazione
             db_path = os.path.join(year_path, f"date_donazione_{self.current_year}.db")
             
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            
-            # Crea la tabella se non esiste
-            c.execute('''CREATE TABLE IF NOT EXISTS donation_dates
-                         (date text PRIMARY KEY)''')
-            
-            # Inserisci la data
+            # Inserisci la data (la tabella viene creata all'apertura del database)
             try:
-                c.execute("INSERT INTO donation_dates (date) VALUES (?)", (date_str,))
-                conn.commit()
+                with get_db_connection(db_path) as conn:
+                    conn.execute("INSERT INTO donation_dates (date, year) VALUES (?, ?)",
+                                 (date_str, self.current_year))
+                invalidate_donation_dates(self.current_year)
                 
                 # Aggiorna la lista
                 self.load_donation_dates()
@@ -497,8 +557,6 @@ class SettingsDialog(HemodosDialog):
                     "Questa data è già presente nel calendario donazioni"
                 )
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Errore nell'aggiunta della data di donazione: {str(e)}")
             QMessageBox.critical(
@@ -537,23 +595,20 @@ class SettingsDialog(HemodosDialog):
                 # Rimuovi dal database
                 db_path = get_db_path(selected_date, is_donation_dates=True)
                 
-                conn = sqlite3.connect(db_path)
-                c = conn.cursor()
-                
-                c.execute(
-                    "DELETE FROM donation_dates WHERE date = ?",
-                    (selected_date.toString("yyyy-MM-dd"),)
-                )
-                
-                conn.commit()
-                conn.close()
+                with get_db_connection(db_path) as conn:
+                    conn.execute(
+                        "DELETE FROM donation_dates WHERE date = ?",
+                        (selected_date.toString("yyyy-MM-dd"),)
+                    )
+                invalidate_donation_dates(selected_date.year())
                 
                 # Aggiorna la lista e il calendario
                 self.load_donation_dates()
                 
                 # Aggiorna il calendario principale se esiste
                 if hasattr(self, 'parent') and self.parent:
-                    self.parent.highlight_donation_dates()
+                    if hasattr(self.parent, 'calendar_manager'):
+                        self.parent.calendar_manager.highlight_donation_dates()
                 
                 QMessageBox.information(
                     self,
@@ -575,26 +630,11 @@ class SettingsDialog(HemodosDialog):
             # Pulisci la lista esistente
             self.donation_dates_list.clear()
             
-            # Crea una data fittizia per l'anno selezionato
-            dummy_date = QDate(year, 1, 1)
+            # Le date ordinate vengono dall'indice in memoria
+            dates = get_donation_index().dates(year)
             
-            # Ottieni le date dal database
-            db_path = get_db_path(dummy_date, is_donation_dates=True)
-            
-            if os.path.exists(db_path):
-                conn = sqlite3.connect(db_path)
-                c = conn.cursor()
-                
-                # Crea la tabella se non esiste
-                c.execute('''CREATE TABLE IF NOT EXISTS donation_dates
-                             (date text PRIMARY KEY)''')
-                
-                # Ottieni le date ordinate
-                c.execute("SELECT date FROM donation_dates ORDER BY date")
-                dates = c.fetchall()
-                
-                for date_tuple in dates:
-                    date_str = date_tuple[0]
+            if dates:
+                for date_str in dates:
                     date = QDate.fromString(date_str, "yyyy-MM-dd")
                     if date.isValid():
                         # Aggiungi alla lista formattata
@@ -602,8 +642,6 @@ class SettingsDialog(HemodosDialog):
                             date.toString("dd/MM/yyyy")
                         )
                 
-                conn.close()
-                
                 # Evidenzia le date nel calendario
                 self.highlight_saved_dates()
                 
@@ -723,14 +761,7 @@ class SettingsDialog(HemodosDialog):
             self.years_list.clear()
             
             # Ottieni il percorso base
-            settings = QSettings('Hemodos', 'DatabaseSettings')
-            service = settings.value("cloud_service", "Locale")
-            
-            if service == "Locale":
-                base_path = os.path.expanduser("~/Documents/Hemodos")
-            else:
-                cloud_path = settings.value("cloud_path", "")
-                base_path = os.path.join(cloud_path, "Hemodos")
+            base_path = get_base_path()
             
             if os.path.exists(base_path):
                 years = []
@@ -793,30 +824,14 @@ class SettingsDialog(HemodosDialog):
             # Pulisci la lista esistente
             self.donation_dates_list.clear()
             
-            # Ottieni le date dal database
-            db_path = os.path.join(
-                os.path.dirname(get_db_path()),
-                str(self.current_year),
-                f"date_donazione_{self.current_year}.db"
-            )
-            
-            if os.path.exists(db_path):
-                conn = sqlite3.connect(db_path)
-                c = conn.cursor()
-                
-                c.execute("SELECT date FROM donation_dates ORDER BY date")
-                dates = c.fetchall()
-                
-                for date_tuple in dates:
-                    date_str = date_tuple[0]
-                    date = QDate.fromString(date_str, "yyyy-MM-dd")
-                    if date.isValid():
-                        # Aggiungi alla lista formattata
-                        self.donation_dates_list.addItem(
-                            date.toString("dd/MM/yyyy")
-                        )
-                
-                conn.close()
+            # Le date ordinate vengono dall'indice in memoria
+            for date_str in get_donation_index().dates(self.current_year):
+                date = QDate.fromString(date_str, "yyyy-MM-dd")
+                if date.isValid():
+                    # Aggiungi alla lista formattata
+                    self.donation_dates_list.addItem(
+                        date.toString("dd/MM/yyyy")
+                    )
                 
             # Evidenzia le date nel calendario
             self.highlight_saved_dates()
@@ -0,0 +1,160 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from core.database import get_db_connection, get_year_db_path, is_yearly_storage
+from core.delete_db_logic import get_available_years
+from core.path_resolver import get_path_resolver
+from core.statistics import SCAN_WORKERS
+from core.logger import logger
+
+# Codici numerici degli stati, assegnati direttamente nella query
+STATUS_CODES = {
+    "Non effettuata": 0,
+    "Sì": 1,
+    "No": 2,
+    "Non presentato": 3,
+    "Donazione interrotta": 4,
+}
+STATUS_DONE = STATUS_CODES["Sì"]
+STATUS_NO_SHOW = STATUS_CODES["Non presentato"]
+
+_STATUS_SQL = "CASE stato " + " ".join(
+    f"WHEN '{stato}' THEN {code}" for stato, code in STATUS_CODES.items()
+) + " ELSE -1 END"
+
+# Colonne lette per ogni prenotazione: minuti dall'inizio del giorno, prima donazione, stato
+_COLUMNS_SQL = f"""CAST(substr(time, 1, 2) AS INTEGER) * 60 + CAST(substr(time, 4, 2) AS INTEGER),
+                   COALESCE(first_donation, 0),
+                   {_STATUS_SQL}"""
+
+class ReservationColumns:
+    """Prenotazioni di più anni in array NumPy, una colonna per campo
+
+    Contiene solo le prenotazioni con nome o cognome. date è l'intero
+    yyyymmdd, slot i minuti dalla mezzanotte dell'orario.
+    """
+    def __init__(self, date, slot, first, status):
+        self.date = date
+        self.slot = slot
+        self.first = first
+        self.status = status
+        self.year = date // 10000
+        self.month = (date // 100) % 100
+
+    def __len__(self):
+        return len(self.date)
+
+def _read_day_file(db_path, date_int):
+    with get_db_connection(db_path) as conn:
+        rows = conn.execute(f"""SELECT {date_int}, {_COLUMNS_SQL}
+                                FROM reservations
+                                WHERE name != '' OR surname != ''""").fetchall()
+    return np.array(rows, dtype=np.int32).reshape(-1, 4)
+
+def _read_year_table(year):
+    with get_db_connection(get_year_db_path(year)) as conn:
+        rows = conn.execute(f"""SELECT CAST(replace(date, '-', '') AS INTEGER), {_COLUMNS_SQL}
+                                FROM reservations
+                                WHERE (name != '' OR surname != '')
+                                  AND date BETWEEN ? AND ?""",
+                            (f"{year}-01-01", f"{year}-12-31")).fetchall()
+    return np.array(rows, dtype=np.int32).reshape(-1, 4)
+
+def _year_sources(year):
+    """Letture da eseguire per un anno: (funzione, argomenti)"""
+    if is_yearly_storage():
+        return [(_read_year_table, (year,))]
+
+    year_path = get_path_resolver().year_path(year, create=False)
+    sources = []
+    for filename in os.listdir(year_path):
+        if filename.startswith("prenotazioni_") and filename.endswith(".db"):
+            day, month = filename[len("prenotazioni_"):-len(".db")].split("_")
+            date_int = int(year) * 10000 + int(month) * 100 + int(day)
+            sources.append((_read_day_file, (os.path.join(year_path, filename), date_int)))
+    return sources
+
+def load_reservation_columns(years=None):
+    """Carica le prenotazioni di tutti gli anni (o di quelli indicati)
+
+    I file vengono letti in parallelo; ogni file produce già un blocco di
+    righe numeriche e i blocchi vengono concatenati una volta sola.
+    """
+    years = sorted(years) if years else sorted(get_available_years())
+    sources = [source for year in years for source in _year_sources(year)]
+
+    blocks = []
+    if sources:
+        with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(sources))) as executor:
+            futures = [executor.submit(read, *args) for read, args in sources]
+            for future in futures:
+                try:
+                    blocks.append(future.result())
+                except Exception as e:
+                    logger.error(f"Errore nella lettura dei dati per le analisi: {str(e)}")
+
+    data = np.concatenate(blocks) if blocks else np.empty((0, 4), dtype=np.int32)
+    return ReservationColumns(
+        date=data[:, 0],
+        slot=data[:, 1],
+        first=data[:, 2].astype(bool),
+        status=data[:, 3],
+    )
+
+def _ratio(numerator, denominator):
+    """Rapporto elemento per elemento, 0 dove il denominatore è 0"""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+def yearly_trend(columns):
+    """Andamento per anno
+
+    Returns:
+        dict di array allineati: years, donation_days, bookings, donations,
+        donations_per_day, first_ratio (prime donazioni sulle effettuate)
+    """
+    years, year_index = np.unique(columns.year, return_inverse=True)
+    done = columns.status == STATUS_DONE
+
+    bookings = np.bincount(year_index, minlength=len(years))
+    donations = np.bincount(year_index, weights=done, minlength=len(years))
+    first_donations = np.bincount(year_index, weights=done & columns.first, minlength=len(years))
+
+    # Giorni di donazione: date distinte con almeno una prenotazione
+    day_years = np.unique(columns.date) // 10000
+    donation_days = np.bincount(np.searchsorted(years, day_years), minlength=len(years))
+
+    return {
+        "years": years,
+        "donation_days": donation_days,
+        "bookings": bookings,
+        "donations": donations.astype(int),
+        "donations_per_day": _ratio(donations, donation_days),
+        "first_ratio": _ratio(first_donations, donations),
+    }
+
+def no_show_by_slot(columns):
+    """Percentuale di mancate presentazioni per orario, su tutti gli anni
+
+    Returns:
+        (slots, rates): minuti dalla mezzanotte e quota di "Non presentato"
+    """
+    slots, slot_index = np.unique(columns.slot, return_inverse=True)
+    bookings = np.bincount(slot_index, minlength=len(slots))
+    no_shows = np.bincount(slot_index, weights=columns.status == STATUS_NO_SHOW, minlength=len(slots))
+    return slots, _ratio(no_shows, bookings)
+
+def no_show_by_month(columns):
+    """Percentuale di mancate presentazioni per mese (1-12), su tutti gli anni"""
+    bookings = np.bincount(columns.month, minlength=13)[1:13]
+    no_shows = np.bincount(columns.month, weights=columns.status == STATUS_NO_SHOW, minlength=13)[1:13]
+    return np.arange(1, 13), _ratio(no_shows, bookings)
+
+class TrendAnalytics:
+    """Analisi pluriennali calcolate una sola volta per la scheda Trend"""
+    def __init__(self, years=None):
+        self.columns = load_reservation_columns(years)
+        self.yearly = yearly_trend(self.columns)
+        self.slots, self.slot_no_show = no_show_by_slot(self.columns)
+        self.months, self.month_no_show = no_show_by_month(self.columns)
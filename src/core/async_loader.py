@@ -1,36 +1,12 @@
 from PyQt5.QtCore import QThread, pyqtSignal
-from core.database import get_reservations, init_db, get_db_path
+from core.database import get_reservations, init_db, _get_day_scope
+from core.cache import ReservationCache
 import os
 from datetime import datetime
 from core.logger import logger
 
-class DatabaseCache:
-    """Cache per i dati del database"""
-    _instance = None
-    _cache = {}
-    _max_size = 10  # Numero massimo di date in cache
-    
-    @classmethod
-    def get_instance(cls):
-        if cls._instance is None:
-            cls._instance = DatabaseCache()
-        return cls._instance
-    
-    def get(self, date_key):
-        """Ottiene i dati dalla cache"""
-        return self._cache.get(date_key)
-    
-    def set(self, date_key, data):
-        """Salva i dati in cache"""
-        # Rimuovi elementi vecchi se la cache è piena
-        if len(self._cache) >= self._max_size:
-            oldest_key = next(iter(self._cache))
-            del self._cache[oldest_key]
-        self._cache[date_key] = data
-    
-    def clear(self):
-        """Pulisce la cache"""
-        self._cache.clear()
+# La cache delle prenotazioni è in core.cache; il nome resta per compatibilità
+DatabaseCache = ReservationCache
 
 class DatabaseLoader(QThread):
     loading_started = pyqtSignal()
@@ -38,9 +14,11 @@ class DatabaseLoader(QThread):
     loading_error = pyqtSignal(str)
     progress_updated = pyqtSignal(int)
     
-    def __init__(self, selected_date):
+    def __init__(self, selected_date, create_missing=True):
         super().__init__()
         self.selected_date = selected_date
+        # Il prefetch non deve creare database per i giorni mai aperti
+        self.create_missing = create_missing
         self.cache = DatabaseCache.get_instance()
         
     def run(self):
@@ -48,31 +26,19 @@ class DatabaseLoader(QThread):
             self.loading_started.emit()
             self.progress_updated.emit(10)
             
-            # Verifica se i dati sono in cache
-            date_key = self.selected_date.toString("yyyy-MM-dd")
-            cached_data = self.cache.get(date_key)
-            
-            if cached_data:
-                logger.info(f"Dati recuperati dalla cache per {date_key}")
-                self.progress_updated.emit(90)
-                self.loading_finished.emit(cached_data)
-                self.progress_updated.emit(100)
-                return
-            
-            # Se non in cache, carica dal database
-            db_path = get_db_path(self.selected_date)
-            if not os.path.exists(db_path):
+            # Crea il database del giorno se non esiste ancora (con l'archivio
+            # annuale è hemodos_YYYY.db: nessun file giornaliero)
+            db_path, _ = _get_day_scope(self.selected_date)
+            if self.create_missing and not os.path.exists(db_path):
                 self.progress_updated.emit(30)
                 init_db(specific_date=self.selected_date)
             
             self.progress_updated.emit(60)
             
-            # Carica le prenotazioni
+            # Carica le prenotazioni: get_reservations passa dalla cache
+            # e conta hit e miss
             reservations = get_reservations(self.selected_date)
             
-            # Salva in cache
-            self.cache.set(date_key, reservations)
-            
             self.progress_updated.emit(90)
             self.loading_finished.emit(reservations)
             self.progress_updated.emit(100)
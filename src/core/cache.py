@@ -0,0 +1,176 @@
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from PyQt5.QtCore import QSettings
+from core.logger import logger
+
+# File dei database da cui dipendono le prenotazioni in cache
+_DAILY_DB = re.compile(r"^prenotazioni_(\d{2})_(\d{2})\.db$")
+_YEARLY_DB = re.compile(r"^hemodos_(\d{4})\.db$")
+
+def _estimate_size(rows):
+    """Stima in byte della memoria occupata dalle righe di un giorno"""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+class ReservationCache:
+    """Cache LRU delle prenotazioni per giorno (chiave yyyy-MM-dd)
+
+    Il limite è sia sul numero di giorni sia sulla memoria stimata: oltre
+    uno dei due vengono scartati i giorni usati meno di recente. Le
+    scritture sul database e le modifiche dei file rilevate dal
+    monitoraggio invalidano i giorni interessati.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    DEFAULT_MAX_ENTRIES = 64
+    DEFAULT_MAX_KB = 2048
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                settings = QSettings('Hemodos', 'DatabaseSettings')
+                cls._instance = ReservationCache(
+                    max_entries=settings.value("cache_max_entries", cls.DEFAULT_MAX_ENTRIES, type=int),
+                    max_bytes=settings.value("cache_max_kb", cls.DEFAULT_MAX_KB, type=int) * 1024
+                )
+            return cls._instance
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_KB * 1024):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # chiave -> (righe, dimensione stimata)
+        self._size = 0
+        self._version = 0  # Incrementata a ogni invalidazione
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, date_key):
+        """Restituisce le righe in cache per il giorno, o None"""
+        with self._lock:
+            entry = self._entries.get(date_key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(date_key)
+            self.hits += 1
+            return list(entry[0])
+
+    def version(self):
+        """Versione corrente, da leggere prima di interrogare il database"""
+        with self._lock:
+            return self._version
+
+    def set(self, date_key, rows, version=None):
+        """Memorizza le righe di un giorno, scartando i giorni meno recenti se serve
+
+        Se è indicata la versione letta prima della query e nel frattempo c'è
+        stata un'invalidazione, le righe potrebbero essere superate e non
+        vengono memorizzate.
+        """
+        rows = tuple(rows)
+        size = _estimate_size(rows)
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            old = self._entries.pop(date_key, None)
+            if old is not None:
+                self._size -= old[1]
+            if size > self.max_bytes:
+                return
+            self._entries[date_key] = (rows, size)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, date_key):
+        """Rimuove un giorno dalla cache"""
+        with self._lock:
+            self._version += 1
+            entry = self._entries.pop(date_key, None)
+            if entry is not None:
+                self._size -= entry[1]
+                self.invalidations += 1
+
+    def invalidate_prefix(self, prefix):
+        """Rimuove tutti i giorni la cui chiave inizia con prefix (es. un anno)"""
+        with self._lock:
+            self._version += 1
+            for date_key in [key for key in self._entries if key.startswith(prefix)]:
+                self._size -= self._entries.pop(date_key)[1]
+                self.invalidations += 1
+
+    def invalidate_path(self, db_path):
+        """Invalida i giorni che dipendono dal file di database indicato"""
+        filename = os.path.basename(db_path)
+        year = os.path.basename(os.path.dirname(os.path.abspath(db_path)))
+
+        match = _DAILY_DB.match(filename)
+        if match and year.isdigit():
+            day, month = match.groups()
+            self.invalidate(f"{year}-{month}-{day}")
+            return
+
+        match = _YEARLY_DB.match(filename)
+        if match:
+            # Con l'archivio giornaliero hemodos_YYYY.db contiene solo le
+            # statistiche, riscritte a ogni salvataggio: non tocca la cache
+            from core.database import is_yearly_storage
+            if is_yearly_storage():
+                self.invalidate_prefix(f"{match.group(1)}-")
+
+    def clear(self):
+        """Svuota la cache"""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, date_key):
+        # Non aggiorna né l'ordine LRU né i contatori
+        with self._lock:
+            return date_key in self._entries
+
+    def stats(self):
+        """Contatori di utilizzo della cache"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Cache prenotazioni: {stats['entries']} giorni, {stats['bytes'] // 1024} KB, "
+            f"{stats['hits']} hit, {stats['misses']} miss, {stats['evictions']} scartati, "
+            f"{stats['invalidations']} invalidati"
+        )
+
+def get_reservation_cache():
+    """Restituisce la cache delle prenotazioni condivisa"""
+    return ReservationCache.get_instance()
+
+def invalidate_cached_path(db_path):
+    """Invalida i giorni in cache che dipendono dal file di database indicato"""
+    ReservationCache.get_instance().invalidate_path(db_path)
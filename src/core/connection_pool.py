@@ -0,0 +1,288 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from core.logger import logger
+from core.schema import ensure_schema
+
+# PRAGMA applicate una sola volta all'apertura di ogni connessione
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=10000",
+    "PRAGMA page_size=4096",
+    "PRAGMA mmap_size=67108864",  # 64 MB: i database di Hemodos sono piccoli
+    "PRAGMA busy_timeout=60000",
+    "PRAGMA foreign_keys=ON",
+)
+
+class ConnectionPool:
+    """Pool di connessioni SQLite riutilizzabili, separate per percorso del database
+
+    Ogni connessione viene configurata una sola volta all'apertura e, finito
+    il blocco with, torna nel pool invece di essere chiusa. Le connessioni
+    inattive oltre IDLE_TIMEOUT secondi vengono chiuse alla prima occasione.
+    Le connessioni aperte (in uso o inattive) sono al massimo
+    MAX_OPEN_PER_PATH per database e MAX_OPEN_TOTAL in tutto: oltre il
+    limite acquire attende che ne venga restituita una, per non più di
+    ACQUIRE_TIMEOUT secondi.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    MAX_IDLE_PER_PATH = 2   # Connessioni inattive conservate per ogni database
+    MAX_IDLE_TOTAL = 16     # Connessioni inattive conservate in totale
+    MAX_OPEN_PER_PATH = 8   # Connessioni aperte per ogni database
+    MAX_OPEN_TOTAL = 32     # Connessioni aperte in totale
+    IDLE_TIMEOUT = 120      # Secondi
+    ACQUIRE_TIMEOUT = 30    # Secondi di attesa di una connessione libera
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = ConnectionPool()
+            return cls._instance
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = {}        # percorso -> lista di (connessione, ultimo utilizzo)
+        self._open_count = {}  # percorso -> connessioni aperte (in uso e inattive)
+        self._reserved = set() # percorsi riservati da exclusive(): acquire attende
+
+    def acquire(self, db_path):
+        """Restituisce una connessione inattiva per il database o ne apre una nuova
+
+        Raises:
+            sqlite3.OperationalError: Nessuna connessione libera entro ACQUIRE_TIMEOUT
+        """
+        db_path = os.path.abspath(db_path)
+        deadline = time.monotonic() + self.ACQUIRE_TIMEOUT
+        closing = []
+        conn = None
+        with self._available:
+            while True:
+                closing.extend(self._pop_expired(time.monotonic()))
+                idle = None if db_path in self._reserved else self._idle.get(db_path)
+                if idle:
+                    conn = idle.pop()[0]
+                    if not idle:
+                        del self._idle[db_path]
+                    break
+                if (db_path not in self._reserved
+                        and self._open_count.get(db_path, 0) < self.MAX_OPEN_PER_PATH):
+                    # Limite totale raggiunto: si fa posto chiudendo una connessione inattiva
+                    if self._total_open() >= self.MAX_OPEN_TOTAL:
+                        closing.extend(self._pop_oldest_idle())
+                    if self._total_open() < self.MAX_OPEN_TOTAL:
+                        self._open_count[db_path] = self._open_count.get(db_path, 0) + 1
+                        break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._close_all(closing)
+                    raise sqlite3.OperationalError(
+                        f"Nessuna connessione disponibile per {db_path} entro {self.ACQUIRE_TIMEOUT} secondi")
+                self._available.wait(remaining)
+
+        self._close_all(closing)
+        if conn is not None:
+            return conn
+        try:
+            return self._open(db_path)
+        except Exception:
+            self._forget_open(db_path, 1)
+            raise
+
+    def release(self, db_path, conn):
+        """Restituisce la connessione al pool, chiudendola se il pool è pieno"""
+        db_path = os.path.abspath(db_path)
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._available:
+            idle = self._idle.setdefault(db_path, [])
+            total = sum(len(conns) for conns in self._idle.values())
+            if len(idle) < self.MAX_IDLE_PER_PATH and total < self.MAX_IDLE_TOTAL:
+                idle.append((conn, time.monotonic()))
+                conn = None
+            elif not idle:
+                del self._idle[db_path]
+            self._available.notify_all()
+
+        if conn is not None:
+            self._close(conn)
+            self._forget_open(db_path, 1)
+
+    @contextmanager
+    def exclusive(self, db_path):
+        """Riserva un database: per tutto il blocco with il pool non vi tiene connessioni
+
+        Le nuove acquire sul percorso attendono, quelle in uso vengono
+        attese (al massimo ACQUIRE_TIMEOUT secondi) e quelle inattive
+        chiuse. Va usato per sostituire il file del database.
+
+        Raises:
+            sqlite3.OperationalError: Connessioni ancora in uso dopo ACQUIRE_TIMEOUT
+        """
+        db_path = os.path.abspath(db_path)
+        deadline = time.monotonic() + self.ACQUIRE_TIMEOUT
+        with self._available:
+            while db_path in self._reserved:
+                self._wait_until(deadline, db_path)
+            self._reserved.add(db_path)
+            try:
+                while self._open_count.get(db_path, 0) > len(self._idle.get(db_path, ())):
+                    self._wait_until(deadline, db_path)
+                closing = self._pop_idle(db_path, len(self._idle[db_path])) if db_path in self._idle else []
+            except Exception:
+                self._reserved.discard(db_path)
+                self._available.notify_all()
+                raise
+        self._close_all(closing)
+        try:
+            yield
+        finally:
+            with self._available:
+                self._reserved.discard(db_path)
+                self._available.notify_all()
+
+    def _wait_until(self, deadline, db_path):
+        """Attende una restituzione fino a deadline (da chiamare con il lock acquisito)"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise sqlite3.OperationalError(
+                f"Connessioni a {db_path} ancora in uso dopo {self.ACQUIRE_TIMEOUT} secondi")
+        self._available.wait(remaining)
+
+    def evict_idle(self):
+        """Chiude le connessioni inattive da più di IDLE_TIMEOUT secondi"""
+        with self._lock:
+            expired = self._pop_expired(time.monotonic())
+        self._close_all(expired)
+
+    def close_all(self, path_prefix=None):
+        """Chiude le connessioni inattive, tutte o solo quelle sotto path_prefix
+
+        Va chiamato prima di spostare, eliminare o sovrascrivere i file dei database.
+        """
+        prefix = os.path.abspath(path_prefix) if path_prefix else None
+        with self._lock:
+            closing = []
+            for db_path in list(self._idle):
+                if prefix is None or db_path == prefix or db_path.startswith(prefix + os.sep):
+                    closing.extend(self._pop_idle(db_path, len(self._idle[db_path])))
+        self._close_all(closing)
+        if prefix is None:
+            logger.info("Pool connessioni database chiuso")
+
+    def _pop_expired(self, now):
+        """Rimuove dal pool le connessioni scadute (da chiamare con il lock acquisito)"""
+        expired = []
+        for db_path in list(self._idle):
+            stale = sum(1 for _, last_used in self._idle[db_path] if now - last_used > self.IDLE_TIMEOUT)
+            expired.extend(self._pop_idle(db_path, stale))
+        return expired
+
+    def _pop_oldest_idle(self):
+        """Rimuove dal pool la connessione inattiva usata meno di recente (con il lock acquisito)"""
+        oldest = min(self._idle, key=lambda db_path: self._idle[db_path][0][1], default=None)
+        return self._pop_idle(oldest, 1) if oldest else []
+
+    def _pop_idle(self, db_path, count):
+        """Rimuove le count connessioni inattive più vecchie di db_path (con il lock acquisito)
+
+        Le connessioni restituite vanno chiuse; i posti liberati sono già
+        disponibili per acquire.
+        """
+        idle = self._idle[db_path]
+        popped = [conn for conn, _ in idle[:count]]
+        del idle[:count]
+        if not idle:
+            del self._idle[db_path]
+        if popped:
+            self._open_count[db_path] -= len(popped)
+            if not self._open_count[db_path]:
+                del self._open_count[db_path]
+            self._available.notify_all()
+        return popped
+
+    def _forget_open(self, db_path, count):
+        """Libera i posti di connessioni chiuse fuori dal pool"""
+        with self._available:
+            self._open_count[db_path] -= count
+            if not self._open_count[db_path]:
+                del self._open_count[db_path]
+            self._available.notify_all()
+
+    def _total_open(self):
+        return sum(self._open_count.values())
+
+    def _open(self, db_path):
+        """Apre e configura una nuova connessione, aggiornando lo schema se serve"""
+        # Ogni connessione è usata da un solo chiamante alla volta, ma può
+        # essere riutilizzata da un thread diverso da quello che l'ha aperta
+        conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        try:
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            ensure_schema(conn, db_path)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _close(self, conn):
+        """Chiude una connessione aggiornando prima le statistiche del planner"""
+        try:
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"Errore nella chiusura della connessione: {str(e)}")
+
+    def _close_all(self, connections):
+        for conn in connections:
+            self._close(conn)
+
+class PooledConnection:
+    """Context manager che presta una connessione del pool
+
+    Come il context manager di sqlite3.Connection esegue commit all'uscita
+    (rollback in caso di eccezione), poi restituisce la connessione al pool.
+    """
+    def __init__(self, pool, db_path):
+        self.pool = pool
+        self.db_path = db_path
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = self.pool.acquire(self.db_path)
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.pool.release(self.db_path, self.conn)
+            self.conn = None
+        return False
+
+def exclusive_database(db_path):
+    """Context manager che tiene il pool lontano da un database (vedi ConnectionPool.exclusive)"""
+    return ConnectionPool.get_instance().exclusive(db_path)
+
+def close_connections(path_prefix=None):
+    """Chiude le connessioni inattive del pool (tutte o sotto path_prefix)"""
+    ConnectionPool.get_instance().close_all(path_prefix)
+
+def evict_idle_connections():
+    """Chiude le connessioni del pool inattive da troppo tempo"""
+    ConnectionPool.get_instance().evict_idle()
@@ -11,6 +11,10 @@ class CloudService(Enum):
     ONEDRIVE = "OneDrive"
     GDRIVE = "Google Drive"
 
+class StorageEngine(Enum):
+    DAILY = "giornaliero"   # Un database prenotazioni_DD_MM.db per ogni giorno
+    YEARLY = "annuale"      # Tabella reservations unica in hemodos_YYYY.db
+
 # Configurazioni temporali
 TIME_RANGE = {
     'START': '07:50',
@@ -1,12 +1,17 @@
-import sqlite3
 from datetime import datetime, timedelta
 import os
-from PyQt5.QtCore import QSettings, QThread, pyqtSignal, QDate
+from PyQt5.QtCore import QSettings, QDate
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from core.logger import logger
-import time
 from core.delete_db_logic import get_base_path
+from core.constants import StorageEngine
+from core.connection_pool import ConnectionPool, PooledConnection, close_connections
+from core.history_writer import HistoryWriter, flush_history
+from core.path_resolver import get_path_resolver
+from core.cache import get_reservation_cache, invalidate_cached_path
+from core.donation_index import invalidate_donation_dates, invalidate_donation_path
+from core.schema import has_history_fts
 
 def get_db_path(specific_date=None, is_donation_dates=False):
     """Ottiene il percorso del database corretto
@@ -15,19 +20,11 @@ def get_db_path(specific_date=None, is_donation_dates=False):
         specific_date: Data specifica (QDate)
         is_donation_dates: Se True, restituisce il percorso del database delle date di donazione
     """
-    settings = QSettings('Hemodos', 'DatabaseSettings')
-    service = settings.value("cloud_service", "Locale")
-    
-    if service == "Locale":
-        base_path = os.path.expanduser("~/Documents/Hemodos")
-    else:
-        cloud_path = settings.value("cloud_path", "")
-        base_path = os.path.join(cloud_path, "Hemodos")
+    resolver = get_path_resolver()
     
     if specific_date:
         year = specific_date.year()
-        year_path = os.path.join(base_path, str(year))
-        os.makedirs(year_path, exist_ok=True)
+        year_path = resolver.year_path(year)
         
         if is_donation_dates:
             return os.path.join(year_path, f"date_donazione_{year}.db")
@@ -36,119 +33,135 @@ def get_db_path(specific_date=None, is_donation_dates=False):
             return os.path.join(year_path, db_name)
     else:
         # Restituisci l'ultimo database usato o quello dell'anno corrente
-        last_db = settings.value("last_database")
+        last_db = resolver.last_database()
         if last_db and os.path.exists(last_db):
             return last_db
         
         year = QDate.currentDate().year()
-        return os.path.join(base_path, str(year), f"hemodos_{year}.db")
+        return os.path.join(resolver.base_path(), str(year), f"hemodos_{year}.db")
 
-def migrate_database():
-    """Aggiorna la struttura del database se necessario"""
+def get_storage_engine():
+    """Restituisce il motore di archiviazione delle prenotazioni configurato"""
+    settings = QSettings('Hemodos', 'DatabaseSettings')
+    value = settings.value("storage_engine", StorageEngine.DAILY.value)
     try:
-        db_path = get_db_path()
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Verifica se la colonna stato esiste
-        cursor = c.execute('PRAGMA table_info(reservations)')
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # Aggiungi la colonna stato se non esiste
-        if 'stato' not in columns:
-            c.execute('ALTER TABLE reservations ADD COLUMN stato text DEFAULT "Non effettuata"')
-            logger.info("Aggiunta colonna stato alla tabella reservations")
+        return StorageEngine(value)
+    except ValueError:
+        return StorageEngine.DAILY
+
+def is_yearly_storage():
+    """Verifica se le prenotazioni sono archiviate in un unico database annuale"""
+    return get_storage_engine() == StorageEngine.YEARLY
+
+def get_year_db_path(year):
+    """Ottiene il percorso del database annuale hemodos_YYYY.db"""
+    return os.path.join(get_path_resolver().year_path(year), f"hemodos_{year}.db")
+
+def _get_day_scope(date_obj):
+    """Restituisce il database delle prenotazioni di un giorno e le colonne chiave
+
+    Con l'archivio giornaliero il giorno è identificato dal file stesso e non
+    servono colonne aggiuntive; con l'archivio annuale tutte le prenotazioni
+    stanno in hemodos_YYYY.db e il giorno è la colonna date.
+    """
+    if is_yearly_storage():
+        db_path = get_year_db_path(date_obj.year())
+        return db_path, {"date": date_obj.toString("yyyy-MM-dd")}
+    return get_db_path(date_obj), {}
+
+def _scope_filter(scope):
+    """Restituisce la condizione SQL e i parametri che selezionano il giorno"""
+    if not scope:
+        return "1 = 1", ()
+    condition = " AND ".join(f"{column} = ?" for column in scope)
+    return condition, tuple(scope.values())
+
+# Conteggi di un giorno: prenotazioni, donazioni effettuate, prime donazioni
+DAY_COUNTS_SQL = """SUM(name != ''),
+                     SUM(name != '' AND stato = 'Sì'),
+                     SUM(name != '' AND stato = 'Sì' AND first_donation = 1)"""
+
+def store_day_stats(conn, year, day_counts):
+    """Scrive i conteggi dei giorni in annual_stats e ricalcola i mesi interessati
+
+    Args:
+        conn: Connessione a hemodos_YYYY.db
+        year: Anno
+        day_counts: Dizionario data yyyy-MM-dd -> (total, completed, first)
+    """
+    months = set()
+    for date_str, (total, completed, first) in day_counts.items():
+        months.add(int(date_str[5:7]))
+        if total:
+            conn.execute("""INSERT INTO annual_stats
+                                (date, total_donations, completed_donations, first_donations)
+                            VALUES (?, ?, ?, ?)
+                            ON CONFLICT(date) DO UPDATE SET
+                                total_donations = excluded.total_donations,
+                                completed_donations = excluded.completed_donations,
+                                first_donations = excluded.first_donations""",
+                         (date_str, total, completed, first))
+        else:
+            conn.execute("DELETE FROM annual_stats WHERE date = ?", (date_str,))
+
+    # Il mese si ricalcola dalle sole righe giornaliere del mese (al massimo 31)
+    for month in months:
+        conn.execute("""INSERT INTO monthly_stats
+                            (year, month, total_reservations, completed_donations, first_donations)
+                        SELECT ?, ?, COALESCE(SUM(total_donations), 0),
+                               COALESCE(SUM(completed_donations), 0),
+                               COALESCE(SUM(first_donations), 0)
+                        FROM annual_stats
+                        WHERE date BETWEEN ? AND ?
+                        ON CONFLICT(year, month) DO UPDATE SET
+                            total_reservations = excluded.total_reservations,
+                            completed_donations = excluded.completed_donations,
+                            first_donations = excluded.first_donations""",
+                     (year, month, f"{year}-{month:02d}-01", f"{year}-{month:02d}-31"))
+
+def update_day_stats(date_obj):
+    """Aggiorna le statistiche materializzate di un giorno dopo una scrittura"""
+    try:
+        db_path, scope = _get_day_scope(date_obj)
+        scope_sql, scope_params = _scope_filter(scope)
         
-        conn.commit()
-        conn.close()
+        with get_db_connection(db_path) as conn:
+            total, completed, first = conn.execute(
+                f"SELECT {DAY_COUNTS_SQL} FROM reservations WHERE {scope_sql}",
+                scope_params).fetchone()
+        
+        year = date_obj.year()
+        with get_db_connection(get_year_db_path(year)) as conn:
+            store_day_stats(conn, year, {
+                date_obj.toString("yyyy-MM-dd"): (total or 0, completed or 0, first or 0)
+            })
         return True
         
     except Exception as e:
-        logger.error(f"Errore nella migrazione del database: {str(e)}")
+        logger.error(f"Errore nell'aggiornamento delle statistiche del giorno: {str(e)}")
         return False
 
 def init_db(specific_date=None):
-    """Inizializza il database con struttura ottimizzata per grandi quantità di dati"""
+    """Crea, se mancano, i database del giorno e dell'anno
+
+    Le tabelle vengono create e aggiornate da core.schema all'apertura
+    della prima connessione su ciascun file.
+    """
     try:
-        # Inizializza il database giornaliero
-        db_path = get_db_path(specific_date=specific_date)
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        date_obj = specific_date or QDate.currentDate()
+        year_db_path = get_year_db_path(date_obj.year())
         
-        with get_db_connection(db_path) as conn:
-            c = conn.cursor()
-            
-            # Crea le tabelle con indici appropriati
-            c.executescript('''
-                CREATE TABLE IF NOT EXISTS reservations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    time TEXT NOT NULL,
-                    name TEXT,
-                    surname TEXT,
-                    first_donation BOOLEAN DEFAULT 0,
-                    stato TEXT DEFAULT 'Non effettuata',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE INDEX IF NOT EXISTS idx_reservations_time ON reservations(time);
-                CREATE INDEX IF NOT EXISTS idx_reservations_name ON reservations(name, surname);
-                CREATE INDEX IF NOT EXISTS idx_reservations_stato ON reservations(stato);
-                
-                CREATE TABLE IF NOT EXISTS history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    action TEXT NOT NULL,
-                    details TEXT,
-                    user TEXT
-                );
-                
-                CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp);
-                CREATE INDEX IF NOT EXISTS idx_history_action ON history(action);
-            ''')
-            
-            # Trigger per aggiornare updated_at
-            c.execute('''
-                CREATE TRIGGER IF NOT EXISTS update_timestamp 
-                AFTER UPDATE ON reservations
-                BEGIN
-                    UPDATE reservations SET updated_at = CURRENT_TIMESTAMP 
-                    WHERE id = NEW.id;
-                END;
-            ''')
-            
-        # Inizializza anche il database annuale con struttura ottimizzata
-        year_db_path = os.path.join(os.path.dirname(db_path), f"hemodos_{datetime.now().year}.db")
-        
-        with get_db_connection(year_db_path) as conn:
-            c = conn.cursor()
-            
-            c.executescript('''
-                CREATE TABLE IF NOT EXISTS annual_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date TEXT NOT NULL,
-                    total_donations INTEGER DEFAULT 0,
-                    first_donations INTEGER DEFAULT 0,
-                    completed_donations INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE UNIQUE INDEX IF NOT EXISTS idx_annual_stats_date ON annual_stats(date);
-                
-                CREATE TABLE IF NOT EXISTS monthly_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    year INTEGER NOT NULL,
-                    month INTEGER NOT NULL,
-                    total_reservations INTEGER DEFAULT 0,
-                    completed_donations INTEGER DEFAULT 0,
-                    first_donations INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(year, month)
-                );
-                
-                CREATE INDEX IF NOT EXISTS idx_monthly_stats_date ON monthly_stats(year, month);
-            ''')
+        if is_yearly_storage():
+            # Con l'archivio annuale non si creano file giornalieri
+            db_path = year_db_path
+        else:
+            db_path = get_db_path(specific_date=date_obj)
+        
+        for path in {db_path, year_db_path}:
+            with get_db_connection(path):
+                pass
             
-        logger.info(f"Database inizializzato con struttura ottimizzata: {db_path}")
+        logger.info(f"Database inizializzato: {db_path}")
         return True
         
     except Exception as e:
@@ -160,25 +173,29 @@ def get_history_db_path(year=None):
     if year is None:
         year = datetime.now().year
     
-    base_path = os.path.dirname(get_db_path())
-    return os.path.join(base_path, f"cronologia_{year}.db")
+    return os.path.join(get_path_resolver().year_path(year, create=False), f"cronologia_{year}.db")
 
 def add_history_entry(action, details, specific_date=None):
     """Aggiunge un'entrata nella cronologia"""
+    add_history_entries([(action, details)], specific_date=specific_date)
+
+def add_history_entries(entries, specific_date=None):
+    """Accoda più entrate (action, details) alla cronologia
+
+    La scrittura avviene in blocco sul thread della cronologia
+    (vedi core.history_writer), senza bloccare l'interfaccia.
+    """
     try:
+        if not entries:
+            return
+            
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         year = specific_date.year() if isinstance(specific_date, QDate) else datetime.now().year
         
         history_db = get_history_db_path(year)
-        os.makedirs(os.path.dirname(history_db), exist_ok=True)
-        
-        with get_db_connection(history_db) as conn:
-            c = conn.cursor()
-            c.execute('''CREATE TABLE IF NOT EXISTS history
-                         (timestamp text, action text, details text)''')
-            c.execute("INSERT INTO history VALUES (?, ?, ?)", 
-                     (timestamp, action, details))
-            conn.commit()
+        writer = HistoryWriter.get_instance()
+        for action, details in entries:
+            writer.submit(history_db, timestamp, action, details)
             
     except Exception as e:
         logger.error(f"Errore nell'aggiunta alla cronologia: {str(e)}")
@@ -189,14 +206,14 @@ def get_history(year=None):
         if year is None:
             year = datetime.now().year
             
+        # Le entrate ancora in coda devono comparire nella lettura
+        flush_history()
         history_db = get_history_db_path(year)
         if not os.path.exists(history_db):
             return []
             
         with get_db_connection(history_db) as conn:
             c = conn.cursor()
-            c.execute('''CREATE TABLE IF NOT EXISTS history
-                         (timestamp text, action text, details text)''')
             c.execute("SELECT timestamp, action, details FROM history ORDER BY timestamp DESC")
             return c.fetchall()
             
@@ -204,6 +221,38 @@ def get_history(year=None):
         logger.error(f"Errore nel recupero della cronologia: {str(e)}")
         return []
 
+def get_history_actions(year):
+    """Tipi di azione presenti nella cronologia dell'anno, in ordine alfabetico"""
+    try:
+        history_db = get_history_db_path(year)
+        if not os.path.exists(history_db):
+            return []
+        with get_db_connection(history_db) as conn:
+            rows = conn.execute("SELECT DISTINCT action FROM history ORDER BY action").fetchall()
+        return [action for action, in rows if action]
+
+    except Exception as e:
+        logger.error(f"Errore nel recupero delle azioni della cronologia: {str(e)}")
+        return []
+
+def clear_history(year):
+    """Elimina la cronologia dell'anno, comprese le entrate ancora in coda"""
+    try:
+        flush_history()
+        history_db = get_history_db_path(year)
+        if not os.path.exists(history_db):
+            return True
+        with get_db_connection(history_db) as conn:
+            conn.execute("DELETE FROM history")
+            # L'indice full-text a contenuto esterno va svuotato a parte
+            if has_history_fts(conn):
+                conn.execute("INSERT INTO history_fts (history_fts) VALUES ('delete-all')")
+        return True
+
+    except Exception as e:
+        logger.error(f"Errore nell'eliminazione della cronologia: {str(e)}")
+        return False
+
 def add_reservation(date, time, name, surname, first_donation):
     """Aggiunge o aggiorna una prenotazione nel database"""
     try:
@@ -212,22 +261,15 @@ def add_reservation(date, time, name, surname, first_donation):
         else:
             date_obj = date
             
-        db_path = get_db_path(date_obj)
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        db_path, scope = _get_day_scope(date_obj)
+        scope_sql, scope_params = _scope_filter(scope)
         
         with get_db_connection(db_path) as conn:
             c = conn.cursor()
             
-            # Crea le tabelle se non esistono
-            c.executescript('''
-                CREATE TABLE IF NOT EXISTS reservations
-                    (time text PRIMARY KEY, name text, surname text, 
-                     first_donation boolean DEFAULT 0, 
-                     stato text DEFAULT 'Non effettuata');
-            ''')
-            
             # Verifica se esiste già una prenotazione per questo orario
-            c.execute("SELECT name, surname, stato FROM reservations WHERE time=?", (time,))
+            c.execute(f"SELECT name, surname, stato FROM reservations WHERE time=? AND {scope_sql}",
+                      (time, *scope_params))
             result = c.fetchone()
             
             if result:
@@ -247,56 +289,154 @@ def add_reservation(date, time, name, surname, first_donation):
                     add_history_entry("Nuova prenotazione", details, specific_date=date_obj)
             
             # Inserisci o aggiorna la prenotazione
-            c.execute("""INSERT OR REPLACE INTO reservations 
-                         (time, name, surname, first_donation, stato) 
-                         VALUES (?,?,?,?,?)""", 
-                      (time, name, surname, first_donation, 
+            columns = ", ".join([*scope, "time", "name", "surname", "first_donation", "stato"])
+            placeholders = ",".join("?" * (len(scope) + 5))
+            c.execute(f"""INSERT OR REPLACE INTO reservations 
+                         ({columns}) 
+                         VALUES ({placeholders})""", 
+                      (*scope.values(), time, name, surname, first_donation, 
                        current_status if result else 'Non effettuata'))
             
             conn.commit()
             
+        _after_day_write(date_obj)
         return True
         
     except Exception as e:
         logger.error(f"Errore nel salvataggio della prenotazione: {str(e)}")
         return False
 
+def save_day_reservations(date, rows):
+    """Salva in una sola transazione tutte le prenotazioni di un giorno
+
+    Le righe vengono confrontate con quelle già salvate: si scrivono solo
+    le prenotazioni nuove e quelle modificate, con executemany, e la
+    cronologia delle modifiche viene registrata in blocco.
+
+    Args:
+        date: Data (QDate o stringa yyyy-MM-dd)
+        rows: Lista di tuple (time, name, surname, first_donation, stato)
+
+    Returns:
+        bool: True se il salvataggio è riuscito
+    """
+    try:
+        if isinstance(date, str):
+            date_obj = QDate.fromString(date, "yyyy-MM-dd")
+        else:
+            date_obj = date
+        date_str = date_obj.toString("yyyy-MM-dd")
+            
+        db_path, scope = _get_day_scope(date_obj)
+        scope_sql, scope_params = _scope_filter(scope)
+        
+        history = []
+        
+        with get_db_connection(db_path) as conn:
+            c = conn.cursor()
+            
+            c.execute(f"""SELECT time, name, surname, first_donation, stato 
+                         FROM reservations WHERE {scope_sql}""", scope_params)
+            stored = {row[0]: row[1:] for row in c.fetchall()}
+            
+            inserts = []
+            updates = []
+            for slot_time, name, surname, first_donation, stato in rows:
+                name = name or ""
+                surname = surname or ""
+                first_donation = 1 if first_donation else 0
+                
+                if slot_time not in stored:
+                    # Le righe vuote non ancora salvate non vanno scritte
+                    if not (name.strip() or surname.strip()):
+                        continue
+                    inserts.append((*scope.values(), slot_time, name, surname, first_donation, stato))
+                    history.append(("Nuova prenotazione",
+                                    f"Data: {date_str}, Ora: {slot_time}, Nome: {name} {surname}"))
+                    if stato != 'Non effettuata':
+                        history.append(("Cambio stato donazione",
+                                        f"Data: {date_str}, Ora: {slot_time}, Nuovo stato: {stato}"))
+                    continue
+                
+                old_name, old_surname, old_first, old_stato = stored[slot_time]
+                old_name = old_name or ""
+                old_surname = old_surname or ""
+                if (old_name, old_surname, bool(old_first), old_stato) == \
+                        (name, surname, bool(first_donation), stato):
+                    continue
+                
+                updates.append((name, surname, first_donation, stato, slot_time, *scope_params))
+                if old_name != name or old_surname != surname:
+                    details = f"Data: {date_str}, Ora: {slot_time}\n"
+                    if old_name or old_surname:
+                        details += f"Da: {old_name} {old_surname} -> "
+                    details += f"A: {name} {surname}"
+                    history.append(("Modifica prenotazione", details))
+                if old_stato != stato:
+                    history.append(("Cambio stato donazione",
+                                    f"Data: {date_str}, Ora: {slot_time}, Nuovo stato: {stato}"))
+            
+            if inserts:
+                columns = ", ".join([*scope, "time", "name", "surname", "first_donation", "stato"])
+                placeholders = ",".join("?" * (len(scope) + 5))
+                c.executemany(f"INSERT INTO reservations ({columns}) VALUES ({placeholders})",
+                              inserts)
+            if updates:
+                c.executemany(f"""UPDATE reservations 
+                                 SET name = ?, surname = ?, first_donation = ?, stato = ?
+                                 WHERE time = ? AND {scope_sql}""", updates)
+            
+            conn.commit()
+        
+        _after_day_write(date_obj)
+        add_history_entries(history, specific_date=date_obj)
+        return True
+        
+    except Exception as e:
+        logger.error(f"Errore nel salvataggio delle prenotazioni del giorno: {str(e)}")
+        return False
+
 def get_db_connection(db_path):
-    """Crea una connessione al database con impostazioni ottimizzate per grandi dataset"""
-    conn = sqlite3.connect(db_path)
-    
-    # Configurazioni per prestazioni ottimali
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA synchronous=NORMAL")
-    conn.execute("PRAGMA temp_store=MEMORY")
-    conn.execute("PRAGMA cache_size=10000")
-    conn.execute("PRAGMA page_size=4096")
-    conn.execute("PRAGMA mmap_size=30000000000")
-    conn.execute("PRAGMA busy_timeout=60000")
-    conn.execute("PRAGMA foreign_keys=ON")
-    
-    # Abilita il supporto alle foreign keys
-    conn.execute("PRAGMA foreign_keys=ON")
-    
-    # Ottimizza le query
-    conn.execute("PRAGMA optimize")
-    
-    return conn
+    """Presta una connessione del pool, già configurata, per il database indicato
+
+    Va usata come context manager: all'uscita dal blocco with esegue commit
+    (o rollback in caso di errore) e restituisce la connessione al pool.
+    """
+    return PooledConnection(ConnectionPool.get_instance(), db_path)
+
+def _after_day_write(date_obj):
+    """Da chiamare dopo ogni scrittura delle prenotazioni di un giorno
+
+    Rimuove il giorno dalla cache e ne aggiorna le statistiche materializzate.
+    """
+    get_reservation_cache().invalidate(date_obj.toString("yyyy-MM-dd"))
+    update_day_stats(date_obj)
 
 def get_reservations(selected_date):
-    """Ottiene le prenotazioni per una data specifica"""
+    """Ottiene le prenotazioni per una data specifica (passando dalla cache)"""
     try:
-        db_path = get_db_path(selected_date)
+        cache = get_reservation_cache()
+        date_key = selected_date.toString("yyyy-MM-dd")
+        cached = cache.get(date_key)
+        if cached is not None:
+            return cached
+        version = cache.version()
+        
+        db_path, scope = _get_day_scope(selected_date)
         if not os.path.exists(db_path):
             return []
+        scope_sql, scope_params = _scope_filter(scope)
             
         with get_db_connection(db_path) as conn:
             c = conn.cursor()
-            c.execute('CREATE INDEX IF NOT EXISTS idx_time ON reservations(time)')
-            c.execute("""SELECT time, name, surname, first_donation, stato 
+            c.execute(f"""SELECT time, name, surname, first_donation, stato 
                         FROM reservations 
-                        ORDER BY time""")
-            return c.fetchall()
+                        WHERE {scope_sql}
+                        ORDER BY time""", scope_params)
+            reservations = c.fetchall()
+        
+        cache.set(date_key, reservations, version)
+        return reservations
             
     except Exception as e:
         logger.error(f"Errore nel recupero delle prenotazioni: {str(e)}")
@@ -310,12 +450,14 @@ def delete_reservation_from_db(date, time):
         else:
             date_obj = date
             
-        db_path = get_db_path(date_obj)
+        db_path, scope = _get_day_scope(date_obj)
+        scope_sql, scope_params = _scope_filter(scope)
         
         with get_db_connection(db_path) as conn:
             c = conn.cursor()
-            c.execute("DELETE FROM reservations WHERE time=?", (time,))
+            c.execute(f"DELETE FROM reservations WHERE time=? AND {scope_sql}", (time, *scope_params))
             conn.commit()
+            _after_day_write(date_obj)
             
             if c.rowcount > 0:
                 details = f"Data: {date}, Ora: {time}"
@@ -346,42 +488,18 @@ def get_cloud_path():
 def add_donation_date(year, date):
     """Aggiunge una data di donazione al database annuale"""
     try:
-        db_path = get_db_path(is_donation_dates=True)
+        db_path = get_db_path(QDate(int(year), 1, 1), is_donation_dates=True)
         
         with get_db_connection(db_path) as conn:
             c = conn.cursor()
+            c.execute("INSERT OR IGNORE INTO donation_dates (date, year) VALUES (?, ?)", 
+                     (date, int(year)))
+            added = c.rowcount > 0
             
-            # Crea le tabelle con struttura ottimizzata
-            c.executescript('''
-                CREATE TABLE IF NOT EXISTS donation_dates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    year INTEGER NOT NULL,
-                    date TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(year, date)
-                );
-                
-                CREATE INDEX IF NOT EXISTS idx_donation_dates ON donation_dates(year, date);
-                
-                CREATE TABLE IF NOT EXISTS history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    action TEXT NOT NULL,
-                    details TEXT
-                );
-            ''')
-            
-            # Inserisci la data
-            c.execute("INSERT OR IGNORE INTO donation_dates (year, date) VALUES (?, ?)", 
-                     (year, date))
-            
-            # Aggiungi alla cronologia
-            details = f"Anno: {year}, Data: {date}"
-            c.execute("INSERT INTO history (action, details) VALUES (?, ?)",
-                     ("Aggiunta data donazione", details))
-            
-            conn.commit()
-            return True
+        if added:
+            invalidate_donation_dates(year)
+            add_to_history(year, "Aggiunta data donazione", f"Anno: {year}, Data: {date}")
+        return True
             
     except Exception as e:
         logger.error(f"Errore nell'aggiunta della data di donazione: {str(e)}")
@@ -390,51 +508,37 @@ def add_donation_date(year, date):
 def get_donation_dates(year):
     """Ottiene le date di donazione per un anno specifico"""
     try:
-        # Crea una data fittizia per l'anno richiesto
-        dummy_date = QDate(year, 1, 1)
-        db_path = get_db_path(dummy_date, is_donation_dates=True)
+        # Una lettura non deve creare la directory di un anno inesistente
+        year_path = get_path_resolver().year_path(year, create=False)
+        db_path = os.path.join(year_path, f"date_donazione_{year}.db")
         
         if not os.path.exists(db_path):
             return []
             
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Crea la tabella se non esiste
-        c.execute('''CREATE TABLE IF NOT EXISTS donation_dates
-                     (date text PRIMARY KEY)''')
-        
-        # Ottieni tutte le date
-        c.execute("SELECT date FROM donation_dates ORDER BY date")
-        dates = [row[0] for row in c.fetchall()]
-        
-        conn.close()
-        return dates
+        with get_db_connection(db_path) as conn:
+            c = conn.cursor()
+            c.execute("SELECT date FROM donation_dates ORDER BY date")
+            return [row[0] for row in c.fetchall()]
         
     except Exception as e:
         logger.error(f"Errore nel recupero delle date di donazione: {str(e)}")
         return []
 
 def delete_donation_date(year, date):
+    """Rimuove una data di donazione dal database annuale"""
     try:
-        db_path = get_db_path(is_donation_dates=True)
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Elimina la data
-        c.execute("DELETE FROM donation_dates WHERE year=? AND date=?", (year, date))
-        
-        # Aggiungi alla cronologia
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        details = f"Anno: {year}, Data: {date}"
-        c.execute("INSERT INTO history VALUES (?, ?, ?)", 
-                 (timestamp, "Rimozione data donazione", details))
-        
-        conn.commit()
-        conn.close()
+        db_path = get_db_path(QDate(int(year), 1, 1), is_donation_dates=True)
+        with get_db_connection(db_path) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM donation_dates WHERE date=?", (date,))
+            removed = c.rowcount > 0
+            
+        if removed:
+            invalidate_donation_dates(year)
+            add_to_history(year, "Rimozione data donazione", f"Anno: {year}, Data: {date}")
         return True
     except Exception as e:
-        print(f"Errore nella rimozione della data di donazione: {str(e)}")
+        logger.error(f"Errore nella rimozione della data di donazione: {str(e)}")
         return False
 
 def add_donation_time(date, time, name="", surname="", first_donation=False):
@@ -445,22 +549,25 @@ def add_donation_time(date, time, name="", surname="", first_donation=False):
         else:
             date_obj = date
             
-        db_path = get_db_path(date_obj)
+        db_path, scope = _get_day_scope(date_obj)
         
         with get_db_connection(db_path) as conn:
             c = conn.cursor()
             
             # Aggiungi la riga con l'orario
-            c.execute("""INSERT INTO reservations 
-                        (time, name, surname, first_donation, stato) 
-                        VALUES (?,?,?,?,'Non effettuata')""", 
-                     (time, name, surname, first_donation))
+            columns = ", ".join([*scope, "time", "name", "surname", "first_donation", "stato"])
+            placeholders = ",".join("?" * (len(scope) + 4))
+            c.execute(f"""INSERT INTO reservations 
+                        ({columns}) 
+                        VALUES ({placeholders},'Non effettuata')""", 
+                     (*scope.values(), time, name, surname, first_donation))
             
             # Assicurati che la data sia anche nelle date di donazione
             year = date_obj.year()
             add_donation_date(year, date_obj.toString("yyyy-MM-dd"))
             
             conn.commit()
+            _after_day_write(date_obj)
             
             details = f"Data: {date_obj.toString('yyyy-MM-dd')}, Ora: {time}"
             add_history_entry("Aggiunta orario donazione", details, specific_date=date_obj)
@@ -470,45 +577,30 @@ def add_donation_time(date, time, name="", surname="", first_donation=False):
         logger.error(f"Errore nell'aggiunta dell'orario di donazione: {str(e)}")
         return False
 
-class CloudMonitorThread(QThread):
-    file_changed = pyqtSignal()
-
-    def __init__(self, watch_path):
-        super().__init__()
-        self.watch_path = watch_path
-        self.running = True
-        logger.info(f"Monitoraggio cloud avviato su: {watch_path}")
+class CacheInvalidationHandler(FileSystemEventHandler):
+    """Invalida le cache quando un database cambia sul disco (es. da un'altra postazione)
 
-    def run(self):
-        event_handler = DatabaseChangeHandler(self)
-        observer = Observer()
-        observer.schedule(event_handler, self.watch_path, recursive=False)
-        observer.start()
-        logger.info("Observer cloud avviato")
-        
-        while self.running:
-            self.msleep(1000)  # Controlla ogni secondo
-            
-        observer.stop()
-        observer.join()
-        logger.info("Observer cloud fermato")
-
-    def stop(self):
-        logger.info("Arresto monitoraggio cloud...")
-        self.running = False
+    -shm e -journal, e la creazione o rimozione del -wal, accompagnano ogni
+    apertura e chiusura del database e vengono ignorati; una scrittura nel
+    -wal vale come modifica del database principale.
+    """
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            db_path = self._database_path(path, event.event_type) if path else None
+            if db_path:
+                invalidate_cached_path(db_path)
+                invalidate_donation_path(db_path)
 
-class DatabaseChangeHandler(FileSystemEventHandler):
-    def __init__(self, thread):
-        self.thread = thread
-        self.last_modified = time.time()
-        
-    def on_modified(self, event):
-        if not event.is_directory and event.src_path.endswith('.db'):
-            current_time = time.time()
-            if current_time - self.last_modified > 1:
-                self.last_modified = current_time
-                logger.debug(f"Rilevata modifica file: {event.src_path}")
-                self.thread.file_changed.emit()
+    def _database_path(self, path, event_type):
+        if path.endswith("-shm") or path.endswith("-journal"):
+            return None
+        if path.endswith("-wal"):
+            if event_type != "modified":
+                return None
+            path = path[:-len("-wal")]
+        return path if path.endswith(".db") else None
 
 def setup_cloud_monitoring(main_window):
     """Configura il monitoraggio del cloud"""
@@ -519,9 +611,9 @@ def setup_cloud_monitoring(main_window):
             logger.warning("Nessun percorso cloud configurato")
             return None
             
-        # Crea l'observer
-        from watchdog.observers import Observer
+        # Crea l'observer: le modifiche ai database invalidano le cache
         observer = Observer()
+        observer.schedule(CacheInvalidationHandler(), get_path_resolver().base_path(), recursive=True)
         observer.start()
         logger.info(f"Observer avviato per il percorso: {cloud_path}")
         return observer
@@ -532,8 +624,8 @@ def setup_cloud_monitoring(main_window):
 
 def get_monthly_stats_db_path(year, month):
     """Ottiene il percorso del database delle statistiche mensili"""
-    base_path = os.path.dirname(get_db_path())
-    return os.path.join(base_path, f"statistiche_{year}_{month:02d}.db")
+    year_path = get_path_resolver().year_path(year, create=False)
+    return os.path.join(year_path, f"statistiche_{year}_{month:02d}.db")
 
 def save_donation_status(date, time, status):
     """Salva lo stato di una donazione"""
@@ -543,13 +635,15 @@ def save_donation_status(date, time, status):
         else:
             date_obj = date
             
-        db_path = get_db_path(date_obj)
+        db_path, scope = _get_day_scope(date_obj)
+        scope_sql, scope_params = _scope_filter(scope)
         
         with get_db_connection(db_path) as conn:
             c = conn.cursor()
-            c.execute("UPDATE reservations SET stato = ? WHERE time = ?", 
-                     (status, time))
+            c.execute(f"UPDATE reservations SET stato = ? WHERE time = ? AND {scope_sql}", 
+                     (status, time, *scope_params))
             conn.commit()
+            _after_day_write(date_obj)
             
             if c.rowcount > 0:
                 details = f"Data: {date}, Ora: {time}, Nuovo stato: {status}"
@@ -569,24 +663,27 @@ def reset_reservation(date, time):
         else:
             date_obj = date
             
-        db_path = get_db_path(date_obj)
+        db_path, scope = _get_day_scope(date_obj)
+        scope_sql, scope_params = _scope_filter(scope)
         
         with get_db_connection(db_path) as conn:
             c = conn.cursor()
             
             # Prima ottieni i dati attuali per la cronologia
-            c.execute("SELECT name, surname FROM reservations WHERE time = ?", (time,))
+            c.execute(f"SELECT name, surname FROM reservations WHERE time = ? AND {scope_sql}",
+                      (time, *scope_params))
             result = c.fetchone()
             old_name, old_surname = result if result else ("", "")
             
             # Resetta tutti i campi tranne l'orario
-            c.execute("""UPDATE reservations 
+            c.execute(f"""UPDATE reservations 
                         SET name = '', surname = '', 
                             first_donation = 0, stato = 'Non effettuata',
                             updated_at = CURRENT_TIMESTAMP
-                        WHERE time = ?""", (time,))
+                        WHERE time = ? AND {scope_sql}""", (time, *scope_params))
             
             conn.commit()
+            _after_day_write(date_obj)
             
             # Aggiungi alla cronologia
             if old_name or old_surname:
@@ -629,7 +726,7 @@ def cleanup_old_data(days_to_keep=365):
         cutoff_date = datetime.now() - timedelta(days=days_to_keep)
         
         # Trova tutti i database più vecchi
-        base_path = os.path.dirname(get_db_path())
+        base_path = get_base_path()
         for year_dir in os.listdir(base_path):
             if not year_dir.isdigit():
                 continue
@@ -649,7 +746,7 @@ def cleanup_old_data(days_to_keep=365):
 def archive_old_data(year):
     """Archivia i dati di un anno specifico"""
     try:
-        base_path = os.path.dirname(get_db_path())
+        base_path = get_base_path()
         year_path = os.path.join(base_path, str(year))
         archive_path = os.path.join(base_path, "archivio")
         
@@ -657,9 +754,15 @@ def archive_old_data(year):
             # Crea la directory di archivio se non esiste
             os.makedirs(archive_path, exist_ok=True)
             
+            # Chiudi le connessioni aperte sui database dell'anno prima di spostarli
+            close_connections(year_path)
+            
             # Sposta l'intera directory dell'anno nell'archivio
             import shutil
             shutil.move(year_path, os.path.join(archive_path, str(year)))
+            get_path_resolver().forget_year(year)
+            get_reservation_cache().invalidate_prefix(f"{year}-")
+            invalidate_donation_dates(year)
             
             logger.info(f"Anno {year} archiviato con successo")
             return True
@@ -669,28 +772,12 @@ def archive_old_data(year):
         return False
 
 def add_to_history(year, action, details):
-    """Aggiunge un'azione alla cronologia"""
+    """Accoda un'azione alla cronologia dell'anno"""
     try:
-        base_path = get_base_path()
-        history_db_path = os.path.join(base_path, str(year), f"cronologia_{year}.db")
+        history_db_path = get_history_db_path(year)
         
-        # Crea la directory se non esiste
-        os.makedirs(os.path.dirname(history_db_path), exist_ok=True)
-        
-        conn = sqlite3.connect(history_db_path)
-        c = conn.cursor()
-        
-        # Crea la tabella se non esiste
-        c.execute('''CREATE TABLE IF NOT EXISTS history
-                    (timestamp text, action text, details text)''')
-        
-        # Inserisci il record
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("INSERT INTO history VALUES (?, ?, ?)", 
-                 (timestamp, action, details))
-        
-        conn.commit()
-        conn.close()
+        HistoryWriter.get_instance().submit(history_db_path, timestamp, action, details)
         
         return True
     except Exception as e:
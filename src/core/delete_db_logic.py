@@ -1,18 +1,14 @@
 import os
 import shutil
-from PyQt5.QtCore import QSettings
 from core.logger import logger
+from core.connection_pool import close_connections
+from core.path_resolver import get_path_resolver
+from core.cache import get_reservation_cache
+from core.donation_index import invalidate_donation_dates
 
 def get_base_path():
     """Ottiene il percorso base dei database"""
-    settings = QSettings('Hemodos', 'DatabaseSettings')
-    service = settings.value("cloud_service", "Locale")
-    
-    if service == "Locale":
-        return os.path.expanduser("~/Documents/Hemodos")
-    else:
-        cloud_path = settings.value("cloud_path", "")
-        return os.path.join(cloud_path, "Hemodos")
+    return get_path_resolver().base_path()
 
 def delete_year_directory(year):
     """Elimina l'intera directory di un anno"""
@@ -21,8 +17,14 @@ def delete_year_directory(year):
         year_path = os.path.join(base_path, str(year))
         
         if os.path.exists(year_path):
+            # Chiudi le connessioni aperte sui database dell'anno
+            close_connections(year_path)
+            
             # Elimina l'intera directory e tutto il suo contenuto
             shutil.rmtree(year_path)
+            get_path_resolver().forget_year(year)
+            get_reservation_cache().invalidate_prefix(f"{year}-")
+            invalidate_donation_dates(year)
             logger.info(f"Directory dell'anno {year} eliminata con successo")
             return True
         else:
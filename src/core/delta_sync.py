@@ -0,0 +1,154 @@
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+from core.paths_manager import PathsManager
+from core.logger import logger
+
+# Blocchi dei file che non sono database SQLite
+DEFAULT_BLOCK_SIZE = 64 * 1024
+DIGEST_SIZE = 16
+
+_SQLITE_HEADER = b"SQLite format 3\x00"
+_SIDECAR_MAGIC = b"HMDBLK1\x00"
+# magic, dimensione blocco, dimensione file, mtime_ns, inode, numero blocchi
+_SIDECAR_HEADER = struct.Struct("<8sIQqQI")
+
+def is_sqlite_file(path):
+    """Verifica dall'intestazione se il file è un database SQLite"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(_SQLITE_HEADER)) == _SQLITE_HEADER
+    except OSError:
+        return False
+
+def block_size_for(path):
+    """Dimensione dei blocchi per un file: la pagina per i database SQLite
+
+    Con blocchi allineati alle pagine una pagina modificata cambia un solo
+    blocco. La dimensione della pagina è nei byte 16-17 dell'intestazione
+    (il valore 1 indica 65536).
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(18)
+    except OSError:
+        return DEFAULT_BLOCK_SIZE
+    if len(header) < 18 or not header.startswith(_SQLITE_HEADER):
+        return DEFAULT_BLOCK_SIZE
+    page_size = int.from_bytes(header[16:18], "big")
+    if page_size == 1:
+        return 65536
+    if page_size < 512 or page_size & (page_size - 1):
+        return DEFAULT_BLOCK_SIZE
+    return page_size
+
+def _digest(block):
+    return hashlib.blake2b(block, digest_size=DIGEST_SIZE).digest()
+
+def block_hashes(path, block_size):
+    """Hash di ogni blocco del file, in ordine"""
+    hashes = []
+    with open(path, "rb", buffering=1024 * 1024) as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            hashes.append(_digest(block))
+    return hashes
+
+def _sidecar_path(path):
+    """File con gli hash dei blocchi di path, nella configurazione locale
+
+    Resta fuori dalla cartella sincronizzata: i client cloud non lo
+    caricano e ogni postazione tiene il proprio.
+    """
+    folder = os.path.join(PathsManager().get_config_path(), "sync_blocks")
+    os.makedirs(folder, exist_ok=True)
+    name = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return os.path.join(folder, f"{name}.blocks")
+
+def _read_sidecar(path, block_size):
+    """Hash dei blocchi salvati per path, se il file non è cambiato da allora"""
+    try:
+        stat = os.stat(path)
+        with open(_sidecar_path(path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _SIDECAR_HEADER.size:
+        return None
+
+    magic, saved_block_size, size, mtime_ns, inode, count = _SIDECAR_HEADER.unpack_from(data)
+    if (magic != _SIDECAR_MAGIC or saved_block_size != block_size
+            or (size, mtime_ns, inode) != (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            or len(data) != _SIDECAR_HEADER.size + count * DIGEST_SIZE):
+        return None
+
+    offset = _SIDECAR_HEADER.size
+    return [data[offset + i * DIGEST_SIZE:offset + (i + 1) * DIGEST_SIZE] for i in range(count)]
+
+def _write_sidecar(path, block_size, hashes):
+    try:
+        stat = os.stat(path)
+        header = _SIDECAR_HEADER.pack(_SIDECAR_MAGIC, block_size, stat.st_size,
+                                      stat.st_mtime_ns, stat.st_ino, len(hashes))
+        with open(_sidecar_path(path), "wb") as f:
+            f.write(header + b"".join(hashes))
+    except OSError as e:
+        logger.warning(f"Impossibile salvare gli hash dei blocchi di {path}: {str(e)}")
+
+def delta_copy(source, dest):
+    """Copia source su dest riscrivendo solo i blocchi diversi
+
+    Gli hash dei blocchi di dest vengono dal file accessorio salvato alla
+    copia precedente (o, se dest è cambiato, da una sua lettura). La copia
+    avviene su un file temporaneo nella cartella di dest, clonato da dest:
+    vi si scrivono i soli blocchi cambiati, poi sostituisce dest con una
+    rinomina atomica. Data di modifica e permessi sono quelli di source,
+    come con shutil.copy2.
+
+    Returns:
+        tuple: (blocchi scritti, blocchi totali)
+    """
+    block_size = block_size_for(source)
+    source_hashes = block_hashes(source, block_size)
+
+    if not os.path.exists(dest):
+        shutil.copy2(source, dest)
+        _write_sidecar(dest, block_size, source_hashes)
+        return len(source_hashes), len(source_hashes)
+
+    dest_hashes = _read_sidecar(dest, block_size)
+    if dest_hashes is None:
+        dest_hashes = block_hashes(dest, block_size)
+
+    changed = [index for index, digest in enumerate(source_hashes)
+               if index >= len(dest_hashes) or dest_hashes[index] != digest]
+    if not changed and len(source_hashes) == len(dest_hashes):
+        shutil.copystat(source, dest)
+        _write_sidecar(dest, block_size, source_hashes)
+        return 0, len(source_hashes)
+
+    folder = os.path.dirname(os.path.abspath(dest))
+    fd, temp_path = tempfile.mkstemp(prefix=".sync_", suffix=".tmp", dir=folder)
+    os.close(fd)
+    try:
+        shutil.copyfile(dest, temp_path)
+        with open(source, "rb") as src, open(temp_path, "r+b") as out:
+            for index in changed:
+                src.seek(index * block_size)
+                out.seek(index * block_size)
+                out.write(src.read(block_size))
+            out.truncate(os.fstat(src.fileno()).st_size)
+            out.flush()
+            os.fsync(out.fileno())
+        shutil.copystat(source, temp_path)
+        os.replace(temp_path, dest)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    _write_sidecar(dest, block_size, source_hashes)
+    logger.debug(f"Copia differenziale {source} -> {dest}: "
+                 f"{len(changed)} blocchi su {len(source_hashes)}")
+    return len(changed), len(source_hashes)
@@ -0,0 +1,105 @@
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from core.logger import logger
+
+_DONATION_DATES_DB = re.compile(r"^date_donazione_(\d{4})\.db$")
+
+class DonationDateIndex:
+    """Indice in memoria delle date di donazione, ordinato per anno
+
+    Le date sono stringhe yyyy-MM-dd: l'ordine alfabetico coincide con
+    quello cronologico, quindi la ricerca della data precedente o
+    successiva è una bisect senza conversioni in QDate. Ogni anno viene
+    letto dal database una sola volta, finché non viene invalidato da
+    una modifica delle date di quell'anno.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    # Anni adiacenti esaminati cercando la data precedente o successiva
+    YEAR_SEARCH_SPAN = 2
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = DonationDateIndex()
+            return cls._instance
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._years = {}  # anno -> tupla ordinata di date yyyy-MM-dd
+
+    def dates(self, year):
+        """Date di donazione dell'anno, ordinate"""
+        year = int(year)
+        with self._lock:
+            dates = self._years.get(year)
+        if dates is not None:
+            return dates
+
+        # Import locale: core.database importa questo modulo per le invalidazioni
+        from core.database import get_donation_dates
+        dates = tuple(sorted(set(get_donation_dates(year))))
+        with self._lock:
+            self._years[year] = dates
+        logger.debug(f"Indice date di donazione caricato per il {year}: {len(dates)} date")
+        return dates
+
+    def contains(self, date_str):
+        """Verifica se la data (yyyy-MM-dd) è una data di donazione"""
+        dates = self.dates(date_str[:4])
+        position = bisect_left(dates, date_str)
+        return position < len(dates) and dates[position] == date_str
+
+    def next_after(self, date_str):
+        """Prima data di donazione successiva a date_str, anche negli anni seguenti"""
+        year = int(date_str[:4])
+        for offset in range(self.YEAR_SEARCH_SPAN):
+            dates = self.dates(year + offset)
+            position = bisect_right(dates, date_str)
+            if position < len(dates):
+                return dates[position]
+        return None
+
+    def previous_before(self, date_str):
+        """Ultima data di donazione precedente a date_str, anche negli anni precedenti"""
+        year = int(date_str[:4])
+        for offset in range(self.YEAR_SEARCH_SPAN):
+            dates = self.dates(year - offset)
+            position = bisect_left(dates, date_str)
+            if position > 0:
+                return dates[position - 1]
+        return None
+
+    def in_month(self, year, month):
+        """Date di donazione di un mese"""
+        dates = self.dates(year)
+        prefix = f"{int(year):04d}-{int(month):02d}-"
+        start = bisect_left(dates, prefix)
+        end = bisect_left(dates, f"{int(year):04d}-{int(month):02d}.")
+        return dates[start:end]
+
+    def invalidate(self, year=None):
+        """Dimentica le date di un anno (o di tutti) dopo una modifica"""
+        with self._lock:
+            if year is None:
+                self._years.clear()
+            else:
+                self._years.pop(int(year), None)
+
+def get_donation_index():
+    """Restituisce l'indice delle date di donazione condiviso"""
+    return DonationDateIndex.get_instance()
+
+def invalidate_donation_dates(year=None):
+    """Invalida l'indice delle date di donazione dell'anno (o di tutti)"""
+    DonationDateIndex.get_instance().invalidate(year)
+
+def invalidate_donation_path(db_path):
+    """Invalida l'anno se il file indicato è un database delle date di donazione"""
+    match = _DONATION_DATES_DB.match(os.path.basename(db_path))
+    if match:
+        invalidate_donation_dates(match.group(1))
@@ -0,0 +1,164 @@
+import hashlib
+import mmap
+import os
+import threading
+from core.database import get_db_connection
+from core.paths_manager import PathsManager
+from core.logger import logger
+
+# Letture da 1 MB per i file che non si possono mappare in memoria
+HASH_BUFFER_SIZE = 1024 * 1024
+
+# Le scritture di un database in modalità WAL restano nel file -wal fino al checkpoint
+WAL_SUFFIX = "-wal"
+
+def _update_hash(sha256_hash, path):
+    """Aggiunge all'hash il contenuto di un file
+
+    Il file viene mappato in memoria e passato a hashlib in un colpo solo;
+    se la mappatura non è possibile (file vuoto, alcuni file system di
+    rete) si legge a blocchi di HASH_BUFFER_SIZE.
+    """
+    with open(path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                sha256_hash.update(mapped)
+                return
+        except (ValueError, OSError):
+            f.seek(0)
+        for block in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
+            sha256_hash.update(block)
+
+def hash_file(path):
+    """SHA-256 del contenuto di un file, compreso il suo -wal se esiste
+
+    Le modifiche ancora nel -wal non sono nel file principale: senza il
+    -wal due copie con dati diversi potrebbero avere lo stesso hash.
+    """
+    sha256_hash = hashlib.sha256()
+    _update_hash(sha256_hash, path)
+    wal_path = path + WAL_SUFFIX
+    if os.path.exists(wal_path):
+        sha256_hash.update(b"\0" + WAL_SUFFIX.encode("ascii"))
+        _update_hash(sha256_hash, wal_path)
+    return sha256_hash.hexdigest()
+
+def _stat_key(path):
+    """(size, mtime_ns, inode) del file e (size, mtime_ns) del suo -wal (0 se manca)"""
+    stat = os.stat(path)
+    try:
+        wal_stat = os.stat(path + WAL_SUFFIX)
+        wal_key = (wal_stat.st_size, wal_stat.st_mtime_ns)
+    except FileNotFoundError:
+        wal_key = (0, 0)
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino) + wal_key
+
+class FileManifest:
+    """Hash dei file sincronizzati, conservati tra un avvio e l'altro
+
+    Per ogni percorso si memorizza l'hash insieme a (dimensione, mtime_ns,
+    inode) del file e (dimensione, mtime_ns) del suo -wal al momento del
+    calcolo: finché stat restituisce gli stessi valori il file non viene
+    riletto. Il manifesto sta in
+    sync_manifest.db nella cartella di configurazione locale, fuori dalla
+    cartella sincronizzata. I file eliminati o spostati vanno tolti con
+    forget (e all'avvio si scartano quelli che non esistono più), così un
+    file ricreato non eredita l'hash di quello vecchio.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = FileManifest()
+            return cls._instance
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(PathsManager().get_config_path(), "sync_manifest.db")
+        self._lock = threading.Lock()
+        self._entries = None    # percorso -> (chiave di _stat_key, hash)
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        with get_db_connection(self.db_path) as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(manifest)")]
+            # Manifesto senza lo stato del -wal: è solo una cache, si ricomincia da capo
+            if columns and "wal_size" not in columns:
+                conn.execute("DROP TABLE manifest")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS manifest (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    wal_size INTEGER NOT NULL,
+                    wal_mtime_ns INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL
+                )
+            ''')
+            rows = conn.execute("""SELECT path, size, mtime_ns, inode, wal_size, wal_mtime_ns, sha256
+                                   FROM manifest""").fetchall()
+            # File eliminati mentre l'applicazione era chiusa
+            missing = [(row[0],) for row in rows if not os.path.exists(row[0])]
+            if missing:
+                conn.executemany("DELETE FROM manifest WHERE path = ?", missing)
+        return {row[0]: (tuple(row[1:6]), row[6]) for row in rows if os.path.exists(row[0])}
+
+    def _entries_map(self):
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            return self._entries
+
+    def file_hash(self, path):
+        """Hash del file, ricalcolato solo se stat è cambiato dall'ultima volta"""
+        path = os.path.abspath(path)
+        key = _stat_key(path)
+        entries = self._entries_map()
+
+        with self._lock:
+            cached = entries.get(path)
+            if cached and cached[0] == key:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        digest = hash_file(path)
+        # Se il file è cambiato durante la lettura l'hash non va memorizzato
+        if _stat_key(path) == key:
+            self._store(path, key, digest)
+        return digest
+
+    def remember(self, path, digest):
+        """Registra l'hash già noto di un file appena scritto (es. dopo una copia)"""
+        path = os.path.abspath(path)
+        try:
+            self._entries_map()
+            self._store(path, _stat_key(path), digest)
+        except OSError as e:
+            logger.error(f"Errore nell'aggiornamento del manifesto per {path}: {str(e)}")
+
+    def forget(self, path):
+        """Rimuove un file dal manifesto"""
+        path = os.path.abspath(path)
+        entries = self._entries_map()
+        with self._lock:
+            if entries.pop(path, None) is None:
+                return
+        with get_db_connection(self.db_path) as conn:
+            conn.execute("DELETE FROM manifest WHERE path = ?", (path,))
+
+    def _store(self, path, key, digest):
+        with self._lock:
+            self._entries[path] = (key, digest)
+        with get_db_connection(self.db_path) as conn:
+            conn.execute("""INSERT OR REPLACE INTO manifest
+                                (path, size, mtime_ns, inode, wal_size, wal_mtime_ns, sha256)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)""", (path, *key, digest))
+
+def get_file_manifest():
+    """Restituisce il manifesto condiviso degli hash dei file"""
+    return FileManifest.get_instance()
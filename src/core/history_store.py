@@ -0,0 +1,95 @@
+import os
+import threading
+from core.database import get_db_connection, get_history_db_path
+from core.history_writer import insert_history_rows
+from core.path_resolver import get_path_resolver
+from core.schema import get_file_kind
+from core.logger import logger
+
+def _read_legacy_history(db_path):
+    """Entrate della vecchia tabella history di un database (None se non c'è)
+
+    Le versioni precedenti creavano history con strutture diverse
+    ((timestamp, action, details) oppure con id autoincrementale e colonna
+    user): le tre colonne comuni bastano per la cronologia unificata.
+    """
+    with get_db_connection(db_path) as conn:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history'"
+        ).fetchone()
+        if not exists:
+            return None
+        return conn.execute("""SELECT timestamp, action, details
+                               FROM history
+                               WHERE timestamp IS NOT NULL AND action IS NOT NULL""").fetchall()
+
+def _drop_legacy_history(db_path):
+    with get_db_connection(db_path) as conn:
+        conn.execute("DROP TABLE IF EXISTS history")
+
+def merge_legacy_history(year):
+    """Porta nella cronologia dell'anno le tabelle history degli altri database
+
+    Prenotazioni giornaliere, archivio annuale e date di donazione potevano
+    contenere una propria tabella history. Ogni file viene letto una sola
+    volta: le entrate sono inserite in cronologia_YYYY.db (i duplicati sono
+    scartati dall'impronta del contenuto), poi la vecchia tabella viene
+    eliminata e il file segnato in merged_history_files. Un'interruzione
+    a metà è innocua: alla ripresa le entrate già importate sono ignorate.
+
+    Returns:
+        int: Numero di entrate importate
+    """
+    year_path = get_path_resolver().year_path(year, create=False)
+    if not os.path.isdir(year_path):
+        return 0
+
+    candidates = [filename for filename in os.listdir(year_path)
+                  if get_file_kind(filename) not in (None, "cronologia")]
+    if not candidates:
+        return 0
+
+    history_db = get_history_db_path(year)
+    with get_db_connection(history_db) as conn:
+        done = {row[0] for row in conn.execute("SELECT filename FROM merged_history_files")}
+
+    imported = 0
+    for filename in sorted(set(candidates) - done):
+        source = os.path.join(year_path, filename)
+        try:
+            rows = _read_legacy_history(source)
+            with get_db_connection(history_db) as conn:
+                inserted = insert_history_rows(conn, rows) if rows else 0
+                conn.execute("""INSERT OR REPLACE INTO merged_history_files (filename, rows_imported)
+                                VALUES (?, ?)""", (filename, inserted))
+            if rows is not None:
+                _drop_legacy_history(source)
+            if rows:
+                logger.info(f"Cronologia di {filename} unificata: {inserted} entrate importate "
+                            f"su {len(rows)}")
+            imported += inserted
+
+        except Exception as e:
+            logger.error(f"Errore nell'unificazione della cronologia di {filename}: {str(e)}")
+
+    return imported
+
+def start_legacy_history_merge(years):
+    """Esegue merge_legacy_history per gli anni indicati in un thread separato
+
+    Viene avviata una volta all'avvio dell'applicazione: le letture della
+    cronologia (es. HistoryDialog) non scrivono mai sugli altri database.
+
+    Returns:
+        threading.Thread: Il thread avviato
+    """
+    def run():
+        for year in years:
+            try:
+                merge_legacy_history(year)
+            except Exception as e:
+                logger.error(f"Errore nell'unificazione della cronologia dell'anno {year}: {str(e)}")
+
+    thread = threading.Thread(target=run, name="LegacyHistoryMerge", daemon=True)
+    thread.start()
+    return thread
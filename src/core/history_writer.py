@@ -0,0 +1,168 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from core.logger import logger
+
+class HistoryWriter:
+    """Scrittura asincrona della cronologia su un thread dedicato
+
+    Le entrate vengono accodate dal thread dell'interfaccia e scritte in
+    blocco: il thread raccoglie quanto arriva entro FLUSH_INTERVAL secondi
+    (al massimo MAX_BATCH entrate) e lo scrive con una transazione per
+    ciascun database di cronologia.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    FLUSH_INTERVAL = 0.5   # Secondi di attesa per raggruppare le entrate
+    MAX_BATCH = 200        # Entrate massime per transazione
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = HistoryWriter()
+            return cls._instance
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, db_path, timestamp, action, details):
+        """Accoda un'entrata per il database di cronologia indicato"""
+        self._ensure_started()
+        self._queue.put(("entry", (db_path, (timestamp, action, details))))
+
+    def flush(self, timeout=10):
+        """Attende che tutte le entrate accodate siano state scritte"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                return True
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def stop(self, timeout=10):
+        """Scrive le entrate in sospeso e ferma il thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(("stop", None))
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning("Thread della cronologia non terminato entro il timeout")
+        else:
+            logger.info("Scrittura cronologia completata e thread arrestato")
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="HistoryWriter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        running = True
+        while running:
+            kind, payload = self._queue.get()
+            pending = []
+            waiters = []
+
+            # Raccogli le entrate arrivate entro l'intervallo di flush
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            while True:
+                if kind == "entry":
+                    pending.append(payload)
+                elif kind == "flush":
+                    waiters.append(payload)
+                    break
+                elif kind == "stop":
+                    running = False
+                    break
+
+                if len(pending) >= self.MAX_BATCH:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    kind, payload = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if not running:
+                # Svuota la coda: nessuna entrata deve andare persa alla chiusura
+                while True:
+                    try:
+                        kind, payload = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if kind == "entry":
+                        pending.append(payload)
+                    elif kind == "flush":
+                        waiters.append(payload)
+
+            self._write(pending)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, pending):
+        """Scrive le entrate raggruppate per database, una transazione ciascuno"""
+        from core.database import get_db_connection
+
+        by_path = {}
+        for db_path, row in pending:
+            by_path.setdefault(db_path, []).append(row)
+
+        for db_path, rows in by_path.items():
+            try:
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+                with get_db_connection(db_path) as conn:
+                    insert_history_rows(conn, rows)
+            except Exception as e:
+                logger.error(f"Errore nella scrittura della cronologia su {db_path}: {str(e)}")
+
+def insert_history_rows(conn, rows):
+    """Inserisce entrate (timestamp, action, details) in un database di cronologia
+
+    Le entrate già presenti con lo stesso contenuto vengono scartate
+    dall'indice univoco su entry_hash; quelle nuove vengono indicizzate
+    per la ricerca full-text nella stessa transazione, ciascuna con il
+    rowid del proprio inserimento (non dipende da cosa scrivono nel
+    frattempo altre connessioni).
+
+    Returns:
+        int: Numero di entrate effettivamente inserite
+    """
+    from core.schema import history_entry_hash, has_history_fts
+
+    index_fts = has_history_fts(conn)
+    inserted = 0
+    for timestamp, action, details in rows:
+        cursor = conn.execute("""INSERT OR IGNORE INTO history (timestamp, action, details, entry_hash)
+                                 VALUES (?, ?, ?, ?)""",
+                              (timestamp, action, details,
+                               history_entry_hash(timestamp, action, details)))
+        # rowcount 0: entrata già presente, ignorata dall'indice univoco
+        if cursor.rowcount != 1:
+            continue
+        inserted += 1
+        if index_fts:
+            conn.execute("INSERT INTO history_fts (rowid, details) VALUES (?, ?)",
+                         (cursor.lastrowid, details))
+    return inserted
+
+def flush_history(timeout=10):
+    """Attende la scrittura delle entrate di cronologia in sospeso"""
+    return HistoryWriter.get_instance().flush(timeout)
+
+def stop_history_writer():
+    """Scrive le entrate di cronologia in sospeso e ferma il thread di scrittura"""
+    HistoryWriter.get_instance().stop()
+
+# Anche senza closeEvent (es. uscita da script) le entrate accodate vengono scritte
+atexit.register(stop_history_writer)
@@ -44,10 +44,13 @@ class AutosaveManager(QObject):
             # Trova la finestra delle prenotazioni se è aperta
             dialog = self.main_window.findChild(DailyReservationsDialog)
             if dialog:
-                # Salva le prenotazioni correnti
-                table = dialog.reservations_widget.get_table()
+                # Salva solo se ci sono righe modificate
+                widget = dialog.reservations_widget
+                if not widget.has_changes():
+                    logger.debug("Autosave: nessuna modifica da salvare")
+                    return
                 date = dialog.selected_date.toString("yyyy-MM-dd")
-                if self.main_window.database_manager.save_reservations(table, date, False):
+                if self.main_window.database_manager.save_reservations(widget, date, False):
                     self.main_window.status_manager.update_last_save_info()
                     logger.debug("Autosave completato")
                 else:
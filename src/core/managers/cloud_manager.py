@@ -1,55 +1,20 @@
 from PyQt5.QtCore import QObject, QTimer, QSettings, pyqtSignal, QThread
 import os
-import shutil
-import time
 from datetime import datetime
 from core.logger import logger
 import sqlite3
-import hashlib
 from core.database import setup_cloud_monitoring
+from core.cache import invalidate_cached_path
+from core.donation_index import invalidate_donation_path
+from core.path_resolver import invalidate_paths
+from core.sync_scheduler import SyncScheduler
+from core.file_manifest import get_file_manifest
+from core.snapshot import snapshot_copy
+from core.delta_sync import is_sqlite_file
+from core.merge_sync import can_merge, merge_pair
+from core.schema import LOCAL_COPY_PREFIX
 from PyQt5.QtWidgets import QApplication
 
-class SyncThread(QThread):
-    def __init__(self, local_path, cloud_path, parent=None):
-        super().__init__(parent)
-        self.local_path = local_path
-        self.cloud_path = cloud_path
-        self.is_running = True
-        
-    def run(self):
-        logger.info(f"Thread di sincronizzazione avviato per {self.local_path}")
-        while self.is_running:
-            try:
-                if not self.is_running:
-                    logger.info("Thread interrotto, uscita...")
-                    break
-                    
-                if os.path.exists(self.local_path) and os.path.exists(self.cloud_path):
-                    local_mtime = os.path.getmtime(self.local_path)
-                    cloud_mtime = os.path.getmtime(self.cloud_path)
-                    
-                    if local_mtime > cloud_mtime:
-                        shutil.copy2(self.local_path, self.cloud_path)
-                    elif cloud_mtime > local_mtime:
-                        shutil.copy2(self.cloud_path, self.local_path)
-                
-                time.sleep(1)  # Ridotto il tempo di sleep per una chiusura più veloce
-            except Exception as e:
-                logger.error(f"Errore nella sincronizzazione: {str(e)}")
-                if not self.is_running:
-                    break
-                time.sleep(5)
-
-    def stop(self):
-        """Ferma il thread in modo sicuro"""
-        logger.info("Richiesta interruzione thread...")
-        self.is_running = False
-        if not self.wait(2000):  # Attendi max 2 secondi
-            logger.warning("Thread non terminato naturalmente, forzo la chiusura")
-            self.terminate()
-            self.wait()  # Attendi la terminazione forzata
-        logger.info("Thread terminato")
-
 class CloudSetupThread(QThread):
     def __init__(self, cloud_service):
         super().__init__()
@@ -92,7 +57,7 @@ class CloudManager(QObject):
         
         self.last_sync = None
         self.is_syncing = False
-        self.sync_threads = []
+        self.sync_scheduler = None
         self.observer = None
         self.is_cloud_mode = False
 
@@ -129,18 +94,14 @@ class CloudManager(QObject):
                 except Exception as e:
                     logger.error(f"Errore nell'arresto dell'observer: {str(e)}")
             
-            # Ferma i thread di sincronizzazione
-            if self.sync_threads:
-                logger.info(f"Arresto {len(self.sync_threads)} thread di sincronizzazione...")
-                for thread in self.sync_threads[:]:
-                    if thread and thread.isRunning():
-                        try:
-                            thread.stop()
-                            self.sync_threads.remove(thread)
-                        except Exception as e:
-                            logger.error(f"Errore nell'arresto del thread: {str(e)}")
-            
-            self.sync_threads.clear()
+            # Ferma la sincronizzazione a eventi
+            if self.sync_scheduler:
+                try:
+                    self.sync_scheduler.stop()
+                except Exception as e:
+                    logger.error(f"Errore nell'arresto della sincronizzazione: {str(e)}")
+                self.sync_scheduler = None
+            
             self.is_cloud_mode = False
             logger.info("Pulizia risorse cloud completata con successo")
             
@@ -204,22 +165,8 @@ class CloudManager(QObject):
                 logger.info(f"Creazione directory anno: {year_path}")
                 os.makedirs(year_path)
             
-            # Configura i thread di sincronizzazione
-            db_files = [f for f in os.listdir(year_path) if f.endswith('.db')]
-            logger.info(f"Trovati {len(db_files)} database da sincronizzare")
-            
-            for i, db_file in enumerate(db_files):
-                cloud_db_path = os.path.join(year_path, db_file)
-                local_db_path = os.path.join(os.path.dirname(cloud_db_path), f"local_{db_file}")
-                logger.info(f"Configurazione thread {i+1} per: {db_file}")
-                
-                try:
-                    sync_thread = SyncThread(local_db_path, cloud_db_path, parent=self)
-                    sync_thread.start()
-                    self.sync_threads.append(sync_thread)
-                    logger.info(f"Thread {i+1} avviato con successo")
-                except Exception as e:
-                    logger.error(f"Errore nell'avvio del thread {i+1}: {str(e)}")
+            # Un solo scheduler per tutti i database della cartella
+            self._start_sync_scheduler(year_path)
             
             self.is_cloud_mode = True
             logger.info("Configurazione sincronizzazione cloud completata con successo")
@@ -232,6 +179,69 @@ class CloudManager(QObject):
             self.is_cloud_mode = False
             return False
 
+    def _start_sync_scheduler(self, year_path):
+        """Avvia (o riavvia) la sincronizzazione a eventi della cartella dell'anno"""
+        if self.sync_scheduler:
+            self.sync_scheduler.stop()
+        self.sync_scheduler = SyncScheduler(year_path, self._sync_pair,
+                                            on_change=self._on_database_changed)
+        self.sync_scheduler.start()
+
+    def _on_database_changed(self, db_path):
+        """Un file della cartella è cambiato (anche da un'altra postazione)
+
+        Le cache le invalida l'observer di setup_cloud_monitoring.
+        """
+        # File eliminato o spostato: il suo hash non vale per un file ricreato
+        if not os.path.exists(db_path):
+            get_file_manifest().forget(db_path)
+
+    def _copy_database(self, source, dest):
+        """Copia source su dest e ne registra l'hash nel manifesto
+
+        Gli altri file vengono copiati byte per byte e dest riceve l'hash
+        di source. L'istantanea di un database SQLite invece non coincide
+        con il file source (le pagine del WAL vi sono già riportate):
+        l'hash di dest viene tolto e ricalcolato al prossimo confronto.
+        """
+        manifest = get_file_manifest()
+        digest = None if is_sqlite_file(source) else manifest.file_hash(source)
+        snapshot_copy(source, dest)
+        # Se source è cambiato durante la copia l'hash non è più quello di dest
+        if digest is not None and manifest.file_hash(source) == digest:
+            manifest.remember(dest, digest)
+        else:
+            manifest.forget(dest)
+
+    def _sync_pair(self, local_path, cloud_path):
+        """Allinea la copia locale e quella cloud di un database
+
+        I database dell'applicazione si uniscono riga per riga (vedi
+        core.merge_sync); per gli altri file vince la copia più recente.
+        Viene eseguita dai worker dello scheduler, fuori dal thread dell'interfaccia.
+        """
+        if not (os.path.exists(local_path) and os.path.exists(cloud_path)):
+            return
+            
+        # Copie identiche: niente da fare. Gli hash vengono dal manifesto,
+        # che non rilegge i file (e i loro -wal) non modificati
+        if self._get_file_hash(local_path) == self._get_file_hash(cloud_path):
+            return
+            
+        if can_merge(cloud_path):
+            merge_pair(local_path, cloud_path)
+            return
+            
+        local_mtime = os.path.getmtime(local_path)
+        cloud_mtime = os.path.getmtime(cloud_path)
+        
+        if local_mtime > cloud_mtime:
+            self._copy_database(local_path, cloud_path)
+            invalidate_cached_path(cloud_path)
+            invalidate_donation_path(cloud_path)
+        elif cloud_mtime > local_mtime:
+            self._copy_database(cloud_path, local_path)
+
     def start_delayed_sync(self):
         """Avvia la sincronizzazione dopo un ritardo"""
         if self.settings.value("pending_cloud_sync", False, type=bool):
@@ -265,15 +275,7 @@ class CloudManager(QObject):
             if not os.path.exists(year_path):
                 os.makedirs(year_path)
             
-            # Configura i thread di sincronizzazione
-            db_files = [f for f in os.listdir(year_path) if f.endswith('.db')]
-            for db_file in db_files:
-                cloud_db_path = os.path.join(year_path, db_file)
-                local_db_path = os.path.join(os.path.dirname(cloud_db_path), f"local_{db_file}")
-                
-                sync_thread = SyncThread(local_db_path, cloud_db_path, parent=self)
-                sync_thread.start()
-                self.sync_threads.append(sync_thread)
+            self._start_sync_scheduler(year_path)
             
             # Rimuovi il flag di sincronizzazione pendente
             self.settings.remove("pending_cloud_sync")
@@ -288,6 +290,7 @@ class CloudManager(QObject):
         self.cleanup()
         self.settings.setValue("cloud_service", "Locale")
         self.settings.setValue("cloud_path", "")
+        invalidate_paths()
         self.update_status_bar()
         logger.info("Modalità locale attivata")
 
@@ -333,14 +336,15 @@ class CloudManager(QObject):
             hemodos_path = os.path.join(cloud_path, "Hemodos", str(current_year))
             
             # Verifica e sincronizza ogni database
-            db_files = [f for f in os.listdir(hemodos_path) if f.endswith('.db')]
+            db_files = [f for f in os.listdir(hemodos_path)
+                        if f.endswith('.db') and not f.startswith(LOCAL_COPY_PREFIX)]
             for db_file in db_files:
                 cloud_db_path = os.path.join(hemodos_path, db_file)
                 local_db_path = os.path.join(os.path.dirname(cloud_db_path), f"local_{db_file}")
                 
                 # Se il file locale non esiste, crea una copia
                 if not os.path.exists(local_db_path):
-                    shutil.copy2(cloud_db_path, local_db_path)
+                    self._copy_database(cloud_db_path, local_db_path)
                     continue
                 
                 # Confronta le versioni e sincronizza
@@ -362,32 +366,33 @@ class CloudManager(QObject):
     def _sync_database(self, local_path, cloud_path):
         """Sincronizza un singolo database"""
         try:
-            # Ottieni l'hash dei file
+            # Hash dal manifesto: i file non modificati non vengono riletti
             local_hash = self._get_file_hash(local_path)
             cloud_hash = self._get_file_hash(cloud_path)
             
-            if local_hash != cloud_hash:
+            if local_hash != cloud_hash and can_merge(cloud_path):
+                # Modifiche su entrambe le copie: si uniscono le righe, nessuna va persa
+                merge_pair(local_path, cloud_path)
+            elif local_hash != cloud_hash:
                 # Ottieni i timestamp di modifica
                 local_mtime = os.path.getmtime(local_path)
                 cloud_mtime = os.path.getmtime(cloud_path)
                 
                 # Il file più recente vince
                 if local_mtime > cloud_mtime:
-                    shutil.copy2(local_path, cloud_path)
+                    self._copy_database(local_path, cloud_path)
+                    invalidate_cached_path(cloud_path)
+                    invalidate_donation_path(cloud_path)
                 else:
-                    shutil.copy2(cloud_path, local_path)
+                    self._copy_database(cloud_path, local_path)
                     
         except Exception as e:
             logger.error(f"Errore nella sincronizzazione del database {local_path}: {str(e)}")
             raise
 
     def _get_file_hash(self, file_path):
-        """Calcola l'hash SHA-256 di un file"""
-        sha256_hash = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+        """Hash SHA-256 di un file, ricalcolato solo se il file è cambiato"""
+        return get_file_manifest().file_hash(file_path)
 
     def stop_sync(self):
         """Ferma la sincronizzazione"""
@@ -398,6 +403,7 @@ class CloudManager(QObject):
         self.cleanup()
         self.settings.setValue("cloud_service", "Locale")
         self.settings.setValue("cloud_path", "")
+        invalidate_paths()
         self.update_status_bar()
         logger.info("Modalità locale attivata")
 
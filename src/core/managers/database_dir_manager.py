@@ -2,6 +2,7 @@ from PyQt5.QtCore import QObject, QSettings, QDate
 from PyQt5.QtWidgets import QMessageBox, QFileDialog, QInputDialog
 import os
 import logging
+from core.path_resolver import invalidate_paths
 import sys
 import platform
 
@@ -61,6 +62,7 @@ class DatabaseDirManager(QObject):
             self.settings.setValue("cloud_path", "")
             self.settings.setValue("selected_year", str(QDate.currentDate().year()))
             self.settings.setValue("hemodos_configured", True)
+            invalidate_paths()
             
             # Imposta modalità locale
             self.main_window.cloud_manager.set_local_mode()
@@ -91,6 +93,7 @@ class DatabaseDirManager(QObject):
                 self.settings.setValue("cloud_path", "")
                 self.settings.setValue("last_database", os.path.join(base_path, f"hemodos_{year}.db"))
                 self.settings.setValue("hemodos_configured", True)
+                invalidate_paths()
                 
                 # Imposta modalità locale
                 self.main_window.cloud_manager.set_local_mode()
@@ -135,6 +138,7 @@ class DatabaseDirManager(QObject):
             self.settings.setValue("cloud_path", cloud_path)
             self.settings.setValue("selected_year", str(QDate.currentDate().year()))
             self.settings.setValue("hemodos_configured", True)
+            invalidate_paths()
             return True
             
         except Exception as e:
@@ -174,6 +178,7 @@ class DatabaseDirManager(QObject):
                 self.settings.setValue("cloud_path", cloud_path)
                 self.settings.setValue("selected_year", year)
                 self.settings.setValue("hemodos_configured", True)
+                invalidate_paths()
                 return True
             return False
             
@@ -1,15 +1,19 @@
-from PyQt5.QtCore import QObject, QDate
-from PyQt5.QtWidgets import QTableWidgetItem, QMessageBox
+from PyQt5.QtCore import QObject, QDate, QTimer
+from PyQt5.QtWidgets import QMessageBox
 import os
 from datetime import datetime
 from core.logger import logger
 from core.database import (
-    init_db, get_db_path, add_reservation, 
-    save_donation_status, delete_reservation_from_db, add_to_history
+    init_db, get_db_path, delete_reservation_from_db, add_to_history,
+    is_yearly_storage, get_db_connection, save_day_reservations
 )
+from core.exceptions import DatabaseError
+from core.connection_pool import evict_idle_connections, close_connections
+from core.cache import get_reservation_cache
+from core.donation_index import invalidate_donation_dates
+from core.path_resolver import get_path_resolver
 from gui.dialogs.daily_reservations_dialog import DailyReservationsDialog
 import glob
-import sqlite3
 
 class DatabaseManager(QObject):
     def __init__(self, main_window):
@@ -19,11 +23,18 @@ class DatabaseManager(QObject):
         
         # Inizializza WAL mode per tutti i database esistenti
         self._init_wal_mode()
+        
+        # Chiude periodicamente le connessioni del pool rimaste inattive
+        self.pool_timer = QTimer(self)
+        self.pool_timer.timeout.connect(evict_idle_connections)
+        self.pool_timer.start(60000)
+        
+        # Cambiando cartella dei database le connessioni aperte non servono più
+        get_path_resolver().paths_changed.connect(self._on_paths_changed)
 
     def _init_wal_mode(self):
         """Inizializza il WAL mode per tutti i database esistenti"""
         try:
-            import sqlite3
             base_path = self._get_base_path()
             
             # Cerca tutti i database nell'applicazione
@@ -42,24 +53,23 @@ class DatabaseManager(QObject):
     def _enable_wal_for_db(self, db_path):
         """Abilita il WAL mode per un singolo database"""
         try:
-            with sqlite3.connect(db_path) as conn:
-                conn.execute("PRAGMA journal_mode=WAL")
-                # Ottimizzazioni aggiuntive per le prestazioni
-                conn.execute("PRAGMA synchronous=NORMAL")
-                conn.execute("PRAGMA temp_store=MEMORY")
-                conn.execute("PRAGMA mmap_size=30000000000")
+            # Il pool applica WAL e le altre PRAGMA all'apertura della connessione
+            with get_db_connection(db_path):
+                pass
             logger.debug(f"WAL mode abilitato per: {db_path}")
         except Exception as e:
             logger.error(f"Errore nell'abilitazione WAL mode per {db_path}: {str(e)}")
 
+    def _on_paths_changed(self, base_path):
+        """Chiude le connessioni del pool e svuota le cache dopo il cambio della cartella dei database"""
+        close_connections()
+        get_reservation_cache().clear()
+        invalidate_donation_dates()
+        logger.info(f"Cartella dei database cambiata: {base_path}")
+
     def _get_base_path(self):
         """Ottiene il percorso base per i database"""
-        service = self.main_window.settings.value("cloud_service", "Locale")
-        if service == "Locale":
-            return os.path.expanduser("~/Documents/Hemodos")
-        else:
-            cloud_path = self.main_window.settings.value("cloud_path", "")
-            return os.path.join(cloud_path, "Hemodos")
+        return get_path_resolver().base_path()
 
     def load_current_day(self):
         """Carica il database del giorno corrente"""
@@ -82,13 +92,11 @@ class DatabaseManager(QObject):
             logger.error(f"Errore nel caricamento del database giornaliero: {str(e)}")
             raise
 
-    def delete_reservation(self, table, current_row):
+    def delete_reservation(self, reservations_widget, current_row):
         """Elimina la prenotazione selezionata"""
         try:
             if current_row >= 0:
-                time = table.item(current_row, 0).text()
-                name = table.item(current_row, 1).text() if table.item(current_row, 1) else ""
-                surname = table.item(current_row, 2).text() if table.item(current_row, 2) else ""
+                time, name, surname, _, _ = reservations_widget.row_values(current_row)
                 
                 if name.strip() or surname.strip():
                     reply = QMessageBox.question(
@@ -100,13 +108,10 @@ class DatabaseManager(QObject):
                     )
                     
                     if reply == QMessageBox.Yes:
-                        date = self.main_window.calendar.selectedDate().toString("yyyy-MM-dd")
+                        date = reservations_widget.selected_date.toString("yyyy-MM-dd")
                         if delete_reservation_from_db(date, time):
                             # Reset row data
-                            table.setItem(current_row, 1, QTableWidgetItem(""))
-                            table.setItem(current_row, 2, QTableWidgetItem(""))
-                            table.cellWidget(current_row, 3).setCurrentText("No")
-                            table.cellWidget(current_row, 4).setCurrentText("Non effettuata")
+                            reservations_widget.reset_row(current_row)
                             self.main_window.status_manager.show_message("Prenotazione eliminata", 3000)
                 else:
                     QMessageBox.warning(
@@ -127,8 +132,8 @@ class DatabaseManager(QObject):
     def on_date_changed(self):
         """Gestisce il cambio di data"""
         try:
-            selected_date = self.main_window.calendar.selectedDate()
-            self.main_window.calendar_manager.highlight_donation_dates()
+            # Le date evidenziate cambiano solo con la pagina del calendario,
+            # gestita dal decoratore: qui basta aggiornare la barra di stato
             self.update_db_info()
             
         except Exception as e:
@@ -140,29 +145,32 @@ class DatabaseManager(QObject):
             selected_date = self.main_window.calendar.selectedDate()
             year = selected_date.year()
             date_str = selected_date.toString("dd/MM/yyyy")
-            db_path = get_db_path(selected_date)
             
-            exists = os.path.exists(os.path.dirname(db_path))
-            self.main_window.status_manager.update_db_info(year, date_str, exists)
+            # get_db_path crea sempre la directory dell'anno, quindi il controllo
+            # di esistenza era superfluo: un clic sul calendario non tocca il disco
+            self.main_window.status_manager.update_db_info(year, date_str)
                 
         except Exception as e:
             logger.error(f"Errore nell'aggiornamento delle info del database: {str(e)}")
             self.main_window.status_manager.set_db_error()
 
-    def save_reservations(self, table, date, show_dialog=True):
-        """Salva lo stato corrente delle prenotazioni"""
+    def save_reservations(self, reservations_widget, date, show_dialog=True):
+        """Salva le righe modificate delle prenotazioni
+        
+        Se nessuna riga è cambiata dall'ultimo caricamento o salvataggio
+        non viene eseguito alcun accesso al database.
+        """
         try:
-            # Salva ogni riga della tabella
-            for row in range(table.rowCount()):
-                time = table.item(row, 0).text()
-                name = table.item(row, 1).text() if table.item(row, 1) else ""
-                surname = table.item(row, 2).text() if table.item(row, 2) else ""
-                first_donation = table.cellWidget(row, 3).currentText() == "Sì"
-                stato = table.cellWidget(row, 4).currentText()
-                
-                if name.strip() or surname.strip():
-                    add_reservation(date, time, name, surname, first_donation)
-                    save_donation_status(date, time, stato)
+            rows = reservations_widget.get_dirty_rows()
+            if not rows:
+                if show_dialog:
+                    self.main_window.status_manager.show_message("Nessuna modifica da salvare", 3000)
+                return True
+            
+            # Salva le righe modificate in un'unica transazione
+            if not save_day_reservations(date, rows):
+                raise DatabaseError(f"impossibile salvare le prenotazioni del {date}")
+            reservations_widget.mark_saved(rows)
             
             # Controlla la dimensione del database e fai vacuum se necessario
             self._check_and_vacuum(date)
@@ -190,11 +198,15 @@ class DatabaseManager(QObject):
 
     def _check_and_vacuum(self, date):
         """Controlla la dimensione del database e esegue VACUUM se necessario"""
+        # La soglia è pensata per i file giornalieri: l'archivio annuale la
+        # supererebbe sempre, quindi viene compattato solo da optimize_database
+        if is_yearly_storage():
+            return
+            
         try:
             # Ottieni il percorso del database
             db_path = os.path.join(
-                os.path.dirname(get_db_path()),
-                date[:4],  # Anno
+                get_path_resolver().year_path(date[:4], create=False),
                 f"prenotazioni_{date[8:10]}_{date[5:7]}.db"  # giorno_mese.db
             )
             
@@ -206,9 +218,8 @@ class DatabaseManager(QObject):
                     logger.info(f"Database {db_path} supera 100KB ({size_kb:.2f}KB). Esecuzione VACUUM...")
                     
                     # Esegui VACUUM
-                    conn = sqlite3.connect(db_path)
-                    conn.execute("VACUUM")
-                    conn.close()
+                    with get_db_connection(db_path) as conn:
+                        conn.execute("VACUUM")
                     
                     # Registra la nuova dimensione
                     new_size_kb = os.path.getsize(db_path) / 1024
@@ -225,12 +236,18 @@ class DatabaseManager(QObject):
         """Ricarica il database e aggiorna le informazioni"""
         try:
             # Salva lo stato corrente se necessario
-            if self.main_window.settings.value("autosave_on_cloud_change", True, type=bool):
-                self.save_reservations(show_message=False)
+            dialog = self.main_window.findChild(DailyReservationsDialog)
+            if dialog and self.main_window.settings.value("autosave_on_cloud_change", True, type=bool):
+                self.save_reservations(
+                    dialog.reservations_widget,
+                    dialog.selected_date.toString("yyyy-MM-dd"),
+                    False
+                )
             
             # Ricarica le prenotazioni
             selected_date = self.main_window.calendar.selectedDate()
-            self.main_window.reservations_widget.load_reservations(selected_date)
+            if dialog:
+                dialog.reservations_widget.load_reservations(dialog.selected_date)
             
             # Aggiorna le informazioni
             self.update_db_info()
@@ -251,10 +268,10 @@ class DatabaseManager(QObject):
             # Trova e salva le impostazioni aperte
             dialog = self.main_window.findChild(DailyReservationsDialog)
             if dialog:
-                dialog.save_reservations(
-                    table=dialog.reservations_table,
-                    date=dialog.date_edit.date().toString("yyyy-MM-dd"),
-                    show_dialog=False
+                self.save_reservations(
+                    dialog.reservations_widget,
+                    dialog.selected_date.toString("yyyy-MM-dd"),
+                    False
                 )
             # Esegui VACUUM se serve
             self._check_and_vacuum(QDate.currentDate().toString("yyyy-MM-dd"))
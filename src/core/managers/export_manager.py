@@ -25,8 +25,7 @@ class ExportManager:
                 dialog = reservations_widget.parent()
                 date = dialog.selected_date.toString("yyyy-MM-dd")
 
-            table = reservations_widget.get_table()
-            if table.rowCount() == 0:
+            if reservations_widget.model.rowCount() == 0:
                 QMessageBox.warning(self.main_window, "Attenzione", "Non ci sono dati da esportare")
                 return
 
@@ -41,7 +40,7 @@ class ExportManager:
             
             if file_path:
                 # Raccogli i dati dalla tabella
-                data = self._collect_table_data(table)
+                data = reservations_widget.get_booked_rows()
                 
                 # Esporta
                 if export_to_docx(date, data, file_path, logo_path=None):
@@ -69,24 +68,8 @@ class ExportManager:
             dialog = QPrintDialog(printer, self.main_window)
             
             if dialog.exec_() == QPrintDialog.Accepted:
-                table = reservations_widget.get_table()
-                data = self._collect_table_data(table)
+                data = reservations_widget.get_booked_rows()
                 print_data(printer, data)
                 
         except Exception as e:
             self.main_window._handle_error("la stampa", e)
-
-    def _collect_table_data(self, table):
-        """Raccoglie i dati dalla tabella"""
-        data = []
-        for row in range(table.rowCount()):
-            time = table.item(row, 0).text()
-            name = table.item(row, 1).text() if table.item(row, 1) else ""
-            surname = table.item(row, 2).text() if table.item(row, 2) else ""
-            first_donation = table.cellWidget(row, 3).currentText()
-            stato = table.cellWidget(row, 4).currentText()
-            
-            if name.strip() or surname.strip():
-                data.append([time, name, surname, first_donation, stato])
-        
-        return data 
\ No newline at end of file
@@ -72,6 +72,11 @@ class MenuManager:
         statistics_action = QAction(QIcon(main_window.paths_manager.get_asset_path('stats.png')), 'Statistiche', main_window)
         statistics_action.triggered.connect(main_window.show_statistics)
         tools_menu.addAction(statistics_action)
+        
+        # Rebuild statistics action
+        rebuild_stats_action = QAction('Ricalcola statistiche', main_window)
+        rebuild_stats_action.triggered.connect(main_window.rebuild_statistics)
+        tools_menu.addAction(rebuild_stats_action)
 
         # Menu Settings
         settings_menu = menubar.addMenu('Impostazioni')
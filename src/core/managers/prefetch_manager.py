@@ -0,0 +1,66 @@
+from PyQt5.QtCore import QObject, QDate
+from core.async_loader import DatabaseLoader
+from core.cache import get_reservation_cache
+from core.donation_index import get_donation_index
+from core.logger import logger
+
+class PrefetchManager(QObject):
+    """Precarica in cache le prenotazioni dei giorni vicini a quello aperto
+
+    Mentre un giorno è aperto vengono caricati in background la data di
+    donazione precedente e quella successiva e le date di donazione del
+    mese mostrato dal calendario. I giorni sono caricati uno alla volta,
+    per non sovraccaricare la cartella cloud.
+    """
+    def __init__(self, main_window):
+        super().__init__()
+        self.main_window = main_window
+        self.queue = []
+        self.loader = None
+
+    def prefetch_around(self, date):
+        """Accoda il precaricamento dei giorni vicini alla data aperta"""
+        try:
+            self.queue = self._targets(date)
+            if self.queue:
+                logger.debug(f"Prefetch di {len(self.queue)} giorni attorno a {date.toString('yyyy-MM-dd')}")
+            self._start_next()
+        except Exception as e:
+            logger.error(f"Errore nel prefetch delle prenotazioni: {str(e)}")
+
+    def stop(self):
+        """Svuota la coda e attende il caricamento in corso"""
+        self.queue = []
+        if self.loader is not None:
+            self.loader.wait()
+            self.loader = None
+
+    def _targets(self, date):
+        """Date da precaricare, escluse quella aperta e quelle già in cache"""
+        index = get_donation_index()
+        date_str = date.toString("yyyy-MM-dd")
+
+        targets = [index.next_after(date_str), index.previous_before(date_str)]
+        calendar = self.main_window.calendar
+        targets.extend(index.in_month(calendar.yearShown(), calendar.monthShown()))
+
+        cache = get_reservation_cache()
+        result = []
+        for target in targets:
+            if target and target != date_str and target not in cache and target not in result:
+                result.append(target)
+        return [QDate.fromString(target, "yyyy-MM-dd") for target in result]
+
+    def _start_next(self):
+        if self.loader is not None or not self.queue:
+            return
+        self.loader = DatabaseLoader(self.queue.pop(0), create_missing=False)
+        self.loader.finished.connect(self._on_loader_finished)
+        self.loader.start()
+
+    def _on_loader_finished(self):
+        loader = self.loader
+        self.loader = None
+        if loader is not None:
+            loader.deleteLater()
+        self._start_next()
@@ -113,18 +113,3 @@ class PrintManager:
                     
         except Exception as e:
             dialog.show_status_message(f"Errore durante la stampa: {str(e)}", 3000)
-
-    def _collect_table_data(self, table):
-        """Raccoglie i dati dalla tabella"""
-        data = []
-        for row in range(table.rowCount()):
-            time = table.item(row, 0).text()
-            name = table.item(row, 1).text() if table.item(row, 1) else ""
-            surname = table.item(row, 2).text() if table.item(row, 2) else ""
-            first_donation = table.cellWidget(row, 3).currentText()
-            stato = table.cellWidget(row, 4).currentText()
-            
-            if name.strip() or surname.strip():
-                data.append([time, name, surname, first_donation, stato])
-                
-        return data 
\ No newline at end of file
@@ -1,7 +1,7 @@
 from PyQt5.QtCore import QObject, QSettings, pyqtSignal
 import os
 from datetime import datetime
-from core.database import get_db_path
+from core.path_resolver import get_path_resolver
 from core.logger import logger
 
 class YearManager(QObject):
@@ -16,19 +16,8 @@ class YearManager(QObject):
     def create_year_structure(self, year):
         """Crea la struttura dell'anno con tutti i database necessari"""
         try:
-            # Ottieni il percorso base (Hemodos)
-            settings = QSettings('Hemodos', 'DatabaseSettings')
-            service = settings.value("cloud_service", "Locale")
-            
-            if service == "Locale":
-                base_path = os.path.expanduser("~/Documents/Hemodos")
-            else:
-                cloud_path = settings.value("cloud_path", "")
-                base_path = os.path.join(cloud_path, "Hemodos")
-            
             # Crea la directory dell'anno
-            year_path = os.path.join(base_path, str(year))
-            os.makedirs(year_path, exist_ok=True)
+            year_path = get_path_resolver().year_path(year)
             
             # Crea i database annuali
             databases = [
@@ -63,7 +52,7 @@ class YearManager(QObject):
             
             if year != current_year:
                 # Crea la struttura del nuovo anno se non esiste
-                if not os.path.exists(os.path.join(os.path.dirname(get_db_path()), str(year))):
+                if not os.path.exists(get_path_resolver().year_path(year, create=False)):
                     if not self.create_year_structure(year):
                         return False
                 
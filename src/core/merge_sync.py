@@ -0,0 +1,227 @@
+import os
+from core.database import DAY_COUNTS_SQL, get_db_connection, is_yearly_storage, store_day_stats
+from core.cache import invalidate_cached_path
+from core.donation_index import invalidate_donation_path
+from core.history_writer import insert_history_rows
+from core.schema import LOCAL_COPY_PREFIX, get_file_kind
+from core.logger import logger
+
+class TableMerge:
+    """Come unire una tabella di due copie dello stesso database
+
+    keys: colonne della chiave primaria
+    version: colonna con l'istante dell'ultima modifica della riga
+    content: colonne confrontate a parità di version, per scegliere la
+        stessa riga da entrambe le parti (vuoto: le righe già presenti
+        non vengono sostituite)
+    deletion_log: tabella con le chiavi eliminate (vedi core.schema)
+    """
+    def __init__(self, table, keys, version, content, deletion_log):
+        self.table = table
+        self.keys = keys
+        self.version = version
+        self.content = content
+        self.deletion_log = deletion_log
+
+    def _join(self, left, right):
+        return " AND ".join(f"{left}.{key} = {right}.{key}" for key in self.keys)
+
+    def merge(self, conn):
+        """Porta in main le modifiche della copia collegata come other
+
+        Returns:
+            list: Chiavi (tuple) delle righe inserite, sostituite o eliminate
+        """
+        key = self.keys[0]
+        columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({self.table})")]
+        column_list = ", ".join(columns)
+        source_columns = ", ".join(f"o.{column}" for column in columns)
+
+        # Righe di other più recenti (o assenti) in main e non eliminate dopo in main
+        newer = f"m.{key} IS NULL AND (d.{key} IS NULL OR d.deleted_at < o.{self.version})"
+        if self.content:
+            other_content = ", ".join(f"o.{column}" for column in self.content)
+            main_content = ", ".join(f"m.{column}" for column in self.content)
+            newer += f""" OR (m.{key} IS NOT NULL AND (o.{self.version} > m.{self.version}
+                            OR (o.{self.version} = m.{self.version}
+                                AND ({other_content}) > ({main_content}))))"""
+        conn.execute("DROP TABLE IF EXISTS temp.merge_rows")
+        conn.execute(f"""CREATE TEMP TABLE merge_rows AS
+                         SELECT {source_columns}
+                         FROM other.{self.table} o
+                         LEFT JOIN main.{self.table} m ON {self._join('m', 'o')}
+                         LEFT JOIN main.{self.deletion_log} d ON {self._join('d', 'o')}
+                         WHERE {newer}""")
+
+        # Eliminazioni di other successive all'ultima modifica della riga in main
+        conn.execute("DROP TABLE IF EXISTS temp.merge_deleted")
+        conn.execute(f"""CREATE TEMP TABLE merge_deleted AS
+                         SELECT od.*
+                         FROM other.{self.deletion_log} od
+                         LEFT JOIN main.{self.table} m ON {self._join('m', 'od')}
+                         LEFT JOIN main.{self.deletion_log} d ON {self._join('d', 'od')}
+                         WHERE (m.{key} IS NULL OR od.deleted_at >= m.{self.version})
+                           AND (d.{key} IS NULL OR od.deleted_at > d.deleted_at)""")
+
+        key_list = ", ".join(self.keys)
+        conn.execute(f"""DELETE FROM main.{self.table}
+                         WHERE ({key_list}) IN (SELECT {key_list} FROM temp.merge_deleted)""")
+        # Il trigger ha annotato l'eliminazione ora: va conservato l'istante originale
+        conn.execute(f"""INSERT OR REPLACE INTO main.{self.deletion_log}
+                         SELECT * FROM temp.merge_deleted""")
+        conn.execute(f"""INSERT OR REPLACE INTO main.{self.table} ({column_list})
+                         SELECT {column_list} FROM temp.merge_rows""")
+
+        changed = conn.execute(f"""SELECT {key_list} FROM temp.merge_rows
+                                   UNION
+                                   SELECT {key_list} FROM temp.merge_deleted""").fetchall()
+        conn.execute("DROP TABLE temp.merge_rows")
+        conn.execute("DROP TABLE temp.merge_deleted")
+        return changed
+
+RESERVATIONS_CONTENT = ("name", "surname", "first_donation", "stato")
+
+# Tabelle unite per ogni tipo di database (la cronologia si unisce per impronta)
+MERGE_TABLES = {
+    "prenotazioni": [TableMerge("reservations", ("time",), "updated_at",
+                                RESERVATIONS_CONTENT, "deleted_reservations")],
+    "hemodos": [TableMerge("reservations", ("date", "time"), "updated_at",
+                           RESERVATIONS_CONTENT, "deleted_reservations")],
+    "date_donazione": [TableMerge("donation_dates", ("date",), "created_at",
+                                  (), "deleted_donation_dates")],
+    "cronologia": [],
+}
+
+def can_merge(db_path):
+    """Verifica se il database si sincronizza unendo le righe"""
+    return get_file_kind(db_path) in MERGE_TABLES
+
+def _merge_history(conn):
+    rows = conn.execute("""SELECT o.timestamp, o.action, o.details
+                           FROM other.history o
+                           WHERE NOT EXISTS (SELECT 1 FROM main.history m
+                                             WHERE m.entry_hash = o.entry_hash)""").fetchall()
+    return insert_history_rows(conn, rows) if rows else 0
+
+def _changed_dates(kind, db_path, changed_keys):
+    """Giorni le cui statistiche vanno aggiornate dopo l'unione"""
+    if kind == "hemodos":
+        return {date_str for date_str, _ in changed_keys}
+    if kind == "prenotazioni" and changed_keys:
+        day, month = os.path.basename(db_path)[:-len(".db")].split("_")[-2:]
+        year = os.path.basename(os.path.dirname(os.path.abspath(db_path)))
+        return {f"{year}-{month}-{day}"}
+    return set()
+
+def _day_counts(conn, kind, dates):
+    """Conteggi dei giorni cambiati letti dalla copia unita (main)
+
+    Returns:
+        dict: data yyyy-MM-dd -> (total, completed, first)
+    """
+    if kind == "prenotazioni":
+        total, completed, first = conn.execute(
+            f"SELECT {DAY_COUNTS_SQL} FROM main.reservations").fetchone()
+        return {date_str: (total or 0, completed or 0, first or 0) for date_str in dates}
+
+    # Un giorno senza più prenotazioni non compare nel raggruppamento
+    counts = {date_str: (0, 0, 0) for date_str in dates}
+    placeholders = ", ".join("?" * len(dates))
+    rows = conn.execute(f"""SELECT date, {DAY_COUNTS_SQL}
+                            FROM main.reservations
+                            WHERE date IN ({placeholders})
+                            GROUP BY date""", tuple(dates)).fetchall()
+    for date_str, total, completed, first in rows:
+        counts[date_str] = (total or 0, completed or 0, first or 0)
+    return counts
+
+def _tracks_stats(kind):
+    """Verifica se le statistiche si calcolano dai database di questo tipo
+
+    Con l'archivio annuale contano le prenotazioni di hemodos_YYYY.db, con
+    quello giornaliero i file prenotazioni_DD_MM.db.
+    """
+    if kind == "hemodos":
+        return is_yearly_storage()
+    return kind == "prenotazioni" and not is_yearly_storage()
+
+def _stats_path(db_path, year):
+    """hemodos_YYYY.db accanto a un file giornaliero, con lo stesso prefisso local_"""
+    name = os.path.basename(db_path)
+    prefix = LOCAL_COPY_PREFIX if name.startswith(LOCAL_COPY_PREFIX) else ""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), f"{prefix}hemodos_{year}.db")
+
+def _store_stats(conn, day_counts):
+    by_year = {}
+    for date_str, counts in day_counts.items():
+        by_year.setdefault(int(date_str[:4]), {})[date_str] = counts
+    for year, counts in by_year.items():
+        store_day_stats(conn, year, counts)
+
+def merge_into(target_path, source_path):
+    """Porta in target_path le righe di source_path più recenti
+
+    Le prenotazioni si confrontano per chiave e updated_at: vince la
+    modifica più recente, anche se è un'eliminazione. Le righe della
+    cronologia si uniscono per impronta del contenuto. Si scrivono solo le
+    righe cambiate, in una transazione su target_path. Le statistiche dei
+    giorni cambiati si ricalcolano dalle righe di target_path appena
+    unite: in hemodos_YYYY.db nella stessa transazione, per i file
+    giornalieri nell'hemodos_YYYY.db della stessa cartella.
+
+    Returns:
+        int: Numero di righe cambiate in target_path
+    """
+    kind = get_file_kind(target_path)
+    if kind not in MERGE_TABLES:
+        raise ValueError(f"Unione non supportata per {target_path}")
+
+    # Lo schema della sorgente va aggiornato prima di collegarla
+    with get_db_connection(source_path):
+        pass
+
+    changed_keys = []
+    history_rows = 0
+    day_counts = {}
+    with get_db_connection(target_path) as conn:
+        conn.execute("ATTACH DATABASE ? AS other", (source_path,))
+        try:
+            for table_merge in MERGE_TABLES[kind]:
+                changed_keys.extend(table_merge.merge(conn))
+            if kind == "cronologia":
+                history_rows = _merge_history(conn)
+            if changed_keys and _tracks_stats(kind):
+                day_counts = _day_counts(conn, kind, _changed_dates(kind, target_path, changed_keys))
+                if kind == "hemodos":
+                    _store_stats(conn, day_counts)
+            # Niente da unire: nessuna scrittura, che risveglierebbe la sincronizzazione
+            if changed_keys or history_rows:
+                conn.commit()
+            else:
+                conn.rollback()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE other")
+
+    changed = len(changed_keys) + history_rows
+    if changed:
+        invalidate_cached_path(target_path)
+        invalidate_donation_path(target_path)
+        if day_counts and kind == "prenotazioni":
+            year = int(next(iter(day_counts))[:4])
+            with get_db_connection(_stats_path(target_path, year)) as conn:
+                _store_stats(conn, day_counts)
+        logger.info(f"Unione di {os.path.basename(source_path)} in {target_path}: {changed} righe")
+    return changed
+
+def merge_pair(local_path, cloud_path):
+    """Allinea due copie dello stesso database unendo le righe in entrambe le direzioni
+
+    Returns:
+        tuple: (righe cambiate nella copia cloud, righe cambiate nella copia locale)
+    """
+    to_cloud = merge_into(cloud_path, local_path)
+    to_local = merge_into(local_path, cloud_path)
+    return to_cloud, to_local
@@ -0,0 +1,94 @@
+import os
+import threading
+from PyQt5.QtCore import QObject, QSettings, pyqtSignal
+from core.logger import logger
+
+class PathResolver(QObject):
+    """Risolve e memorizza i percorsi dei database
+
+    Il percorso base (locale o cloud) viene letto dalle impostazioni una sola
+    volta e le directory degli anni vengono create una sola volta: su una
+    cartella cloud ogni makedirs/exists è un accesso lento al filesystem.
+    La cache va invalidata con invalidate() quando cambia la configurazione
+    (cloud_service, cloud_path o last_database).
+    """
+    # Emesso dopo l'invalidazione con il nuovo percorso base
+    paths_changed = pyqtSignal(str)
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = PathResolver()
+            return cls._instance
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._base_path = None
+        self._last_database = None
+        self._year_dirs = set()
+
+    def base_path(self):
+        """Percorso della cartella Hemodos (locale o nel cloud)"""
+        with self._lock:
+            if self._base_path is None:
+                self._load()
+            return self._base_path
+
+    def last_database(self):
+        """Ultimo database annuale aperto, se impostato"""
+        with self._lock:
+            if self._base_path is None:
+                self._load()
+            return self._last_database
+
+    def year_path(self, year, create=True):
+        """Percorso della directory dell'anno, creata al primo utilizzo se richiesto"""
+        path = os.path.join(self.base_path(), str(year))
+        if create:
+            with self._lock:
+                if path not in self._year_dirs:
+                    os.makedirs(path, exist_ok=True)
+                    self._year_dirs.add(path)
+        return path
+
+    def forget_year(self, year):
+        """Dimentica la directory di un anno eliminata o spostata"""
+        path = os.path.join(self.base_path(), str(year))
+        with self._lock:
+            self._year_dirs.discard(path)
+
+    def invalidate(self):
+        """Svuota la cache dopo una modifica della configurazione dei percorsi"""
+        with self._lock:
+            self._base_path = None
+            self._last_database = None
+            self._year_dirs.clear()
+        base_path = self.base_path()
+        logger.info(f"Percorsi dei database aggiornati: {base_path}")
+        self.paths_changed.emit(base_path)
+
+    def _load(self):
+        """Legge la configurazione (da chiamare con il lock acquisito)"""
+        settings = QSettings('Hemodos', 'DatabaseSettings')
+        service = settings.value("cloud_service", "Locale")
+
+        if service == "Locale":
+            self._base_path = os.path.expanduser("~/Documents/Hemodos")
+        else:
+            cloud_path = settings.value("cloud_path", "")
+            self._base_path = os.path.join(cloud_path, "Hemodos")
+
+        self._last_database = settings.value("last_database") or None
+
+def get_path_resolver():
+    """Restituisce il risolutore dei percorsi condiviso"""
+    return PathResolver.get_instance()
+
+def invalidate_paths():
+    """Invalida la cache dei percorsi dopo una modifica delle impostazioni"""
+    PathResolver.get_instance().invalidate()
@@ -0,0 +1,372 @@
+import hashlib
+import os
+import re
+import sqlite3
+from core.logger import logger
+
+# Tipi di database riconosciuti dal nome del file
+FILE_KINDS = (
+    ("prenotazioni", re.compile(r"^prenotazioni_\d{2}_\d{2}\.db$")),
+    ("hemodos", re.compile(r"^hemodos_\d{4}\.db$")),
+    ("cronologia", re.compile(r"^cronologia_\d{4}\.db$")),
+    ("date_donazione", re.compile(r"^date_donazione_\d{4}\.db$")),
+)
+
+# Prefisso delle copie locali dei database nella cartella cloud
+LOCAL_COPY_PREFIX = "local_"
+
+def get_file_kind(db_path):
+    """Restituisce il tipo di database in base al nome del file (None se sconosciuto)
+
+    Le copie locali della sincronizzazione cloud (local_X.db) hanno il tipo di X.db.
+    """
+    filename = os.path.basename(db_path)
+    if filename.startswith(LOCAL_COPY_PREFIX):
+        filename = filename[len(LOCAL_COPY_PREFIX):]
+    for kind, pattern in FILE_KINDS:
+        if pattern.match(filename):
+            return kind
+    return None
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def _column_or(columns, name, default):
+    """Espressione SQL per una colonna che nei file più vecchi può mancare"""
+    return name if name in columns else default
+
+# --- prenotazioni_DD_MM.db -------------------------------------------------
+
+def _daily_v1(conn):
+    """Schema canonico: una riga per orario, con time come chiave primaria
+
+    Ricostruisce la tabella reservations creata da init_db (chiave id, più
+    righe per lo stesso orario) o da add_reservation (senza colonne
+    stato/created_at nelle versioni più vecchie), conservando per ogni
+    orario la riga scritta per ultima.
+    """
+    columns = _table_columns(conn, "reservations")
+
+    conn.execute('''
+        CREATE TABLE reservations_v1 (
+            time TEXT PRIMARY KEY,
+            name TEXT DEFAULT '',
+            surname TEXT DEFAULT '',
+            first_donation BOOLEAN DEFAULT 0,
+            stato TEXT DEFAULT 'Non effettuata',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    if columns:
+        first_donation = _column_or(columns, "first_donation", "0")
+        stato = _column_or(columns, "stato", "'Non effettuata'")
+        created_at = _column_or(columns, "created_at", "CURRENT_TIMESTAMP")
+        updated_at = _column_or(columns, "updated_at", "CURRENT_TIMESTAMP")
+        conn.execute(f'''
+            INSERT OR IGNORE INTO reservations_v1
+                (time, name, surname, first_donation, stato, created_at, updated_at)
+            SELECT time, COALESCE(name, ''), COALESCE(surname, ''),
+                   COALESCE({first_donation}, 0),
+                   COALESCE({stato}, 'Non effettuata'),
+                   COALESCE({created_at}, CURRENT_TIMESTAMP),
+                   COALESCE({updated_at}, CURRENT_TIMESTAMP)
+            FROM reservations
+            WHERE time IS NOT NULL
+            ORDER BY rowid DESC
+        ''')
+        conn.execute("DROP TABLE reservations")
+
+    conn.execute("ALTER TABLE reservations_v1 RENAME TO reservations")
+    conn.execute('''
+        CREATE TRIGGER update_reservation_timestamp
+        AFTER UPDATE ON reservations
+        WHEN NEW.updated_at = OLD.updated_at
+        BEGIN
+            UPDATE reservations SET updated_at = CURRENT_TIMESTAMP
+            WHERE time = NEW.time;
+        END
+    ''')
+
+    # init_db creava in ogni file giornaliero una tabella history mai usata
+    if _table_columns(conn, "history"):
+        if conn.execute("SELECT COUNT(*) FROM history").fetchone()[0] == 0:
+            conn.execute("DROP TABLE history")
+
+def _create_deletion_log(conn, table, log_table, keys):
+    """Registro delle righe eliminate da table, per la sincronizzazione a righe
+
+    Un trigger annota in log_table la chiave e l'istante di ogni
+    eliminazione; un secondo trigger toglie l'annotazione quando la chiave
+    viene reinserita. Senza il registro, l'unione di due copie (vedi
+    core.merge_sync) farebbe ricomparire le righe eliminate in una sola.
+    """
+    key_columns = ", ".join(keys)
+    old_values = ", ".join(f"OLD.{key}" for key in keys)
+    new_match = " AND ".join(f"{key} = NEW.{key}" for key in keys)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {log_table} (
+            {", ".join(f"{key} TEXT NOT NULL" for key in keys)},
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY ({key_columns})
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS log_{table}_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            INSERT OR REPLACE INTO {log_table} ({key_columns}, deleted_at)
+            VALUES ({old_values}, CURRENT_TIMESTAMP);
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS unlog_{table}_delete
+        AFTER INSERT ON {table}
+        BEGIN
+            DELETE FROM {log_table} WHERE {new_match};
+        END
+    ''')
+
+def _daily_v2(conn):
+    """Registro delle prenotazioni eliminate"""
+    _create_deletion_log(conn, "reservations", "deleted_reservations", ("time",))
+
+# --- hemodos_YYYY.db -------------------------------------------------------
+
+def _yearly_v1(conn):
+    """Archivio annuale delle prenotazioni, tabelle di statistica e migrazioni"""
+    # init_db(None) poteva creare in hemodos_YYYY.db la tabella giornaliera
+    # (senza colonna date): se vuota si elimina, altrimenti si conserva a parte
+    columns = _table_columns(conn, "reservations")
+    if columns and "date" not in columns:
+        if conn.execute("SELECT COUNT(*) FROM reservations").fetchone()[0]:
+            conn.execute("ALTER TABLE reservations RENAME TO reservations_legacy")
+            logger.warning("Tabella reservations non annuale rinominata in reservations_legacy")
+        else:
+            conn.execute("DROP TABLE reservations")
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reservations (
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            name TEXT DEFAULT '',
+            surname TEXT DEFAULT '',
+            first_donation BOOLEAN DEFAULT 0,
+            stato TEXT DEFAULT 'Non effettuata',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (date, time)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reservations_date_stato ON reservations(date, stato)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reservations_surname ON reservations(surname, name)")
+
+    conn.execute("DROP TRIGGER IF EXISTS update_reservation_timestamp")
+    conn.execute('''
+        CREATE TRIGGER update_reservation_timestamp
+        AFTER UPDATE ON reservations
+        WHEN NEW.updated_at = OLD.updated_at
+        BEGIN
+            UPDATE reservations SET updated_at = CURRENT_TIMESTAMP
+            WHERE date = NEW.date AND time = NEW.time;
+        END
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS migrated_files (
+            filename TEXT PRIMARY KEY,
+            rows_imported INTEGER DEFAULT 0,
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS annual_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            total_donations INTEGER DEFAULT 0,
+            first_donations INTEGER DEFAULT 0,
+            completed_donations INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_annual_stats_date ON annual_stats(date)")
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            total_reservations INTEGER DEFAULT 0,
+            completed_donations INTEGER DEFAULT 0,
+            first_donations INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(year, month)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_monthly_stats_date ON monthly_stats(year, month)")
+
+def _yearly_v2(conn):
+    """Stato delle statistiche materializzate
+
+    annual_stats (una riga per giorno) e monthly_stats vengono aggiornate a
+    ogni scrittura delle prenotazioni; stats_state registra quando sono
+    state ricalcolate per intero, così i dati scritti prima della loro
+    introduzione vengono conteggiati con un ricalcolo iniziale.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_state (
+            year INTEGER PRIMARY KEY,
+            rebuilt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _yearly_v3(conn):
+    """Registro delle prenotazioni eliminate dall'archivio annuale"""
+    _create_deletion_log(conn, "reservations", "deleted_reservations", ("date", "time"))
+
+# --- cronologia_YYYY.db ----------------------------------------------------
+
+def _history_v1(conn):
+    """Cronologia dell'anno"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS history
+                    (timestamp text, action text, details text)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp)")
+
+def _history_v2(conn):
+    """Indice per tipo di azione e ricerca full-text sui dettagli
+
+    history_fts è una tabella FTS5 a contenuto esterno (i testi restano solo
+    in history): la tiene allineata il thread della cronologia, che vi
+    inserisce ogni blocco di entrate appena scritte. Se SQLite non include
+    FTS5 la ricerca ripiega su LIKE.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_action ON history(action, timestamp)")
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                details,
+                content='history',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Ricerca full-text non disponibile: {str(e)}")
+        return
+    conn.execute("INSERT INTO history_fts(history_fts) VALUES('rebuild')")
+
+def history_entry_hash(timestamp, action, details):
+    """Impronta del contenuto di un'entrata di cronologia (chiave di deduplica)"""
+    content = "\x1f".join(value or "" for value in (timestamp, action, details))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def _history_v3(conn):
+    """Impronta univoca del contenuto: un'entrata identica non si inserisce due volte
+
+    Le entrate già duplicate (stesso istante, azione e dettagli) vengono
+    ridotte alla prima; l'indice full-text viene ricostruito se sono
+    state eliminate righe.
+    """
+    conn.execute("ALTER TABLE history ADD COLUMN entry_hash TEXT")
+    rows = conn.execute("SELECT rowid, timestamp, action, details FROM history").fetchall()
+    conn.executemany("UPDATE history SET entry_hash = ? WHERE rowid = ?",
+                     [(history_entry_hash(timestamp, action, details), rowid)
+                      for rowid, timestamp, action, details in rows])
+
+    removed = conn.execute("""DELETE FROM history
+                              WHERE rowid NOT IN (SELECT MIN(rowid) FROM history GROUP BY entry_hash)""").rowcount
+    conn.execute("CREATE UNIQUE INDEX idx_history_entry_hash ON history(entry_hash)")
+
+    # Origini già importate nella cronologia unificata (vedi core.history_store)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS merged_history_files (
+            filename TEXT PRIMARY KEY,
+            rows_imported INTEGER DEFAULT 0,
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    if removed:
+        logger.info(f"Rimosse {removed} entrate duplicate dalla cronologia")
+        if has_history_fts(conn):
+            conn.execute("INSERT INTO history_fts(history_fts) VALUES('rebuild')")
+
+def has_history_fts(conn):
+    """Verifica se il database della cronologia ha l'indice full-text"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'"
+    ).fetchone() is not None
+
+# --- date_donazione_YYYY.db ------------------------------------------------
+
+def _donation_dates_v1(conn):
+    """Schema canonico delle date di donazione: la data è la chiave primaria
+
+    Unifica le due strutture usate finora: (date PRIMARY KEY) creata dalle
+    impostazioni e (id, year, date) creata da add_donation_date.
+    """
+    columns = _table_columns(conn, "donation_dates")
+
+    conn.execute('''
+        CREATE TABLE donation_dates_v1 (
+            date TEXT PRIMARY KEY,
+            year INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    if columns:
+        conn.execute('''
+            INSERT OR IGNORE INTO donation_dates_v1 (date, year)
+            SELECT date, CAST(substr(date, 1, 4) AS INTEGER)
+            FROM donation_dates
+            WHERE date IS NOT NULL
+        ''')
+        conn.execute("DROP TABLE donation_dates")
+
+    conn.execute("ALTER TABLE donation_dates_v1 RENAME TO donation_dates")
+    conn.execute("CREATE INDEX idx_donation_dates_year ON donation_dates(year, date)")
+
+def _donation_dates_v2(conn):
+    """Registro delle date di donazione eliminate"""
+    _create_deletion_log(conn, "donation_dates", "deleted_donation_dates", ("date",))
+
+# Migrazioni in ordine per ogni tipo di database: la versione dello schema
+# (PRAGMA user_version) è il numero di migrazioni già applicate
+MIGRATIONS = {
+    "prenotazioni": [_daily_v1, _daily_v2],
+    "hemodos": [_yearly_v1, _yearly_v2, _yearly_v3],
+    "cronologia": [_history_v1, _history_v2, _history_v3],
+    "date_donazione": [_donation_dates_v1, _donation_dates_v2],
+}
+
+def ensure_schema(conn, db_path):
+    """Applica al database le migrazioni non ancora eseguite
+
+    Viene chiamata dal pool all'apertura di ogni nuova connessione: se lo
+    schema è già aggiornato costa una sola lettura di PRAGMA user_version.
+    Le migrazioni girano in un'unica transazione IMMEDIATE, quindi due
+    connessioni aperte insieme non possono applicarle due volte.
+    """
+    migrations = MIGRATIONS.get(get_file_kind(db_path))
+    if not migrations:
+        return
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(migrations):
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Rileggi la versione: un'altra connessione potrebbe averla appena aggiornata
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(migrations[version:], start=version + 1):
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            logger.info(f"Schema aggiornato alla versione {number}: {db_path}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Errore nella migrazione dello schema di {db_path}: {str(e)}")
+        raise
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import tempfile
+from core.connection_pool import exclusive_database
+from core.delta_sync import delta_copy, is_sqlite_file
+from core.logger import logger
+
+# Pagine copiate a ogni passo del backup: tra un passo e l'altro il
+# database resta libero per le scritture dell'applicazione
+SNAPSHOT_PAGES = 256
+# Attesa tra i tentativi se il database è occupato (secondi)
+SNAPSHOT_SLEEP = 0.05
+# Attesa massima dei lock su source e dest (secondi)
+SNAPSHOT_TIMEOUT = 60
+
+# File accessori di SQLite: il loro contenuto è già nell'istantanea
+SQLITE_SIDE_FILES = ("-wal", "-shm", "-journal")
+
+def snapshot_database(source, target):
+    """Scrive in target un'istantanea coerente del database source
+
+    Prima un checkpoint PASSIVE riporta nel file principale le pagine del
+    WAL senza attendere lettori e scrittori. Va eseguito da una connessione
+    in lettura e scrittura: con mode=ro SQLite non può fare il checkpoint.
+    Poi source viene aperto in sola lettura, fuori dal pool (niente
+    aggiornamenti dello schema), e l'API di backup di SQLite copia le
+    pagine SNAPSHOT_PAGES alla volta; se source viene modificato durante la
+    copia il backup se ne accorge e riparte: l'istantanea corrisponde
+    sempre a una transazione completa, WAL compreso.
+
+    Returns:
+        os.stat_result: stat del file source dopo il checkpoint
+    """
+    checkpoint_conn = sqlite3.connect(source, timeout=SNAPSHOT_TIMEOUT)
+    try:
+        checkpoint_conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    finally:
+        checkpoint_conn.close()
+    source_stat = os.stat(source)
+    source_conn = sqlite3.connect(f"file:{source}?mode=ro", uri=True, timeout=SNAPSHOT_TIMEOUT)
+    try:
+        target_conn = sqlite3.connect(target)
+        try:
+            source_conn.backup(target_conn, pages=SNAPSHOT_PAGES, sleep=SNAPSHOT_SLEEP)
+        finally:
+            target_conn.close()
+    finally:
+        source_conn.close()
+    return source_stat
+
+def _discard_side_files(db_path):
+    """Riporta il -wal di db_path nel file principale e rimuove -wal e -shm
+
+    Un -wal rimasto accanto al file che lo sostituisce verrebbe applicato
+    al database nuovo e lo corromperebbe.
+    """
+    if os.path.exists(db_path) and os.path.exists(db_path + "-wal"):
+        conn = sqlite3.connect(db_path, timeout=SNAPSHOT_TIMEOUT)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+def snapshot_copy(source, dest):
+    """Copia source su dest; i database SQLite passano da un'istantanea
+
+    L'istantanea viene scritta in un file temporaneo accanto a dest e poi
+    copiata con delta_copy, che ne scrive solo i blocchi cambiati rispetto
+    a dest e lo sostituisce con una rinomina atomica. Il temporaneo riceve
+    la data di modifica di source, così il confronto tra le date delle due
+    copie resta valido. Durante la sostituzione il pool non tiene
+    connessioni su dest (vedi exclusive_database) e -wal/-shm del file
+    vecchio vengono rimossi.
+
+    Returns:
+        tuple: (blocchi scritti, blocchi totali), come delta_copy
+    """
+    if not is_sqlite_file(source):
+        return delta_copy(source, dest)
+
+    folder = os.path.dirname(os.path.abspath(dest))
+    fd, snapshot_path = tempfile.mkstemp(prefix=".snapshot_", suffix=".tmp", dir=folder)
+    os.close(fd)
+    try:
+        source_stat = snapshot_database(source, snapshot_path)
+        os.utime(snapshot_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        with exclusive_database(dest):
+            _discard_side_files(dest)
+            return delta_copy(snapshot_path, dest)
+    except Exception as e:
+        logger.error(f"Errore nell'istantanea di {source}: {str(e)}")
+        raise
+    finally:
+        for path in (snapshot_path, *(snapshot_path + suffix for suffix in SQLITE_SIDE_FILES)):
+            if os.path.exists(path):
+                os.remove(path)
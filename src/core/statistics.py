@@ -0,0 +1,135 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from core.database import (DAY_COUNTS_SQL, store_day_stats, get_db_connection,
+                           get_year_db_path, is_yearly_storage)
+from core.path_resolver import get_path_resolver
+from core.logger import logger
+
+# File letti in parallelo: nella cartella cloud il tempo è quasi tutto attesa di I/O
+SCAN_WORKERS = 8
+
+def _empty_counts():
+    return {'total': 0, 'completed': 0, 'first': 0}
+
+def _count_day_file(db_path):
+    """Conteggi di un file giornaliero con una sola query aggregata"""
+    with get_db_connection(db_path) as conn:
+        total, completed, first = conn.execute(
+            f"SELECT {DAY_COUNTS_SQL} FROM reservations").fetchone()
+    return total or 0, completed or 0, first or 0
+
+def scan_day_counts(year):
+    """Conta le prenotazioni di ogni giorno dell'anno leggendo i database
+
+    Con l'archivio annuale basta una query raggruppata per data; con quello
+    giornaliero i file vengono letti in parallelo, una query ciascuno.
+
+    Returns:
+        dict: data yyyy-MM-dd -> (total, completed, first)
+    """
+    if is_yearly_storage():
+        with get_db_connection(get_year_db_path(year)) as conn:
+            rows = conn.execute(f"""SELECT date, {DAY_COUNTS_SQL}
+                                    FROM reservations
+                                    WHERE date BETWEEN ? AND ?
+                                    GROUP BY date""",
+                                (f"{year}-01-01", f"{year}-12-31")).fetchall()
+        return {date_str: (total or 0, completed or 0, first or 0)
+                for date_str, total, completed, first in rows}
+
+    year_path = get_path_resolver().year_path(year, create=False)
+    files = {}
+    for filename in os.listdir(year_path):
+        if filename.startswith("prenotazioni_") and filename.endswith(".db"):
+            day, month = filename[len("prenotazioni_"):-len(".db")].split("_")
+            files[f"{year}-{month}-{day}"] = os.path.join(year_path, filename)
+    if not files:
+        return {}
+
+    day_counts = {}
+    with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(files))) as executor:
+        futures = {date_str: executor.submit(_count_day_file, db_path)
+                   for date_str, db_path in files.items()}
+        for date_str, future in futures.items():
+            try:
+                day_counts[date_str] = future.result()
+            except Exception as e:
+                logger.error(f"Errore nella lettura di {files[date_str]}: {str(e)}")
+    return day_counts
+
+def rebuild_year_stats(year):
+    """Ricalcola da zero le statistiche materializzate di un anno
+
+    Serve per i dati scritti prima dell'introduzione delle statistiche
+    materializzate o modificati fuori dall'applicazione.
+    """
+    try:
+        year = int(year)
+        if not os.path.isdir(get_path_resolver().year_path(year, create=False)):
+            return False
+
+        day_counts = scan_day_counts(year)
+
+        with get_db_connection(get_year_db_path(year)) as conn:
+            conn.execute("DELETE FROM annual_stats WHERE date BETWEEN ? AND ?",
+                         (f"{year}-01-01", f"{year}-12-31"))
+            conn.execute("DELETE FROM monthly_stats WHERE year = ?", (year,))
+            store_day_stats(conn, year, day_counts)
+            conn.execute("INSERT OR REPLACE INTO stats_state (year, rebuilt_at) VALUES (?, CURRENT_TIMESTAMP)",
+                         (year,))
+
+        logger.info(f"Statistiche dell'anno {year} ricalcolate: {len(day_counts)} giorni")
+        return True
+
+    except Exception as e:
+        logger.error(f"Errore nel ricalcolo delle statistiche dell'anno {year}: {str(e)}")
+        return False
+
+def get_monthly_stats(year):
+    """Statistiche mensili materializzate di un anno
+
+    La prima lettura di un anno mai ricalcolato esegue il ricalcolo
+    completo; le successive leggono al massimo 12 righe.
+
+    Returns:
+        dict: mese -> {'total', 'completed', 'first'}, per tutti i 12 mesi
+    """
+    stats = {month: _empty_counts() for month in range(1, 13)}
+    try:
+        year = int(year)
+        year_path = get_path_resolver().year_path(year, create=False)
+        if not os.path.isdir(year_path):
+            return stats
+
+        with get_db_connection(get_year_db_path(year)) as conn:
+            rebuilt = conn.execute("SELECT 1 FROM stats_state WHERE year = ?", (year,)).fetchone()
+        if not rebuilt:
+            rebuild_year_stats(year)
+
+        with get_db_connection(get_year_db_path(year)) as conn:
+            rows = conn.execute("""SELECT month, total_reservations, completed_donations, first_donations
+                                   FROM monthly_stats WHERE year = ?""", (year,)).fetchall()
+        for month, total, completed, first in rows:
+            stats[month] = {'total': total, 'completed': completed, 'first': first}
+
+    except Exception as e:
+        logger.error(f"Errore nella lettura delle statistiche dell'anno {year}: {str(e)}")
+    return stats
+
+class YearStatistics:
+    """Statistiche di un anno calcolate una sola volta e condivise dai grafici
+
+    Trimestri e totale annuale derivano dai dati mensili, senza altre letture.
+    """
+    def __init__(self, year=None):
+        self.year = int(year) if year else datetime.now().year
+        self.monthly = get_monthly_stats(self.year)
+        self.quarterly = {quarter: _empty_counts() for quarter in range(1, 5)}
+        self.yearly = _empty_counts()
+
+        for month, counts in self.monthly.items():
+            quarter = (month - 1) // 3 + 1
+            for key, value in counts.items():
+                self.quarterly[quarter][key] += value
+                self.yearly[key] += value
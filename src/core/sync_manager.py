@@ -1,8 +1,8 @@
 import os
-import shutil
 from PyQt5.QtWidgets import QDialog, QProgressBar, QLabel, QVBoxLayout, QPushButton, QMessageBox
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from core.logger import logger
+from core.snapshot import snapshot_copy, SQLITE_SIDE_FILES
 
 class SyncWorker(QThread):
     progress = pyqtSignal(int)
@@ -20,6 +20,9 @@ class SyncWorker(QThread):
             files_to_sync = []
             for root, _, files in os.walk(self.source_dir):
                 for file in files:
+                    # -wal e -shm sono già compresi nell'istantanea del database
+                    if file.endswith(SQLITE_SIDE_FILES):
+                        continue
                     source_path = os.path.join(root, file)
                     rel_path = os.path.relpath(source_path, self.source_dir)
                     dest_path = os.path.join(self.dest_dir, rel_path)
@@ -29,8 +32,9 @@ class SyncWorker(QThread):
             for i, (source, dest) in enumerate(files_to_sync):
                 # Crea le directory necessarie
                 os.makedirs(os.path.dirname(dest), exist_ok=True)
-                # Copia il file
-                shutil.copy2(source, dest)
+                # Copia il file (i database da un'istantanea coerente):
+                # solo i blocchi cambiati rispetto alla copia esistente
+                snapshot_copy(source, dest)
                 # Aggiorna il progresso
                 progress = int((i + 1) / total_files * 100)
                 self.progress.emit(progress)
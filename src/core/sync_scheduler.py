@@ -0,0 +1,256 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+from core.schema import LOCAL_COPY_PREFIX as LOCAL_PREFIX
+from core.logger import logger
+
+# Suffissi dei file accessori di SQLite: una loro modifica riguarda il database principale
+_SQLITE_SUFFIXES = ("-wal", "-shm", "-journal")
+
+def database_name(path):
+    """Nome del database sincronizzato a cui si riferisce un file (None se nessuno)
+
+    local_X.db, X.db e i loro -wal/-shm/-journal corrispondono tutti a X.db.
+    """
+    name = os.path.basename(path)
+    for suffix in _SQLITE_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    if name.startswith(LOCAL_PREFIX):
+        name = name[len(LOCAL_PREFIX):]
+    return name if name.endswith(".db") else None
+
+def _main_file(path):
+    """Nome del file di database a cui appartiene path (senza -wal/-shm/-journal)"""
+    name = os.path.basename(path)
+    for suffix in _SQLITE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+class _SyncEventHandler(FileSystemEventHandler):
+    """Inoltra allo scheduler le modifiche ai database della cartella"""
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if not path or not self._is_data_change(path, event.event_type):
+                continue
+            name = database_name(path)
+            if name:
+                self.scheduler.notify_change(os.path.join(os.path.dirname(path), _main_file(path)))
+                self.scheduler.schedule(name)
+
+    def _is_data_change(self, path, event_type):
+        """Scarta gli eventi che non indicano dati nuovi
+
+        -wal e -shm vengono creati e rimossi a ogni apertura e chiusura del
+        database (anche solo in lettura): conta solo la scrittura nel -wal.
+        """
+        if path.endswith("-shm") or path.endswith("-journal"):
+            return False
+        if path.endswith("-wal"):
+            return event_type == "modified"
+        return True
+
+def _file_signature(path):
+    """(size, mtime_ns, inode) del file e del suo -wal (None se mancano)"""
+    signature = []
+    for candidate in (path, path + "-wal"):
+        try:
+            stat = os.stat(candidate)
+            signature.append((stat.st_size, stat.st_mtime_ns, stat.st_ino))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+class SyncScheduler:
+    """Sincronizzazione guidata dagli eventi del file system
+
+    Un solo observer watchdog segue la cartella dell'anno e accoda i nomi
+    dei database modificati in una coda limitata (MAX_EVENTS). Un thread
+    di smistamento raggruppa gli eventi per file e attende DEBOUNCE secondi
+    di quiete prima di passare il file a uno dei WORKERS thread, che
+    eseguono sync_pair(percorso locale, percorso cloud). on_change(percorso)
+    viene invece chiamata subito, dal thread dell'observer, per ogni file di
+    database modificato (es. per invalidare le cache). Un file non viene
+    mai sincronizzato da due thread insieme; se cambia durante la
+    sincronizzazione viene ripianificato. Se la coda si riempie gli eventi
+    in eccesso si perdono e si ripianificano tutti i database.
+
+    Anche la sincronizzazione scrive sui file (e sui loro -wal) e genera
+    eventi: alla scadenza un file le cui copie hanno ancora la firma
+    (dimensione, mtime, inode di file e -wal) registrata alla fine della
+    sua ultima sincronizzazione non viene sincronizzato di nuovo.
+    """
+    DEBOUNCE = 2.0      # Secondi senza modifiche prima di sincronizzare un file
+    WORKERS = 2         # Sincronizzazioni contemporanee
+    MAX_EVENTS = 1024   # Eventi in attesa di smistamento
+
+    def __init__(self, folder, sync_pair, on_change=None):
+        self.folder = folder
+        self.sync_pair = sync_pair
+        self.on_change = on_change
+        self._events = queue.Queue(maxsize=self.MAX_EVENTS)
+        self._overflow = threading.Event()
+        self._stopping = threading.Event()
+        self._pending = {}      # nome database -> istante in cui sincronizzarlo
+        self._running = set()   # database in sincronizzazione
+        self._synced = {}       # nome database -> firma delle copie dopo l'ultima sincronizzazione
+        self._lock = threading.Lock()
+        self._executor = None
+        self._observer = None
+        self._dispatcher = None
+
+    def start(self):
+        """Avvia observer, smistamento e worker; pianifica una prima sincronizzazione completa"""
+        self._executor = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix="Sync")
+        self._dispatcher = threading.Thread(target=self._dispatch, name="SyncScheduler", daemon=True)
+        self._dispatcher.start()
+
+        self._observer = Observer()
+        self._observer.schedule(_SyncEventHandler(self), self.folder, recursive=False)
+        self._observer.start()
+
+        self.schedule_all()
+        logger.info(f"Sincronizzazione a eventi avviata per {self.folder}")
+
+    def stop(self, timeout=10):
+        """Ferma l'observer e attende le sincronizzazioni in corso"""
+        self._stopping.set()
+        if self._observer:
+            self._observer.stop()
+            self._observer.join(timeout)
+            self._observer = None
+        if self._dispatcher:
+            self._wakeup()
+            self._dispatcher.join(timeout)
+            self._dispatcher = None
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        logger.info(f"Sincronizzazione a eventi arrestata per {self.folder}")
+
+    def notify_change(self, db_path):
+        """Inoltra a on_change la modifica di un file, senza attendere il debounce"""
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(db_path)
+        except Exception as e:
+            logger.error(f"Errore nella gestione della modifica di {db_path}: {str(e)}")
+
+    def schedule(self, name):
+        """Segnala la modifica di un database (chiamabile da qualsiasi thread)"""
+        if self._stopping.is_set():
+            return
+        try:
+            self._events.put_nowait(name)
+        except queue.Full:
+            self._overflow.set()
+
+    def schedule_all(self):
+        """Pianifica tutti i database presenti nella cartella"""
+        try:
+            names = {database_name(filename) for filename in os.listdir(self.folder)}
+        except OSError as e:
+            logger.error(f"Errore nella lettura di {self.folder}: {str(e)}")
+            return
+        for name in sorted(filter(None, names)):
+            self.schedule(name)
+
+    # --- Thread di smistamento --------------------------------------------
+
+    def _dispatch(self):
+        while not self._stopping.is_set():
+            timeout = self._next_timeout()
+            try:
+                name = self._events.get(timeout=timeout)
+            except queue.Empty:
+                name = None
+
+            # Raccogli tutto ciò che è già in coda: ogni evento sposta la scadenza del suo file
+            now = time.monotonic()
+            while name is not None:
+                with self._lock:
+                    self._pending[name] = now + self.DEBOUNCE
+                try:
+                    name = self._events.get_nowait()
+                except queue.Empty:
+                    name = None
+
+            if self._overflow.is_set():
+                self._overflow.clear()
+                logger.warning("Coda degli eventi di sincronizzazione piena: ripianifico tutti i database")
+                self.schedule_all()
+
+            self._submit_due()
+
+    def _next_timeout(self):
+        """Attesa fino alla prossima scadenza (None: fino al prossimo evento)"""
+        with self._lock:
+            # Con tutti i worker occupati si attende la fine di una sincronizzazione
+            if len(self._running) >= self.WORKERS:
+                return None
+            due = [deadline for name, deadline in self._pending.items() if name not in self._running]
+        if not due:
+            return None
+        return max(0.0, min(due) - time.monotonic())
+
+    def _signature(self, name):
+        """Firma delle due copie di un database (vedi _file_signature)"""
+        return (_file_signature(os.path.join(self.folder, LOCAL_PREFIX + name)),
+                _file_signature(os.path.join(self.folder, name)))
+
+    def _submit_due(self):
+        now = time.monotonic()
+        with self._lock:
+            ready = sorted((deadline, name) for name, deadline in self._pending.items()
+                           if deadline <= now and name not in self._running)
+
+        for _, name in ready:
+            if self._stopping.is_set():
+                return
+            signature = self._signature(name)
+            with self._lock:
+                # Copie invariate dall'ultima sincronizzazione: l'evento l'ha causato lei
+                if self._synced.get(name) == signature:
+                    del self._pending[name]
+                    continue
+                # Al massimo WORKERS file in lavorazione: gli altri restano in attesa
+                if len(self._running) >= self.WORKERS:
+                    return
+                del self._pending[name]
+                self._running.add(name)
+            self._executor.submit(self._sync, name)
+
+    def _sync(self, name):
+        try:
+            local_path = os.path.join(self.folder, LOCAL_PREFIX + name)
+            cloud_path = os.path.join(self.folder, name)
+            self.sync_pair(local_path, cloud_path)
+            signature = self._signature(name)
+            with self._lock:
+                self._synced[name] = signature
+        except Exception as e:
+            logger.error(f"Errore nella sincronizzazione di {name}: {str(e)}")
+        finally:
+            with self._lock:
+                self._running.discard(name)
+            # Altri file potrebbero essere pronti
+            self._wakeup()
+
+    def _wakeup(self):
+        """Sveglia il thread di smistamento"""
+        try:
+            self._events.put_nowait(None)
+        except queue.Full:
+            pass
@@ -0,0 +1,109 @@
+import os
+import re
+from core.database import get_year_db_path, get_db_connection
+from core.delete_db_logic import get_base_path
+from core.logger import logger
+
+# Nome dei database giornalieri: prenotazioni_DD_MM.db
+DAILY_DB_PATTERN = re.compile(r"^prenotazioni_(\d{2})_(\d{2})\.db$")
+
+def find_daily_databases(year):
+    """Restituisce i database giornalieri dell'anno come lista di (nome file, data)"""
+    year_path = os.path.join(get_base_path(), str(year))
+    if not os.path.isdir(year_path):
+        return []
+
+    daily_dbs = []
+    for filename in os.listdir(year_path):
+        match = DAILY_DB_PATTERN.match(filename)
+        if match:
+            day, month = match.groups()
+            daily_dbs.append((filename, f"{year}-{month}-{day}"))
+
+    return sorted(daily_dbs, key=lambda item: item[1])
+
+def get_migration_status(year):
+    """Restituisce (file già importati, file giornalieri totali) per l'anno"""
+    daily_dbs = find_daily_databases(year)
+    if not daily_dbs:
+        return 0, 0
+
+    year_db = get_year_db_path(year)
+    with get_db_connection(year_db) as conn:
+        done = {row[0] for row in conn.execute("SELECT filename FROM migrated_files")}
+
+    return sum(1 for filename, _ in daily_dbs if filename in done), len(daily_dbs)
+
+def migrate_daily_databases(year, progress_callback=None):
+    """Importa i database giornalieri dell'anno nell'archivio annuale
+
+    La migrazione è ripristinabile: ogni file viene importato in una singola
+    transazione insieme al suo marcatore in migrated_files, quindi dopo
+    un'interruzione si riparte dal primo file non ancora importato.
+    Le righe già presenti nell'archivio annuale non vengono sovrascritte
+    e i file giornalieri originali restano invariati.
+
+    Args:
+        year: Anno da migrare
+        progress_callback: Funzione opzionale chiamata con (file elaborati, totale)
+
+    Returns:
+        int: Numero di prenotazioni importate
+    """
+    year_db = get_year_db_path(year)
+    year_path = os.path.dirname(year_db)
+
+    daily_dbs = find_daily_databases(year)
+    imported = 0
+
+    with get_db_connection(year_db) as conn:
+        done = {row[0] for row in conn.execute("SELECT filename FROM migrated_files")}
+
+        for index, (filename, date_str) in enumerate(daily_dbs, start=1):
+            if filename in done:
+                if progress_callback:
+                    progress_callback(index, len(daily_dbs))
+                continue
+
+            source = os.path.join(year_path, filename)
+            conn.execute("ATTACH DATABASE ? AS day", (source,))
+            try:
+                columns = [row[1] for row in conn.execute("PRAGMA day.table_info(reservations)")]
+                rows = 0
+
+                if columns:
+                    # I file più vecchi possono non avere tutte le colonne
+                    first_donation = "first_donation" if "first_donation" in columns else "0"
+                    stato = "stato" if "stato" in columns else "'Non effettuata'"
+
+                    # Con lo schema ad id possono esistere più righe per orario:
+                    # l'ordine per rowid decrescente conserva la più recente
+                    cursor = conn.execute(f"""
+                        INSERT OR IGNORE INTO reservations
+                            (date, time, name, surname, first_donation, stato)
+                        SELECT ?, time, COALESCE(name, ''), COALESCE(surname, ''),
+                               COALESCE({first_donation}, 0),
+                               COALESCE({stato}, 'Non effettuata')
+                        FROM day.reservations
+                        WHERE time IS NOT NULL
+                        ORDER BY rowid DESC
+                    """, (date_str,))
+                    rows = cursor.rowcount
+
+                conn.execute("INSERT INTO migrated_files (filename, rows_imported) VALUES (?, ?)",
+                             (filename, rows))
+                conn.commit()
+                imported += rows
+                logger.info(f"Importato {filename} nell'archivio {year}: {rows} prenotazioni")
+
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("DETACH DATABASE day")
+
+            if progress_callback:
+                progress_callback(index, len(daily_dbs))
+
+    logger.info(f"Migrazione archivio annuale {year} completata: {imported} prenotazioni importate")
+    return imported
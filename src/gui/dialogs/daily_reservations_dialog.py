@@ -84,7 +84,7 @@ class DailyReservationsDialog(QDialog):
     def save_reservations(self):
         """Salva le prenotazioni correnti"""
         if self.main_window.database_manager.save_reservations(
-            self.reservations_widget.get_table(),
+            self.reservations_widget,
             self.selected_date.toString("yyyy-MM-dd"),
             True
         ):
@@ -96,10 +96,9 @@ class DailyReservationsDialog(QDialog):
 
     def delete_reservation(self):
         """Elimina la prenotazione selezionata"""
-        table = self.reservations_widget.get_table()
         if self.main_window.database_manager.delete_reservation(
-            table,
-            table.currentRow()
+            self.reservations_widget,
+            self.reservations_widget.current_row()
         ):
             self.show_status_message("Prenotazione eliminata", 3000)
 
@@ -109,18 +108,5 @@ class DailyReservationsDialog(QDialog):
 
     def _collect_table_data(self):
         """Raccoglie i dati dalla tabella"""
-        data = []
-        table = self.reservations_widget.get_table()
-        
-        for row in range(table.rowCount()):
-            time = table.item(row, 0).text()
-            name = table.item(row, 1).text() if table.item(row, 1) else ""
-            surname = table.item(row, 2).text() if table.item(row, 2) else ""
-            first_donation = table.cellWidget(row, 3).currentText()
-            stato = table.cellWidget(row, 4).currentText()
-            
-            if name.strip() or surname.strip():
-                data.append([time, name, surname, first_donation, stato])
-                
-        return data 
+        return self.reservations_widget.get_booked_rows() 
     
\ No newline at end of file
@@ -6,8 +6,10 @@ from PyQt5.QtCore import QSettings, Qt, QDate, QTimer
 from PyQt5.QtGui import QIcon, QPixmap
 import os
 import platform
-from core.database import get_db_path
+from core.database import get_db_path, get_db_connection
 from core.delete_db_logic import get_base_path
+from core.path_resolver import invalidate_paths
+from core.donation_index import invalidate_donation_dates
 from core.logger import logger
 from core.themes import THEMES
 import sqlite3
@@ -144,6 +146,7 @@ class ConfigDatabaseDialog(HemodosDialog):
             # Imposta il percorso del database
             db_path = os.path.join(base_path, f"hemodos_{year}.db")
             self.settings.setValue("last_database", db_path)
+            invalidate_paths()
             
             # Carica i dati dal database
             self.parent().database_manager.load_current_day()
@@ -279,6 +282,7 @@ class ConfigDatabaseDialog(HemodosDialog):
                 # Salva le impostazioni
                 self.settings.setValue("cloud_service", service_name)
                 self.settings.setValue("cloud_path", hemodos_cloud_path)
+                invalidate_paths()
                 self.selected_option = 3
                 
                 # Aggiorna il testo del pulsante
@@ -341,17 +345,12 @@ class ConfigDatabaseDialog(HemodosDialog):
             # Percorso del database delle date di donazione
             db_path = os.path.join(year_path, f"date_donazione_{self.current_year}.db")
             
-            conn = sqlite3.connect(db_path)
-            c = conn.cursor()
-            
-            # Crea la tabella se non esiste
-            c.execute('''CREATE TABLE IF NOT EXISTS donation_dates
-                         (date text PRIMARY KEY)''')
-            
-            # Inserisci la data
+            # Inserisci la data (la tabella viene creata all'apertura del database)
             try:
-                c.execute("INSERT INTO donation_dates (date) VALUES (?)", (date_str,))
-                conn.commit()
+                with get_db_connection(db_path) as conn:
+                    conn.execute("INSERT INTO donation_dates (date, year) VALUES (?, ?)",
+                                 (date_str, self.current_year))
+                invalidate_donation_dates(self.current_year)
                 
                 # Aggiorna la lista
                 self.load_donation_dates()
@@ -373,8 +372,6 @@ class ConfigDatabaseDialog(HemodosDialog):
                     "Questa data è già presente nel calendario donazioni"
                 )
             
-            conn.close()
-            
         except Exception as e:
             logger.error(f"Errore nell'aggiunta della data di donazione: {str(e)}")
             QMessageBox.critical(
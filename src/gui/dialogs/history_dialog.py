@@ -1,15 +1,16 @@
 from gui.dialogs.base_dialog import HemodosDialog
-from PyQt5.QtWidgets import (QVBoxLayout, QTableWidget, QTableWidgetItem,
-                            QPushButton, QHBoxLayout, QComboBox, QLabel, QMessageBox)
-from PyQt5.QtCore import Qt, QDate, QSettings, QSize
+from PyQt5.QtWidgets import (QVBoxLayout, QTableView, QAbstractItemView,
+                            QPushButton, QHBoxLayout, QComboBox, QLabel, QMessageBox,
+                            QLineEdit, QDateEdit, QCheckBox)
+from PyQt5.QtCore import Qt, QSettings, QSize, QDate, QTimer
 from PyQt5.QtGui import QIcon
-import os
-import sqlite3
 from datetime import datetime
-from core.database import get_db_path
-from core.delete_db_logic import get_available_years, get_base_path
+from core.database import get_history_db_path, get_history_actions, clear_history
+from core.delete_db_logic import get_available_years
+from core.history_writer import flush_history
 from core.logger import logger
 from core.paths_manager import PathsManager
+from gui.widgets.history_model import HistoryModel
 
 class HistoryDialog(HemodosDialog):
     def __init__(self, parent=None):
@@ -47,7 +48,7 @@ class HistoryDialog(HemodosDialog):
         
         # Pulsante elimina
         delete_btn = QPushButton()
-        delete_btn.setIcon(QIcon('src/assets/trash.png'))
+        delete_btn.setIcon(QIcon(self.paths_manager.get_asset_path('trash.png')))
         delete_btn.setIconSize(QSize(24, 24))
         delete_btn.setToolTip("Elimina cronologia dell'anno")
         delete_btn.clicked.connect(self.delete_history)
@@ -56,10 +57,52 @@ class HistoryDialog(HemodosDialog):
         
         self.content_layout.addLayout(header_layout)
         
-        # Tabella cronologia
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(3)
-        self.history_table.setHorizontalHeaderLabels(["Data e Ora", "Azione", "Dettagli"])
+        # Filtri: applicati dal database, non sulle righe già caricate
+        filter_layout = QHBoxLayout()
+        
+        filter_layout.addWidget(QLabel("Azione:"))
+        self.action_combo = QComboBox()
+        self.action_combo.setMinimumWidth(180)
+        self.action_combo.currentIndexChanged.connect(self.apply_filters)
+        filter_layout.addWidget(self.action_combo)
+        
+        self.date_filter_check = QCheckBox("Dal:")
+        self.date_filter_check.toggled.connect(self.apply_filters)
+        filter_layout.addWidget(self.date_filter_check)
+        self.date_from_edit = QDateEdit()
+        self.date_from_edit.setCalendarPopup(True)
+        self.date_from_edit.setDisplayFormat("dd/MM/yyyy")
+        self.date_from_edit.dateChanged.connect(self.apply_filters)
+        filter_layout.addWidget(self.date_from_edit)
+        
+        filter_layout.addWidget(QLabel("al:"))
+        self.date_to_edit = QDateEdit()
+        self.date_to_edit.setCalendarPopup(True)
+        self.date_to_edit.setDisplayFormat("dd/MM/yyyy")
+        self.date_to_edit.dateChanged.connect(self.apply_filters)
+        filter_layout.addWidget(self.date_to_edit)
+        
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Cerca nei dettagli...")
+        self.search_edit.setClearButtonEnabled(True)
+        filter_layout.addWidget(self.search_edit, 1)
+        
+        # La ricerca parte quando l'utente smette di scrivere
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.apply_filters)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        
+        self.content_layout.addLayout(filter_layout)
+        
+        # Tabella cronologia: le righe vengono lette a pagine durante lo scorrimento
+        self.history_model = HistoryModel(self)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
+        self.history_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.history_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.history_table.verticalHeader().setDefaultSectionSize(28)
         self.history_table.setColumnWidth(0, 150)
         self.history_table.setColumnWidth(1, 150)
         self.history_table.setColumnWidth(2, 450)
@@ -68,16 +111,16 @@ class HistoryDialog(HemodosDialog):
         # Applica il tema alla tabella
         if self.parent().theme_manager.get_current_theme().name == "dark":
             self.history_table.setStyleSheet("""
-                QTableWidget {
+                QTableView {
                     background-color: #2b2b2b;
                     color: #ffffff;
                     gridline-color: #404040;
                     border: 1px solid #404040;
                 }
-                QTableWidget::item {
+                QTableView::item {
                     padding: 5px;
                 }
-                QTableWidget::item:selected {
+                QTableView::item:selected {
                     background-color: #004d4d;
                 }
                 QHeaderView::section {
@@ -86,7 +129,7 @@ class HistoryDialog(HemodosDialog):
                     padding: 5px;
                     border: 1px solid #404040;
                 }
-                QTableWidget::item:alternate {
+                QTableView::item:alternate {
                     background-color: #353535;
                 }
             """)
@@ -97,77 +140,58 @@ class HistoryDialog(HemodosDialog):
         self.load_history()
 
     def load_history(self):
-        """Carica la cronologia per l'anno selezionato"""
+        """Carica la prima pagina della cronologia per l'anno selezionato"""
         try:
             year = int(self.year_combo.currentText())
-            self.history_table.setRowCount(0)
-            
-            # Ottieni il percorso base dell'anno
-            base_path = get_base_path()
-            year_path = os.path.join(base_path, str(year))
-            
-            # Crea la directory dell'anno se non esiste
-            os.makedirs(year_path, exist_ok=True)
-            
-            # Crea/verifica il database principale della cronologia
-            history_db_path = os.path.join(year_path, f"cronologia_{year}.db")
-            
-            # Crea la tabella history se non esiste
-            conn = sqlite3.connect(history_db_path)
-            c = conn.cursor()
-            c.execute('''CREATE TABLE IF NOT EXISTS history
-                        (timestamp text, action text, details text)''')
-            conn.commit()
             
-            # Raccogli la cronologia da tutti i database dell'anno
-            all_history = []
+            # Scrivi le entrate ancora in coda prima di leggere
+            flush_history()
             
-            # Prima dal database principale della cronologia
-            c.execute("SELECT * FROM history ORDER BY timestamp DESC")
-            all_history.extend(c.fetchall())
-            conn.close()
-            
-            # Poi da tutti gli altri database dell'anno
-            for filename in os.listdir(year_path):
-                if filename.endswith('.db') and not filename.startswith('cronologia_'):
-                    db_path = os.path.join(year_path, filename)
-                    try:
-                        conn = sqlite3.connect(db_path)
-                        c = conn.cursor()
-                        c.execute('''CREATE TABLE IF NOT EXISTS history
-                                    (timestamp text, action text, details text)''')
-                        c.execute("SELECT * FROM history ORDER BY timestamp DESC")
-                        all_history.extend(c.fetchall())
-                        conn.close()
-                    except sqlite3.Error as e:
-                        logger.error(f"Errore nel leggere {filename}: {str(e)}")
-                        continue
-            
-            # Ordina per timestamp decrescente e rimuovi duplicati
-            all_history.sort(key=lambda x: x[0], reverse=True)
-            unique_history = []
-            seen = set()
-            for entry in all_history:
-                if entry not in seen:
-                    unique_history.append(entry)
-                    seen.add(entry)
-            
-            # Popola la tabella
-            for timestamp, action, details in unique_history:
-                row = self.history_table.rowCount()
-                self.history_table.insertRow(row)
-                
-                # Formatta il timestamp
-                dt = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-                formatted_date = dt.strftime("%d/%m/%Y %H:%M")
-                
-                self.history_table.setItem(row, 0, QTableWidgetItem(formatted_date))
-                self.history_table.setItem(row, 1, QTableWidgetItem(action))
-                self.history_table.setItem(row, 2, QTableWidgetItem(details))
+            self.history_model.db_path = get_history_db_path(year)
+            self.update_filter_controls(year)
+            self.apply_filters()
                 
         except Exception as e:
             logger.error(f"Errore nel caricamento della cronologia: {str(e)}")
 
+    def update_filter_controls(self, year):
+        """Azioni e intervallo di date selezionabili per l'anno"""
+        widgets = (self.action_combo, self.date_from_edit, self.date_to_edit)
+        for widget in widgets:
+            widget.blockSignals(True)
+        try:
+            current_action = self.action_combo.currentData()
+            self.action_combo.clear()
+            self.action_combo.addItem("Tutte", None)
+            for action in get_history_actions(year):
+                self.action_combo.addItem(action, action)
+            index = self.action_combo.findData(current_action)
+            self.action_combo.setCurrentIndex(max(index, 0))
+            
+            first_day = QDate(year, 1, 1)
+            last_day = QDate(year, 12, 31)
+            for date_edit in (self.date_from_edit, self.date_to_edit):
+                date_edit.setDateRange(first_day, last_day)
+            self.date_from_edit.setDate(first_day)
+            self.date_to_edit.setDate(last_day)
+        finally:
+            for widget in widgets:
+                widget.blockSignals(False)
+
+    def apply_filters(self):
+        """Ricarica la cronologia con i filtri correnti"""
+        self.search_timer.stop()
+        date_from = date_to = None
+        if self.date_filter_check.isChecked():
+            date_from = self.date_from_edit.date().toString("yyyy-MM-dd")
+            date_to = self.date_to_edit.date().toString("yyyy-MM-dd")
+        self.history_model.set_filters(
+            action=self.action_combo.currentData(),
+            date_from=date_from,
+            date_to=date_to,
+            text=self.search_edit.text()
+        )
+
     def delete_history(self):
         """Elimina la cronologia dell'anno corrente"""
         try:
@@ -180,19 +204,9 @@ class HistoryDialog(HemodosDialog):
             )
             
             if reply == QMessageBox.Yes:
-                # Ottieni l'anno corrente
-                current_year = QDate.currentDate().year()
-                
-                # Percorso del database cronologia
-                base_path = get_base_path()
-                db_path = os.path.join(base_path, str(current_year), f"cronologia_{current_year}.db")
-                
-                # Elimina i dati dalla tabella
-                conn = sqlite3.connect(db_path)
-                c = conn.cursor()
-                c.execute("DELETE FROM history")
-                conn.commit()
-                conn.close()
+                # Elimina la cronologia dell'anno selezionato, comprese le entrate ancora in coda
+                if not clear_history(int(self.year_combo.currentText())):
+                    raise RuntimeError("impossibile eliminare la cronologia")
                 
                 # Aggiorna la visualizzazione
                 self.load_history()
@@ -1,137 +1,215 @@
 from gui.dialogs.base_dialog import HemodosDialog
-from PyQt5.QtWidgets import (QVBoxLayout, QTabWidget, QWidget, 
+from PyQt5.QtWidgets import (QVBoxLayout, QTabWidget, QWidget,
                             QComboBox, QLabel)
-from PyQt5.QtGui import QIcon
-import os
-from core.database import get_db_path
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import sqlite3
-from datetime import datetime
+from PyQt5.QtCore import Qt, QThread, QCoreApplication, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+import threading
+from core.statistics import YearStatistics
+from core.analytics import TrendAnalytics
+from core.logger import logger
+
+# Dimensione dei grafici in pollici (a 100 dpi: 800x600 pixel)
+CHART_SIZE = (8, 6)
+
+# matplotlib non è thread-safe: i grafici vengono disegnati uno alla volta
+_render_lock = threading.Lock()
+
+class ChartRenderer(QThread):
+    """Calcola i dati e disegna un grafico in background
+
+    Il grafico viene rasterizzato con il backend Agg e consegnato come
+    QImage: il thread dell'interfaccia deve solo mostrarlo. matplotlib
+    viene importato qui, al primo grafico richiesto.
+    """
+    rendered = pyqtSignal(int, QImage)
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, index, load_data, draw):
+        super().__init__()
+        self.index = index
+        self.load_data = load_data
+        self.draw = draw
+
+    def run(self):
+        try:
+            data = self.load_data()
+            # Dialogo chiuso durante il calcolo: il grafico non serve più
+            if self.isInterruptionRequested():
+                return
+
+            with _render_lock:
+                from matplotlib.figure import Figure
+                from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+                fig = Figure(figsize=CHART_SIZE)
+                canvas = FigureCanvasAgg(fig)
+                self.draw(fig, data)
+                canvas.draw()
+
+                width, height = canvas.get_width_height()
+                image = QImage(canvas.buffer_rgba(), width, height, QImage.Format_RGBA8888).copy()
+
+            self.rendered.emit(self.index, image)
+
+        except Exception as e:
+            logger.error(f"Errore nella creazione del grafico: {str(e)}")
+            self.failed.emit(self.index, str(e))
 
 class StatisticsDialog(HemodosDialog):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, year=None):
         super().__init__(parent, "Statistiche Donazioni")
         self.setMinimumSize(800, 600)
+        self.year = year
+
+        # Dati calcolati una volta sola, dal primo grafico che li richiede,
+        # e condivisi dagli altri
+        self._statistics = None
+        self._trend = None
+        self._statistics_lock = threading.Lock()
+        self._trend_lock = threading.Lock()
+
+        # Ogni scheda viene disegnata solo quando viene mostrata la prima volta
+        self.charts = [
+            ("Mensile", self.load_statistics, self.draw_monthly_chart),
+            ("Trimestrale", self.load_statistics, self.draw_quarterly_chart),
+            ("Annuale", self.load_statistics, self.draw_yearly_chart),
+            ("Trend", self.load_trend, self.draw_trend_chart),
+        ]
+        self.chart_labels = []
+        self.renderers = {}
+
         self.init_ui()
 
     def init_ui(self):
-        tab_widget = QTabWidget()
-        
-        # Tab mensile
-        monthly_tab = QWidget()
-        monthly_layout = QVBoxLayout()
-        self.monthly_canvas = self.create_monthly_chart()
-        monthly_layout.addWidget(self.monthly_canvas)
-        monthly_tab.setLayout(monthly_layout)
-        tab_widget.addTab(monthly_tab, "Mensile")
-        
-        # Tab trimestrale
-        quarterly_tab = QWidget()
-        quarterly_layout = QVBoxLayout()
-        self.quarterly_canvas = self.create_quarterly_chart()
-        quarterly_layout.addWidget(self.quarterly_canvas)
-        quarterly_tab.setLayout(quarterly_layout)
-        tab_widget.addTab(quarterly_tab, "Trimestrale")
-        
-        # Tab annuale
-        yearly_tab = QWidget()
-        yearly_layout = QVBoxLayout()
-        self.yearly_canvas = self.create_yearly_chart()
-        yearly_layout.addWidget(self.yearly_canvas)
-        yearly_tab.setLayout(yearly_layout)
-        tab_widget.addTab(yearly_tab, "Annuale")
-        
-        self.content_layout.addWidget(tab_widget)
-
-        # Icone dei pulsanti
-        chart_button.setIcon(QIcon(self.paths_manager.get_asset_path('chart_64px.png')))
-        export_button.setIcon(QIcon(self.paths_manager.get_asset_path('export_64px.png')))
-
-    def create_monthly_chart(self):
-        fig = Figure(figsize=(8, 6))
-        canvas = FigureCanvas(fig)
+        self.tab_widget = QTabWidget()
+
+        for title, _, _ in self.charts:
+            tab = QWidget()
+            layout = QVBoxLayout()
+            label = QLabel("Caricamento del grafico...")
+            label.setAlignment(Qt.AlignCenter)
+            layout.addWidget(label)
+            tab.setLayout(layout)
+            self.tab_widget.addTab(tab, title)
+            self.chart_labels.append(label)
+
+        self.tab_widget.currentChanged.connect(self.render_chart)
+        self.content_layout.addWidget(self.tab_widget)
+
+        self.render_chart(self.tab_widget.currentIndex())
+
+    def render_chart(self, index):
+        """Avvia il disegno del grafico della scheda, se non è già stato fatto"""
+        if index < 0 or index in self.renderers:
+            return
+
+        _, load_data, draw = self.charts[index]
+        renderer = ChartRenderer(index, load_data, draw)
+        renderer.rendered.connect(self._on_chart_rendered)
+        renderer.failed.connect(self._on_chart_failed)
+        self.renderers[index] = renderer
+        renderer.start()
+
+    def load_statistics(self):
+        """Statistiche dell'anno, calcolate alla prima richiesta (thread-safe)"""
+        with self._statistics_lock:
+            if self._statistics is None:
+                self._statistics = YearStatistics(self.year)
+            return self._statistics
+
+    def load_trend(self):
+        """Analisi di tutti gli anni, calcolate alla prima richiesta (thread-safe)"""
+        with self._trend_lock:
+            if self._trend is None:
+                self._trend = TrendAnalytics()
+            return self._trend
+
+    def _on_chart_rendered(self, index, image):
+        label = self.chart_labels[index]
+        label.setText("")
+        label.setPixmap(QPixmap.fromImage(image))
+
+    def _on_chart_failed(self, index, message):
+        self.chart_labels[index].setText(f"Errore nella creazione del grafico: {message}")
+
+    def done(self, result):
+        # I grafici in corso non vanno attesi: il thread dell'interfaccia
+        # resterebbe bloccato fino alla fine dei calcoli
+        for renderer in self.renderers.values():
+            self._detach_renderer(renderer)
+        self.renderers.clear()
+        super().done(result)
+
+    def _detach_renderer(self, renderer):
+        """Lascia terminare da solo un renderer, che si distrugge alla fine
+
+        Passa all'applicazione, così non viene distrutto con il dialogo
+        mentre è ancora in esecuzione.
+        """
+        renderer.requestInterruption()
+        renderer.rendered.disconnect()
+        renderer.failed.disconnect()
+        renderer.setParent(QCoreApplication.instance())
+        renderer.finished.connect(renderer.deleteLater)
+        if renderer.isFinished():
+            renderer.deleteLater()
+
+    def draw_monthly_chart(self, fig, statistics):
         ax = fig.add_subplot(111)
-        
-        # Recupera i dati mensili
-        data = self.get_monthly_stats()
+        data = statistics.monthly
         months = range(1, 13)
-        
+
         # Crea le barre
         x = list(months)
         width = 0.25
-        
-        ax.bar([i-width for i in x], [data[m]['total'] for m in months], 
+
+        ax.bar([i-width for i in x], [data[m]['total'] for m in months],
                width, label='Totale Prenotazioni', color='#0073e6')
-        ax.bar(x, [data[m]['completed'] for m in months], 
+        ax.bar(x, [data[m]['completed'] for m in months],
                width, label='Donazioni Effettuate', color='#00cc66')
-        ax.bar([i+width for i in x], [data[m]['first'] for m in months], 
+        ax.bar([i+width for i in x], [data[m]['first'] for m in months],
                width, label='Prime Donazioni', color='#ff9933')
-        
+
         ax.set_xlabel('Mese')
         ax.set_ylabel('Numero di Donazioni')
         ax.set_title('Statistiche Mensili')
         ax.set_xticks(x)
-        ax.set_xticklabels(['Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 
+        ax.set_xticklabels(['Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu',
                             'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic'])
         ax.legend()
-        
+
         # Aggiungi griglia
         ax.grid(True, linestyle='--', alpha=0.7)
-        
-        return canvas
 
-    def create_quarterly_chart(self):
-        fig = Figure(figsize=(8, 6))
-        canvas = FigureCanvas(fig)
+    def draw_quarterly_chart(self, fig, statistics):
         ax = fig.add_subplot(111)
-        
-        # Recupera e aggrega i dati trimestrali
-        monthly_data = self.get_monthly_stats()
-        quarters = {
-            1: {'total': 0, 'completed': 0, 'first': 0},
-            2: {'total': 0, 'completed': 0, 'first': 0},
-            3: {'total': 0, 'completed': 0, 'first': 0},
-            4: {'total': 0, 'completed': 0, 'first': 0}
-        }
-        
-        for month, data in monthly_data.items():
-            quarter = (month - 1) // 3 + 1
-            quarters[quarter]['total'] += data['total']
-            quarters[quarter]['completed'] += data['completed']
-            quarters[quarter]['first'] += data['first']
-        
+        # Dati trimestrali già aggregati
+        quarters = statistics.quarterly
+
         # Crea il grafico
         quarters_range = range(1, 5)
-        ax.plot(quarters_range, [quarters[q]['total'] for q in quarters_range], 
+        ax.plot(quarters_range, [quarters[q]['total'] for q in quarters_range],
                 label='Totale Prenotazioni', marker='o')
-        ax.plot(quarters_range, [quarters[q]['completed'] for q in quarters_range], 
+        ax.plot(quarters_range, [quarters[q]['completed'] for q in quarters_range],
                 label='Donazioni Effettuate', marker='s')
-        ax.plot(quarters_range, [quarters[q]['first'] for q in quarters_range], 
+        ax.plot(quarters_range, [quarters[q]['first'] for q in quarters_range],
                 label='Prime Donazioni', marker='^')
-        
+
         ax.set_xlabel('Trimestre')
         ax.set_ylabel('Numero di Donazioni')
         ax.set_title('Statistiche Trimestrali')
         ax.legend()
-        
-        return canvas
 
-    def create_yearly_chart(self):
-        fig = Figure(figsize=(8, 6))
-        canvas = FigureCanvas(fig)
+    def draw_yearly_chart(self, fig, statistics):
         ax = fig.add_subplot(111)
-        
-        # Recupera i totali annuali
-        yearly_stats = self.get_yearly_stats()
-        
+        yearly_stats = statistics.yearly
+
         # Verifica che ci siano dati da visualizzare
         if yearly_stats['total'] == 0:
             ax.text(0.5, 0.5, 'Nessun dato disponibile per quest\'anno',
                     ha='center', va='center')
-            return canvas
-        
+            return
+
         # Crea il grafico a torta
         labels = ['Prime Donazioni', 'Donazioni Ripetute', 'Non Effettuate']
         sizes = [
@@ -139,7 +217,7 @@ class StatisticsDialog(HemodosDialog):
             yearly_stats['completed'] - yearly_stats['first'],
             yearly_stats['total'] - yearly_stats['completed']
         ]
-        
+
         # Rimuovi le sezioni con valore 0
         non_zero = [(size, label) for size, label in zip(sizes, labels) if size > 0]
         if non_zero:
@@ -148,63 +226,37 @@ class StatisticsDialog(HemodosDialog):
         else:
             ax.text(0.5, 0.5, 'Nessun dato disponibile',
                     ha='center', va='center')
-        
+
         ax.set_title('Riepilogo Annuale')
-        
-        return canvas
-
-    def get_monthly_stats(self):
-        year = datetime.now().year
-        base_path = os.path.dirname(get_db_path())
-        stats = {}
-        
-        # Inizializza tutti i mesi con valori zero
-        for month in range(1, 13):
-            stats[month] = {'total': 0, 'completed': 0, 'first': 0}
-        
-        # Scansiona tutti i file di prenotazione dell'anno
-        for filename in os.listdir(base_path):
-            if filename.startswith('prenotazioni_') and filename.endswith('.db'):
-                try:
-                    db_path = os.path.join(base_path, filename)
-                    conn = sqlite3.connect(db_path)
-                    c = conn.cursor()
-                    
-                    # Estrai il giorno e il mese dal nome del file
-                    day = int(filename.split('_')[1])
-                    month = int(filename.split('_')[2].split('.')[0])
-                    
-                    # Conta le prenotazioni
-                    c.execute("SELECT COUNT(*) FROM reservations WHERE name != ''")
-                    total = c.fetchone()[0]
-                    
-                    c.execute("SELECT COUNT(*) FROM reservations WHERE name != '' AND stato = 'Sì'")
-                    completed = c.fetchone()[0]
-                    
-                    c.execute("""SELECT COUNT(*) FROM reservations 
-                               WHERE name != '' AND stato = 'Sì' 
-                               AND first_donation = 1""")
-                    first = c.fetchone()[0]
-                    
-                    # Aggiorna le statistiche del mese
-                    stats[month]['total'] += total
-                    stats[month]['completed'] += completed
-                    stats[month]['first'] += first
-                    
-                    conn.close()
-                except Exception as e:
-                    print(f"Errore nel leggere {filename}: {str(e)}")
-        
-        return stats
-
-    def get_yearly_stats(self):
-        year = datetime.now().year
-        stats = {'total': 0, 'completed': 0, 'first': 0}
-        
-        monthly_stats = self.get_monthly_stats()
-        for month_stats in monthly_stats.values():
-            stats['total'] += month_stats['total']
-            stats['completed'] += month_stats['completed']
-            stats['first'] += month_stats['first']
-        
-        return stats 
\ No newline at end of file
+
+    def draw_trend_chart(self, fig, trend):
+        yearly = trend.yearly
+        if len(trend.columns) == 0:
+            ax = fig.add_subplot(111)
+            ax.text(0.5, 0.5, 'Nessun dato disponibile',
+                    ha='center', va='center')
+            return
+
+        years = [str(year) for year in yearly["years"]]
+        per_day_ax, first_ax, slot_ax, month_ax = fig.subplots(2, 2).flatten()
+
+        per_day_ax.plot(years, yearly["donations_per_day"], marker='o', color='#00cc66')
+        per_day_ax.set_title('Donazioni per giornata')
+        per_day_ax.grid(True, linestyle='--', alpha=0.7)
+
+        first_ax.bar(years, yearly["first_ratio"] * 100, color='#ff9933')
+        first_ax.set_title('Prime donazioni (%)')
+
+        slot_labels = [f"{slot // 60:02d}:{slot % 60:02d}" for slot in trend.slots]
+        slot_ax.bar(range(len(slot_labels)), trend.slot_no_show * 100, color='#cc3333')
+        step = max(1, len(slot_labels) // 8)
+        slot_ax.set_xticks(range(0, len(slot_labels), step))
+        slot_ax.set_xticklabels(slot_labels[::step], rotation=45, fontsize=8)
+        slot_ax.set_title('Non presentati per orario (%)')
+
+        month_ax.bar(trend.months, trend.month_no_show * 100, color='#cc3333')
+        month_ax.set_xticks(trend.months)
+        month_ax.set_xticklabels(['G', 'F', 'M', 'A', 'M', 'G', 'L', 'A', 'S', 'O', 'N', 'D'])
+        month_ax.set_title('Non presentati per mese (%)')
+
+        fig.tight_layout()
@@ -58,9 +58,5 @@ class TimeEntryDialog(HemodosDialog):
 
     def orario_exists(self, new_time):
         """Verifica se l'orario esiste già nella tabella"""
-        table = self.parent().table
-        for row in range(table.rowCount()):
-            item = table.item(row, 0)
-            if item and item.text() == new_time:
-                return True
-        return False
+        model = getattr(self.parent(), "model", None)
+        return model is not None and new_time in model.times()
@@ -23,6 +23,7 @@ from core.managers.status_manager import StatusManager
 from core.managers.print_manager import PrintManager
 from core.managers.database_dir_manager import DatabaseDirManager
 from core.managers.cloud_manager import CloudManager
+from core.managers.prefetch_manager import PrefetchManager
 
 # Importazioni utils
 from core.utils import print_data
@@ -44,6 +45,13 @@ from gui.widgets.reservations_widget import ReservationsWidget
 
 # Importazioni core
 from core.database import add_donation_time, setup_cloud_monitoring, init_db
+from core.statistics import rebuild_year_stats
+from core.delete_db_logic import get_available_years
+from core.connection_pool import close_connections
+from core.history_writer import stop_history_writer
+from core.history_store import start_legacy_history_merge
+from core.path_resolver import invalidate_paths
+from core.cache import get_reservation_cache
 from core.logger import logger
 from core.paths_manager import PathsManager
 
@@ -102,10 +110,12 @@ class MainWindow(QMainWindow):
             self.calendar_manager = CalendarManager(self)
             self.year_manager = YearManager()
             self.print_manager = PrintManager(self)
+            self.prefetch_manager = PrefetchManager(self)
 
             # Imposta il percorso del database dell'utente corrente
             self.settings.setValue("cloud_path", os.path.dirname(self.current_user_db))
             self.settings.setValue("database_path", self.current_user_db)
+            invalidate_paths()
             
         except Exception as e:
             logger.error(f"Errore nell'inizializzazione dei manager: {str(e)}")
@@ -186,6 +196,9 @@ class MainWindow(QMainWindow):
     def _load_initial_data(self):
         """Carica i dati iniziali"""
         self.observer = setup_cloud_monitoring(self)
+        # Le vecchie tabelle history degli altri file confluiscono nella
+        # cronologia dell'anno, in background (solo i file non ancora unificati)
+        start_legacy_history_merge(get_available_years())
         self.database_manager.load_current_day()
         self.calendar_manager.highlight_donation_dates()
         self.theme_manager.apply_theme()
@@ -214,9 +227,24 @@ class MainWindow(QMainWindow):
         self.autosave_manager.setup_autosave()
 
     def show_statistics(self):
-        dialog = StatisticsDialog(self)
+        dialog = StatisticsDialog(self, self.calendar.selectedDate().year())
         dialog.exec_()
 
+    def rebuild_statistics(self):
+        """Ricalcola le statistiche materializzate di tutti gli anni"""
+        try:
+            years = get_available_years()
+            failed = [year for year in years if not rebuild_year_stats(year)]
+            
+            if failed:
+                QMessageBox.warning(self, "Attenzione",
+                                    f"Impossibile ricalcolare le statistiche per: {', '.join(map(str, failed))}")
+            else:
+                self.status_manager.show_message(f"Statistiche ricalcolate per {len(years)} anni", 3000)
+                
+        except Exception as e:
+            self._handle_error("il ricalcolo delle statistiche", e)
+
     def show_manual(self):
         dialog = ManualDialog(self)
         dialog.exec_()
@@ -228,6 +256,8 @@ class MainWindow(QMainWindow):
     def show_daily_reservations(self, date):
         """Mostra la finestra delle prenotazioni per la data selezionata"""
         dialog = DailyReservationsDialog(self, date)
+        # Mentre il giorno è aperto, carica in background i giorni vicini
+        self.prefetch_manager.prefetch_around(date)
         dialog.exec_()
 
     def show_database_dialog(self):
@@ -278,6 +308,13 @@ class MainWindow(QMainWindow):
             if self.settings.contains("welcome_shown_this_session"):
                 self.settings.remove("welcome_shown_this_session")
             
+            # Ferma il prefetch, scrivi la cronologia in coda, poi chiudi le connessioni rimaste nel pool
+            if hasattr(self, 'prefetch_manager'):
+                self.prefetch_manager.stop()
+            stop_history_writer()
+            close_connections()
+            get_reservation_cache().log_stats()
+            
             event.accept()
             
         except Exception as e:
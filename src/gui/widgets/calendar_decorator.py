@@ -0,0 +1,56 @@
+from PyQt5.QtCore import QObject, QDate
+from PyQt5.QtGui import QTextCharFormat, QColor
+
+def donation_date_format():
+    """Formato delle date di donazione nei calendari"""
+    text_format = QTextCharFormat()
+    text_format.setBackground(QColor("#c2fc03"))  # Verde lime
+    text_format.setForeground(QColor("#000000"))  # Testo nero
+    return text_format
+
+class CalendarDecorator(QObject):
+    """Evidenzia in un QCalendarWidget le date della pagina visualizzata
+
+    Le date da evidenziare sono chieste a dates_for_month(year, month), che
+    restituisce stringhe yyyy-MM-dd. A ogni cambio di pagina del calendario
+    e a ogni refresh() si applicano solo le differenze rispetto alle date
+    già evidenziate: le date uscite tornano al formato normale, quelle
+    nuove ricevono il formato, le altre non vengono toccate.
+    """
+    def __init__(self, calendar, dates_for_month, text_format=None):
+        super().__init__(calendar)
+        self.calendar = calendar
+        self.dates_for_month = dates_for_month
+        self.text_format = text_format or donation_date_format()
+        self._applied = set()
+        calendar.currentPageChanged.connect(self._apply)
+
+    def refresh(self):
+        """Ricalcola le date evidenziate dopo una modifica dei dati"""
+        self._apply(self.calendar.yearShown(), self.calendar.monthShown())
+
+    def _visible_dates(self, year, month):
+        """Date da evidenziare nella griglia: il mese e quelli adiacenti
+
+        La griglia del calendario mostra anche gli ultimi giorni del mese
+        precedente e i primi del successivo.
+        """
+        shown = QDate(year, month, 1)
+        dates = set()
+        for offset in (-1, 0, 1):
+            page = shown.addMonths(offset)
+            dates.update(self.dates_for_month(page.year(), page.month()))
+        return dates
+
+    def _apply(self, year, month):
+        highlighted = self._visible_dates(year, month)
+
+        plain_format = QTextCharFormat()
+        for date_str in self._applied - highlighted:
+            self.calendar.setDateTextFormat(QDate.fromString(date_str, "yyyy-MM-dd"), plain_format)
+        for date_str in highlighted - self._applied:
+            date = QDate.fromString(date_str, "yyyy-MM-dd")
+            if date.isValid():
+                self.calendar.setDateTextFormat(date, self.text_format)
+
+        self._applied = highlighted
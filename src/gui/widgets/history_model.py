@@ -0,0 +1,155 @@
+import os
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from core.database import get_db_connection
+from core.schema import has_history_fts
+from core.logger import logger
+
+HEADERS = ["Data e Ora", "Azione", "Dettagli"]
+
+class HistoryModel(QAbstractTableModel):
+    """Cronologia di un anno letta a pagine dal database
+
+    Le righe sono caricate PAGE_SIZE alla volta, dalla più recente, quando
+    la vista scorre verso il fondo (canFetchMore/fetchMore). Ogni pagina è
+    una query per chiave (timestamp, rowid) sull'indice del timestamp:
+    il costo non dipende da quante righe sono già state lette.
+
+    I filtri (azione, intervallo di date, testo) diventano condizioni della
+    stessa query: la ricerca nei dettagli usa l'indice full-text history_fts
+    quando il database lo ha, altrimenti LIKE.
+    """
+    PAGE_SIZE = 200
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.db_path = None
+        self._rows = []          # (timestamp, action, details)
+        self._last_key = None    # (timestamp, rowid) dell'ultima riga caricata
+        self._exhausted = True
+        self._filters = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        timestamp, action, details = self._rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return self._format_timestamp(timestamp)
+        if column == 1:
+            return action
+        return details
+
+    def _format_timestamp(self, timestamp):
+        """yyyy-MM-dd HH:mm:ss -> dd/MM/yyyy HH:mm"""
+        if not timestamp or len(timestamp) < 16:
+            return timestamp
+        return f"{timestamp[8:10]}/{timestamp[5:7]}/{timestamp[0:4]} {timestamp[11:16]}"
+
+    # --- Caricamento a pagine ---------------------------------------------
+
+    def set_database(self, db_path):
+        """Mostra la cronologia del database indicato, dalla prima pagina"""
+        self.beginResetModel()
+        self.db_path = db_path
+        self._rows = []
+        self._last_key = None
+        # Un anno senza cronologia non deve creare il file
+        self._exhausted = not (db_path and os.path.exists(db_path))
+        self.endResetModel()
+        self.fetchMore()
+
+    def set_filters(self, action=None, date_from=None, date_to=None, text=None):
+        """Imposta i filtri e ricarica dalla prima pagina
+
+        Args:
+            action: Tipo di azione esatto (None per tutte)
+            date_from, date_to: Date yyyy-MM-dd, estremi inclusi (None per nessun limite)
+            text: Parole da cercare nei dettagli, tutte presenti (None per nessuna ricerca)
+        """
+        self._filters = {
+            "action": action or None,
+            "date_from": date_from or None,
+            "date_to": date_to or None,
+            "text": (text or "").strip() or None,
+        }
+        self.reload()
+
+    def reload(self):
+        """Ricarica dalla prima pagina"""
+        self.set_database(self.db_path)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        try:
+            page = self._fetch_page()
+        except Exception as e:
+            logger.error(f"Errore nel caricamento della cronologia: {str(e)}")
+            page = []
+
+        if len(page) < self.PAGE_SIZE:
+            self._exhausted = True
+        if not page:
+            return
+
+        self._last_key = (page[-1][0], page[-1][1])
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._rows.extend((timestamp, action, details) for timestamp, _, action, details in page)
+        self.endInsertRows()
+
+    def _fetch_page(self):
+        """Righe successive all'ultima caricata, in ordine decrescente"""
+        conditions = []
+        params = []
+        with get_db_connection(self.db_path) as conn:
+            self._filter_conditions(conn, conditions, params)
+            if self._last_key is not None:
+                conditions.append("(timestamp < ? OR (timestamp = ? AND rowid < ?))")
+                params.extend([self._last_key[0], self._last_key[0], self._last_key[1]])
+
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            return conn.execute(f"""SELECT timestamp, rowid, action, details
+                                    FROM history
+                                    {where}
+                                    ORDER BY timestamp DESC, rowid DESC
+                                    LIMIT ?""", (*params, self.PAGE_SIZE)).fetchall()
+
+    def _filter_conditions(self, conn, conditions, params):
+        """Aggiunge alla query le condizioni dei filtri impostati"""
+        filters = self._filters
+        if filters.get("action"):
+            conditions.append("action = ?")
+            params.append(filters["action"])
+        # I timestamp sono stringhe yyyy-MM-dd HH:mm:ss: il confronto è lessicografico
+        if filters.get("date_from"):
+            conditions.append("timestamp >= ?")
+            params.append(filters["date_from"])
+        if filters.get("date_to"):
+            conditions.append("timestamp <= ?")
+            params.append(filters["date_to"] + " 23:59:59")
+        if filters.get("text"):
+            words = filters["text"].split()
+            if has_history_fts(conn):
+                # Ogni parola tra virgolette (niente sintassi FTS5 dall'utente) e come prefisso
+                query = " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+                conditions.append("rowid IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)")
+                params.append(query)
+            else:
+                for word in words:
+                    conditions.append("details LIKE ? ESCAPE '\\'")
+                    params.append("%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
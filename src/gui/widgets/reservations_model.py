@@ -0,0 +1,204 @@
+from PyQt5.QtWidgets import QStyledItemDelegate, QComboBox
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTime, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor
+
+# Colonne della griglia prenotazioni
+COL_TIME, COL_NAME, COL_SURNAME, COL_FIRST, COL_STATO = range(5)
+HEADERS = ["Orario", "Nome", "Cognome", "Prima Donazione", "Stato"]
+
+FIRST_DONATION_OPTIONS = ["No", "Sì"]
+STATO_OPTIONS = [
+    "Non effettuata",
+    "Sì",
+    "No",
+    "Non presentato",
+    "Donazione interrotta"
+]
+
+# Dalle 10:00 la prima donazione non è ammessa
+FIRST_DONATION_LIMIT = QTime(10, 0)
+
+class ReservationsModel(QAbstractTableModel):
+    """Modello delle prenotazioni di un giorno, una riga per orario
+
+    Ogni riga è una lista [time, name, surname, first_donation, stato].
+    Il modello conserva anche i valori caricati dal database per sapere
+    quali righe sono state modificate e vanno salvate.
+    """
+    # Emesso quando l'utente modifica una riga
+    row_edited = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._snapshot = {}
+        self._dirty_rows = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self._rows[index.row()]
+        column = index.column()
+
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if column == COL_FIRST:
+                return "Sì" if record[COL_FIRST] else "No"
+            return record[column]
+
+        if column == COL_FIRST and not self._first_donation_allowed(record):
+            if role == Qt.BackgroundRole:
+                return QColor("#f0f0f0")
+            if role == Qt.ForegroundRole:
+                return QColor("#666666")
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        column = index.column()
+        if column == COL_TIME:
+            return flags
+        if column == COL_FIRST and not self._first_donation_allowed(self._rows[index.row()]):
+            return flags
+        return flags | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        row = index.row()
+        column = index.column()
+
+        if column == COL_FIRST:
+            value = value == "Sì"
+        elif value is None:
+            value = ""
+
+        if self._rows[row][column] == value:
+            return False
+
+        self._rows[row][column] = value
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        self.mark_row_dirty(row)
+        self.row_edited.emit(row)
+        return True
+
+    def _first_donation_allowed(self, record):
+        return QTime.fromString(record[COL_TIME], "HH:mm") < FIRST_DONATION_LIMIT
+
+    # --- Caricamento e valori delle righe ---------------------------------
+
+    def set_records(self, records):
+        """Sostituisce le righe del modello e le considera già salvate
+
+        Args:
+            records: Lista di tuple (time, name, surname, first_donation, stato)
+        """
+        self.beginResetModel()
+        self._rows = [
+            [time, name or "", surname or "", bool(first_donation), stato or "Non effettuata"]
+            for time, name, surname, first_donation, stato in records
+        ]
+        self.endResetModel()
+        self.take_snapshot()
+
+    def clear(self):
+        """Svuota il modello"""
+        self.set_records([])
+
+    def times(self):
+        """Orari presenti nel modello, nell'ordine delle righe"""
+        return [record[COL_TIME] for record in self._rows]
+
+    def row_values(self, row):
+        """Restituisce (time, name, surname, first_donation, stato) di una riga"""
+        return tuple(self._rows[row])
+
+    def booked_rows(self):
+        """Righe con nome o cognome, nel formato usato da esportazione e stampa"""
+        return [
+            [time, name, surname, "Sì" if first_donation else "No", stato]
+            for time, name, surname, first_donation, stato in self._rows
+            if name.strip() or surname.strip()
+        ]
+
+    # --- Tracciamento delle modifiche -------------------------------------
+
+    def take_snapshot(self):
+        """Memorizza i valori attuali come già salvati"""
+        self._snapshot = {record[COL_TIME]: tuple(record[1:]) for record in self._rows}
+        self._dirty_rows.clear()
+
+    def mark_row_dirty(self, row):
+        """Aggiorna il flag di modifica della riga confrontandola con i valori salvati"""
+        time, *values = self._rows[row]
+        if self._snapshot.get(time) == tuple(values):
+            self._dirty_rows.discard(row)
+        else:
+            self._dirty_rows.add(row)
+
+    def has_changes(self):
+        """Verifica se ci sono righe modificate e non ancora salvate"""
+        return bool(self._dirty_rows)
+
+    def get_dirty_rows(self):
+        """Restituisce i valori delle righe modificate, nel formato di save_day_reservations"""
+        return [self.row_values(row) for row in sorted(self._dirty_rows)]
+
+    def mark_saved(self, rows):
+        """Registra come salvati i valori delle righe indicate"""
+        for time, *values in rows:
+            self._snapshot[time] = tuple(values)
+        # Le righe modificate di nuovo nel frattempo restano da salvare
+        for row in list(self._dirty_rows):
+            self.mark_row_dirty(row)
+
+    def reset_row(self, row):
+        """Svuota una riga eliminata dal database mantenendo l'orario"""
+        record = self._rows[row]
+        record[COL_NAME:] = ["", "", False, "Non effettuata"]
+        self._snapshot[record[COL_TIME]] = tuple(record[1:])
+        self._dirty_rows.discard(row)
+        self.dataChanged.emit(self.index(row, COL_NAME), self.index(row, COL_STATO))
+
+class ComboBoxDelegate(QStyledItemDelegate):
+    """Editor a tendina per una colonna con valori prefissati
+
+    La tendina viene creata solo durante la modifica della cella e la
+    scelta viene scritta nel modello appena selezionata.
+    """
+    def __init__(self, options, parent=None):
+        super().__init__(parent)
+        self.options = options
+
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems(self.options)
+        editor.activated.connect(lambda _: self._commit(editor))
+        # Apri subito la tendina: basta un clic per scegliere il valore
+        QTimer.singleShot(0, editor.showPopup)
+        return editor
+
+    def setEditorData(self, editor, index):
+        value = index.data(Qt.EditRole)
+        position = editor.findText(value)
+        if position >= 0:
+            editor.setCurrentIndex(position)
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentText(), Qt.EditRole)
+
+    def _commit(self, editor):
+        self.commitData.emit(editor)
+        self.closeEditor.emit(editor, QStyledItemDelegate.NoHint)
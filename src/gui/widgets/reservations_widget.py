@@ -1,19 +1,37 @@
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem, 
-                            QComboBox, QGroupBox, QMessageBox, QHBoxLayout, QPushButton,
-                            QDialog)
-from PyQt5.QtCore import QTime, Qt, QDate, QSize
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QTableView, QAbstractItemView,
+                            QGroupBox, QMessageBox, QDialog)
+from PyQt5.QtCore import QTime, QDate
 from core.logger import logger
-from core.database import get_reservations, add_reservation, save_donation_status, add_donation_time
-from datetime import datetime
-from core.database import delete_reservation_from_db
-from PyQt5.QtGui import QIcon
+from core.database import get_reservations, save_day_reservations, add_donation_time
+from gui.widgets.reservations_model import (ReservationsModel, ComboBoxDelegate,
+                                            FIRST_DONATION_OPTIONS, STATO_OPTIONS,
+                                            COL_FIRST, COL_STATO)
+
+# Fascia oraria della giornata di donazione, con slot ogni 5 minuti
+SLOT_START = QTime(7, 50)
+SLOT_END = QTime(12, 10)
+SLOT_MINUTES = 5
+SLOT_START_STR = SLOT_START.toString("HH:mm")
+SLOT_END_STR = SLOT_END.toString("HH:mm")
+
+def _default_times():
+    """Genera gli orari predefiniti (HH:mm) dall'apertura alla chiusura della fascia"""
+    times = []
+    current_time = SLOT_START
+    while current_time <= SLOT_END:
+        times.append(current_time.toString("HH:mm"))
+        current_time = current_time.addSecs(SLOT_MINUTES * 60)
+    return times
+
+DEFAULT_TIMES = _default_times()
 
 class ReservationsWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.main_window = parent
+        self.selected_date = self.main_window.calendar.selectedDate()
+        
         self.init_ui()
-        self.load_default_times()
         
     def init_ui(self):
         layout = QVBoxLayout(self)
@@ -22,11 +40,24 @@ class ReservationsWidget(QWidget):
         table_group = QGroupBox("Prenotazioni")
         table_layout = QVBoxLayout()
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels([
-            "Orario", "Nome", "Cognome", "Prima Donazione", "Stato"
-        ])
+        # Il modello tiene le prenotazioni e traccia le righe modificate;
+        # le tendine esistono solo mentre si modifica una cella
+        self.model = ReservationsModel(self)
+        self.model.row_edited.connect(self.on_row_edited)
+        
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.DoubleClicked |
+                                   QAbstractItemView.SelectedClicked |
+                                   QAbstractItemView.EditKeyPressed |
+                                   QAbstractItemView.AnyKeyPressed)
+        
+        self.first_delegate = ComboBoxDelegate(FIRST_DONATION_OPTIONS, self.table)
+        self.stato_delegate = ComboBoxDelegate(STATO_OPTIONS, self.table)
+        self.table.setItemDelegateForColumn(COL_FIRST, self.first_delegate)
+        self.table.setItemDelegateForColumn(COL_STATO, self.stato_delegate)
         
         # Imposta le dimensioni delle colonne
         self.table.setColumnWidth(0, 100)  # Orario
@@ -35,137 +66,40 @@ class ReservationsWidget(QWidget):
         self.table.setColumnWidth(3, 120)  # Prima Donazione
         self.table.setColumnWidth(4, 150)  # Stato
         
-        # Connetti solo il segnale cellChanged
-        self.table.cellChanged.connect(self.on_cell_changed)
-        
         table_layout.addWidget(self.table)
         table_group.setLayout(table_layout)
         layout.addWidget(table_group)
 
-    def load_default_times(self):
-        """Carica gli orari predefiniti nella tabella"""
-        try:
-            # Genera tutti gli orari possibili dalle 7:50 alle 12:10 con intervalli di 5 minuti
-            start_time = QTime(7, 50)
-            end_time = QTime(12, 10)
-            current_time = start_time
-            default_times = []
-            
-            while current_time <= end_time:
-                default_times.append(current_time.toString("HH:mm"))
-                current_time = current_time.addSecs(5 * 60)  # Aggiungi 5 minuti
-            
-            # Ottieni gli orari esistenti dal database
-            selected_date = self.main_window.calendar.selectedDate()
-            if isinstance(selected_date, str):
-                selected_date = QDate.fromString(selected_date, "yyyy-MM-dd")
-            
-            reservations = get_reservations(selected_date)
-            existing_times = [res[0] for res in reservations]
-            
-            # Unisci tutti gli orari
-            all_times = list(set(default_times + existing_times))
-            
-            # Converti in oggetti QTime per un ordinamento corretto
-            time_objects = [(QTime.fromString(t, "HH:mm"), t) for t in all_times]
-            time_objects.sort(key=lambda x: x[0])  # Ordina per orario
-            
-            # Filtra gli orari per mantenere solo quelli nel range desiderato
-            filtered_times = [t[1] for t in time_objects 
-                             if start_time <= t[0] <= end_time]
-            
-            # Popola la tabella
-            self.table.setRowCount(len(filtered_times))
-            for row, time in enumerate(filtered_times):
-                self.table.setItem(row, 0, QTableWidgetItem(time))
-                
-                # Aggiungi le combo box
-                self.setup_combo_boxes(row, time)
-                
-        except Exception as e:
-            logger.error(f"Errore nel caricamento degli orari predefiniti: {str(e)}")
-            QMessageBox.critical(
-                self,
-                "Errore",
-                f"Errore nel caricamento degli orari predefiniti: {str(e)}"
-            )
+    def on_row_edited(self, row):
+        """Salva subito le righe modificate dall'utente"""
+        self.save_changes()
 
-    def setup_combo_boxes(self, row, time):
-        """Configura le combo box per prima donazione e stato"""
-        # ComboBox per Prima Donazione
-        first_combo = QComboBox()
-        first_combo.addItems(["No", "Sì"])
-        
-        # Se l'orario è dalle 10:00 in poi, imposta "No" e disabilita il ComboBox
-        time_obj = QTime.fromString(time, "HH:mm")
-        if time_obj >= QTime(10, 0):
-            first_combo.setCurrentText("No")
-            first_combo.setEnabled(False)
-            first_combo.setStyleSheet("""
-                QComboBox {
-                    background-color: #f0f0f0;
-                    color: #666666;
-                }
-            """)
-        
-        self.table.setCellWidget(row, 3, first_combo)
-        
-        # ComboBox per lo Stato
-        stato_combo = QComboBox()
-        stato_combo.addItems([
-            "Non effettuata",
-            "Sì",
-            "No",
-            "Non presentato",
-            "Donazione interrotta"
-        ])
-        stato_combo.currentTextChanged.connect(
-            lambda text, r=row: self.on_status_changed(r, text)
-        )
-        self.table.setCellWidget(row, 4, stato_combo)
+    def row_values(self, row):
+        """Restituisce (time, name, surname, first_donation, stato) di una riga"""
+        return self.model.row_values(row)
 
-    def on_cell_changed(self, row, column):
-        """Gestisce i cambiamenti nelle celle della tabella"""
-        try:
-            if column in [1, 2]:  # Nome o Cognome
-                self.save_reservation(row)
-        except Exception as e:
-            logger.error(f"Errore nella gestione del cambio cella: {str(e)}")
+    def has_changes(self):
+        """Verifica se ci sono righe modificate e non ancora salvate"""
+        return self.model.has_changes()
 
-    def on_status_changed(self, row, new_status):
-        """Gestisce il cambio di stato di una donazione"""
-        try:
-            time = self.table.item(row, 0).text()
-            name = self.table.item(row, 1).text() if self.table.item(row, 1) else ""
-            surname = self.table.item(row, 2).text() if self.table.item(row, 2) else ""
-            
-            if name.strip() or surname.strip():
-                # Converti la data nel formato corretto
-                selected_date = self.main_window.calendar.selectedDate()
-                date_str = selected_date.toString("yyyy-MM-dd")
-                save_donation_status(date_str, time, new_status)
-                
-        except Exception as e:
-            logger.error(f"Errore nel salvataggio dello stato: {str(e)}")
-            QMessageBox.critical(
-                self,
-                "Errore",
-                f"Errore nel salvataggio dello stato: {str(e)}"
-            )
+    def get_dirty_rows(self):
+        """Restituisce i valori delle righe modificate, nel formato di save_day_reservations"""
+        return self.model.get_dirty_rows()
+
+    def mark_saved(self, rows):
+        """Registra come salvati i valori delle righe indicate"""
+        self.model.mark_saved(rows)
 
-    def save_reservation(self, row):
-        """Salva una prenotazione nel database"""
+    def save_changes(self):
+        """Salva nel database solo le righe modificate"""
+        rows = self.get_dirty_rows()
+        if not rows:
+            return True
         try:
-            time = self.table.item(row, 0).text()
-            name = self.table.item(row, 1).text() if self.table.item(row, 1) else ""
-            surname = self.table.item(row, 2).text() if self.table.item(row, 2) else ""
-            first_donation = self.table.cellWidget(row, 3).currentText() == "Sì"
-            
-            # Converti la data nel formato corretto
-            selected_date = self.main_window.calendar.selectedDate()
-            date_str = selected_date.toString("yyyy-MM-dd")
-            
-            add_reservation(date_str, time, name, surname, first_donation)
+            if not save_day_reservations(self.selected_date, rows):
+                raise RuntimeError("salvataggio non riuscito")
+            self.mark_saved(rows)
+            return True
             
         except Exception as e:
             logger.error(f"Errore nel salvataggio della prenotazione: {str(e)}")
@@ -174,51 +108,64 @@ class ReservationsWidget(QWidget):
                 "Errore",
                 f"Errore nel salvataggio della prenotazione: {str(e)}"
             )
+            return False
+
+    def reset_row(self, row):
+        """Svuota una riga eliminata dal database mantenendo l'orario"""
+        self.model.reset_row(row)
 
     def delete_reservation(self):
         """Elimina la prenotazione selezionata"""
         if self.main_window.database_manager.delete_reservation(
-            self.table,
-            self.table.currentRow()
+            self,
+            self.current_row()
         ):
             self.main_window.status_manager.show_message("Prenotazione eliminata", 3000)
 
+    def current_row(self):
+        """Restituisce la riga selezionata (-1 se nessuna)"""
+        index = self.table.currentIndex()
+        return index.row() if index.isValid() else -1
+
+    def get_booked_rows(self):
+        """Restituisce le righe prenotate per esportazione e stampa"""
+        return self.model.booked_rows()
+
     def clear_table(self):
         """Pulisce la tabella"""
-        self.table.setRowCount(0)
+        self.model.clear()
 
     def get_table(self):
-        """Restituisce la tabella delle prenotazioni"""
+        """Restituisce la vista delle prenotazioni"""
         return self.table
 
     def load_reservations(self, selected_date):
-        """Carica le prenotazioni per una data specifica"""
+        """Carica le prenotazioni per una data specifica
+        
+        Il database viene letto una sola volta: le prenotazioni salvate
+        vengono unite agli orari predefiniti tramite un dizionario per
+        orario e il modello viene popolato con un unico reset.
+        """
         try:
-            self.clear_table()
-            
             # Assicurati che selected_date sia un oggetto QDate
             if isinstance(selected_date, str):
                 selected_date = QDate.fromString(selected_date, "yyyy-MM-dd")
+            self.selected_date = selected_date
             
-            # Carica gli orari predefiniti e le prenotazioni esistenti
-            self.load_default_times()
+            # Prenotazioni salvate, indicizzate per orario
+            stored = {reservation[0]: reservation for reservation in get_reservations(selected_date)}
             
-            # Ottieni le prenotazioni dal database
-            reservations = get_reservations(selected_date)
+            # Orari predefiniti più quelli aggiunti a mano, entro la fascia della giornata
+            times = sorted(
+                time for time in set(DEFAULT_TIMES).union(stored)
+                if SLOT_START_STR <= time <= SLOT_END_STR
+            )
             
-            # Popola la tabella con le prenotazioni esistenti
-            for time, name, surname, first_donation, stato in reservations:
-                for row in range(self.table.rowCount()):
-                    if self.table.item(row, 0) and self.table.item(row, 0).text() == time:
-                        self.table.setItem(row, 1, QTableWidgetItem(name))
-                        self.table.setItem(row, 2, QTableWidgetItem(surname))
-                        
-                        first_combo = self.table.cellWidget(row, 3)
-                        first_combo.setCurrentText("Sì" if first_donation else "No")
-                        
-                        stato_combo = self.table.cellWidget(row, 4)
-                        stato_combo.setCurrentText(stato)
-                        break
+            # Da qui in poi si salvano solo le righe modificate
+            self.model.set_records([
+                stored.get(time, (time, "", "", False, "Non effettuata"))
+                for time in times
+            ])
                         
         except Exception as e:
             logger.error(f"Errore nel caricamento delle prenotazioni: {str(e)}")
@@ -235,16 +182,16 @@ class ReservationsWidget(QWidget):
         dialog = TimeEntryDialog(self)
         if dialog.exec_() == QDialog.Accepted:
             time = dialog.get_time()
-            date = self.main_window.calendar.selectedDate().toString("yyyy-MM-dd")
+            date = self.selected_date.toString("yyyy-MM-dd")
             if add_donation_time(date, time):
-                self.load_default_times()
+                self.load_reservations(self.selected_date)
                 self.main_window.calendar_manager.highlight_donation_dates()
 
     def save_reservations(self):
         """Salva le prenotazioni correnti"""
         if self.main_window.database_manager.save_reservations(
-            self.table,
-            self.main_window.calendar.selectedDate().toString("yyyy-MM-dd"),
+            self,
+            self.selected_date.toString("yyyy-MM-dd"),
             True
         ):
             self.main_window.status_manager.show_message("Salvataggio completato", 3000)
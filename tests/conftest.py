@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_PATH)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from core.connection_pool import close_connections
+from core.paths_manager import PathsManager
+
+
+@pytest.fixture(autouse=True)
+def config_path(tmp_path, monkeypatch):
+    """Cartella di configurazione temporanea (manifesto, hash dei blocchi, journal)"""
+    config = tmp_path / "config"
+    config.mkdir()
+    monkeypatch.setattr(PathsManager, "get_config_path", lambda self: str(config))
+    yield config
+    close_connections(str(tmp_path))
+
+
+@pytest.fixture
+def year_path(tmp_path):
+    """Cartella di un anno con i database di prova"""
+    path = tmp_path / "2025"
+    path.mkdir()
+    return path
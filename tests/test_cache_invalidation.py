@@ -0,0 +1,51 @@
+import time
+
+import pytest
+from watchdog.events import FileCreatedEvent, FileDeletedEvent, FileModifiedEvent
+from watchdog.observers import Observer
+
+import core.database as database
+from core.cache import get_reservation_cache
+from core.database import CacheInvalidationHandler
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(database, "invalidate_donation_path", lambda path: None)
+    cache = get_reservation_cache()
+    cache.clear()
+    cache.set("2025-03-05", [("08:00",)])
+    cache.set("2025-03-06", [("08:00",)])
+    yield cache
+    cache.clear()
+
+
+def test_side_files_of_open_and_close_are_ignored(cache, year_path):
+    handler = CacheInvalidationHandler()
+    db_path = str(year_path / "prenotazioni_05_03.db")
+    handler.dispatch(FileCreatedEvent(db_path + "-wal"))
+    handler.dispatch(FileModifiedEvent(db_path + "-shm"))
+    handler.dispatch(FileDeletedEvent(db_path + "-wal"))
+    assert "2025-03-05" in cache
+
+
+def test_wal_write_invalidates_its_day(cache, year_path):
+    CacheInvalidationHandler().dispatch(FileModifiedEvent(str(year_path / "prenotazioni_05_03.db-wal")))
+    assert "2025-03-05" not in cache
+    assert "2025-03-06" in cache
+
+
+def test_observer_invalidates_changed_file(cache, year_path):
+    observer = Observer()
+    observer.schedule(CacheInvalidationHandler(), str(year_path.parent), recursive=True)
+    observer.start()
+    try:
+        (year_path / "prenotazioni_06_03.db").write_bytes(b"x")
+        deadline = time.monotonic() + 5
+        while "2025-03-06" in cache and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        observer.stop()
+        observer.join()
+    assert "2025-03-06" not in cache
+    assert "2025-03-05" in cache
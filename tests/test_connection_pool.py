@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from core.connection_pool import ConnectionPool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(ConnectionPool, "MAX_OPEN_PER_PATH", 2)
+    monkeypatch.setattr(ConnectionPool, "MAX_OPEN_TOTAL", 3)
+    monkeypatch.setattr(ConnectionPool, "ACQUIRE_TIMEOUT", 0.2)
+    pool = ConnectionPool()
+    yield pool
+    pool.close_all()
+
+
+def test_idle_connection_is_reused(pool, tmp_path):
+    path = str(tmp_path / "a.db")
+    conn = pool.acquire(path)
+    pool.release(path, conn)
+    assert pool.acquire(path) is conn
+
+
+def test_open_connections_per_path_are_bounded(pool, tmp_path):
+    path = str(tmp_path / "a.db")
+    held = [pool.acquire(path), pool.acquire(path)]
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire(path)
+
+    # Un'attesa termina quando un'altra connessione viene restituita
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(pool.acquire(path)))
+    waiter.start()
+    pool.release(path, held.pop())
+    waiter.join()
+    assert len(result) == 1
+    for conn in held + result:
+        pool.release(path, conn)
+
+
+def test_total_limit_closes_idle_connections_of_other_paths(pool, tmp_path):
+    first, second, third = (str(tmp_path / f"{name}.db") for name in "abc")
+    a = pool.acquire(first)
+    b = pool.acquire(second)
+    pool.release(second, b)
+    c = pool.acquire(first)
+
+    # Limite totale raggiunto: la connessione inattiva di second lascia il posto
+    d = pool.acquire(third)
+    assert pool._open_count == {os.path.abspath(first): 2, os.path.abspath(third): 1}
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire(second)
+    for path, conn in ((first, a), (first, c), (third, d)):
+        pool.release(path, conn)
+
+
+
+def test_exclusive_waits_for_connections_in_use(pool, tmp_path):
+    path = str(tmp_path / "a.db")
+    conn = pool.acquire(path)
+    with pytest.raises(sqlite3.OperationalError):
+        with pool.exclusive(path):
+            pass
+
+    events = []
+
+    def hold():
+        with pool.exclusive(path):
+            events.append("exclusive")
+            # Le acquire sul percorso attendono la fine del blocco
+            assert pool._open_count.get(os.path.abspath(path), 0) == 0
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    pool.release(path, conn)
+    thread.join()
+    assert events == ["exclusive"]
+    pool.release(path, pool.acquire(path))
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+import core.delta_sync as delta_sync
+from core.delta_sync import delta_copy
+
+
+def test_delta_copy_round_trip(tmp_path):
+    source = tmp_path / "source.bin"
+    dest = tmp_path / "dest.bin"
+    data = bytearray(os.urandom(64 * 1024 * 8))
+    source.write_bytes(data)
+
+    assert delta_copy(str(source), str(dest)) == (8, 8)
+    assert dest.read_bytes() == data
+
+    data[70000:70010] = b"x" * 10
+    data += b"coda"
+    source.write_bytes(data)
+    assert delta_copy(str(source), str(dest)) == (2, 9)
+    assert dest.read_bytes() == data
+    assert os.stat(dest).st_mtime_ns == os.stat(source).st_mtime_ns
+
+    # Ritorno: file più corto, un blocco cambiato
+    changed = bytearray(data[:64 * 1024 * 4])
+    changed[:5] = b"ZZZZZ"
+    dest.write_bytes(changed)
+    assert delta_copy(str(dest), str(source)) == (1, 4)
+    assert source.read_bytes() == changed
+    assert delta_copy(str(dest), str(source)) == (0, 4)
+
+
+def test_failed_copy_leaves_dest_untouched(tmp_path, monkeypatch):
+    source = tmp_path / "source.bin"
+    dest = tmp_path / "dest.bin"
+    original = os.urandom(64 * 1024 * 4)
+    dest.write_bytes(original)
+    source.write_bytes(b"Y" * len(original))
+
+    def interrupted(src, dst):
+        raise OSError("interrotta")
+
+    # La sostituzione è una rinomina atomica: fino a lì dest non cambia
+    monkeypatch.setattr(delta_sync.os, "replace", interrupted)
+    with pytest.raises(OSError):
+        delta_copy(str(source), str(dest))
+    assert dest.read_bytes() == original
+    assert sorted(os.listdir(tmp_path)) == ["config", "dest.bin", "source.bin"]
@@ -0,0 +1,53 @@
+import os
+import sqlite3
+
+import pytest
+
+from core.file_manifest import FileManifest, hash_file
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return FileManifest(str(tmp_path / "config" / "sync_manifest.db"))
+
+
+def test_unchanged_file_is_not_rehashed(manifest, tmp_path):
+    path = tmp_path / "dati.bin"
+    path.write_bytes(b"contenuto")
+    digest = manifest.file_hash(str(path))
+    assert manifest.file_hash(str(path)) == digest
+    assert (manifest.hits, manifest.misses) == (1, 1)
+
+
+def test_writes_in_wal_change_the_hash(manifest, year_path):
+    db_path = str(year_path / "prenotazioni_05_03.db")
+    writer = sqlite3.connect(db_path)
+    writer.execute("PRAGMA journal_mode=WAL")
+    writer.execute("PRAGMA wal_autocheckpoint=0")
+    writer.execute("CREATE TABLE t (x)")
+    writer.commit()
+    before = manifest.file_hash(db_path)
+    main_stat = os.stat(db_path)
+
+    writer.execute("INSERT INTO t VALUES (1)")
+    writer.commit()
+    # La scrittura è solo nel -wal: il file principale non è cambiato
+    assert os.stat(db_path).st_mtime_ns == main_stat.st_mtime_ns
+    after = manifest.file_hash(db_path)
+    assert after != before
+    assert after == hash_file(db_path)
+    writer.close()
+
+
+def test_forgotten_and_missing_files_are_dropped(manifest, tmp_path):
+    kept, removed = tmp_path / "a.bin", tmp_path / "b.bin"
+    kept.write_bytes(b"a")
+    removed.write_bytes(b"b")
+    manifest.file_hash(str(kept))
+    manifest.file_hash(str(removed))
+    removed.unlink()
+
+    reloaded = FileManifest(manifest.db_path)
+    assert list(reloaded._entries_map()) == [str(kept)]
+    reloaded.forget(str(kept))
+    assert FileManifest(manifest.db_path)._entries_map() == {}
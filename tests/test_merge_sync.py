@@ -0,0 +1,140 @@
+import sqlite3
+
+import pytest
+
+import core.merge_sync as merge_sync
+from core.database import get_db_connection
+from core.merge_sync import MERGE_TABLES, merge_pair
+from core.schema import ensure_schema
+
+RESERVATIONS = MERGE_TABLES["prenotazioni"][0]
+DONATION_DATES = MERGE_TABLES["date_donazione"][0]
+
+
+def _open(path):
+    conn = sqlite3.connect(str(path))
+    ensure_schema(conn, str(path))
+    return conn
+
+
+def _reserve(conn, time, name, updated_at, stato="Non effettuata"):
+    conn.execute("""INSERT OR REPLACE INTO reservations (time, name, surname, stato, updated_at)
+                    VALUES (?, ?, 'x', ?, ?)""", (time, name, stato, updated_at))
+    conn.commit()
+
+
+def _merge(table_merge, main_path, other_path):
+    conn = _open(main_path)
+    conn.execute("ATTACH DATABASE ? AS other", (str(other_path),))
+    changed = table_merge.merge(conn)
+    conn.commit()
+    conn.execute("DETACH DATABASE other")
+    conn.close()
+    return changed
+
+
+def _rows(path, table="reservations", columns="time, name"):
+    conn = sqlite3.connect(str(path))
+    rows = conn.execute(f"SELECT {columns} FROM {table} ORDER BY 1").fetchall()
+    conn.close()
+    return rows
+
+
+@pytest.fixture
+def copies(year_path):
+    local = year_path / "local_prenotazioni_05_03.db"
+    cloud = year_path / "prenotazioni_05_03.db"
+    for path in (local, cloud):
+        _open(path).close()
+    return local, cloud
+
+
+def test_newer_update_wins(copies):
+    local, cloud = copies
+    with _open(local) as conn:
+        _reserve(conn, "08:00", "Mario", "2025-03-01 10:00:00")
+    with _open(cloud) as conn:
+        _reserve(conn, "08:00", "Anna", "2025-03-01 11:00:00")
+
+    assert _merge(RESERVATIONS, local, cloud) == [("08:00",)]
+    assert _merge(RESERVATIONS, cloud, local) == []
+    assert _rows(local) == _rows(cloud) == [("08:00", "Anna")]
+
+
+def test_tie_picks_the_same_row_on_both_sides(copies):
+    local, cloud = copies
+    with _open(local) as conn:
+        _reserve(conn, "08:00", "Mario", "2025-03-01 10:00:00")
+    with _open(cloud) as conn:
+        _reserve(conn, "08:00", "Anna", "2025-03-01 10:00:00")
+
+    _merge(RESERVATIONS, local, cloud)
+    _merge(RESERVATIONS, cloud, local)
+    assert _rows(local) == _rows(cloud)
+    # A parità di istante vince il contenuto maggiore, in entrambe le direzioni
+    assert _rows(local) == [("08:00", "Mario")]
+
+
+def test_deletion_after_update_wins(copies):
+    local, cloud = copies
+    for path in copies:
+        with _open(path) as conn:
+            _reserve(conn, "08:00", "Mario", "2025-03-01 10:00:00")
+    with _open(local) as conn:
+        conn.execute("DELETE FROM reservations WHERE time = '08:00'")
+        conn.commit()
+
+    _merge(RESERVATIONS, cloud, local)
+    _merge(RESERVATIONS, local, cloud)
+    assert _rows(local) == _rows(cloud) == []
+    assert _rows(cloud, "deleted_reservations", "time") == [("08:00",)]
+
+
+def test_update_after_deletion_wins(copies):
+    local, cloud = copies
+    for path in copies:
+        with _open(path) as conn:
+            _reserve(conn, "08:00", "Mario", "2025-03-01 10:00:00")
+    with _open(local) as conn:
+        conn.execute("DELETE FROM reservations WHERE time = '08:00'")
+        conn.commit()
+    with _open(cloud) as conn:
+        _reserve(conn, "08:00", "Anna", "2999-01-01 00:00:00")
+
+    _merge(RESERVATIONS, local, cloud)
+    _merge(RESERVATIONS, cloud, local)
+    assert _rows(local) == _rows(cloud) == [("08:00", "Anna")]
+    assert _rows(local, "deleted_reservations", "time") == []
+
+
+def test_rows_without_content_are_not_replaced(year_path):
+    local = year_path / "local_date_donazione_2025.db"
+    cloud = year_path / "date_donazione_2025.db"
+    with _open(local) as conn:
+        conn.execute("""INSERT INTO donation_dates (date, year, created_at)
+                        VALUES ('2025-03-05', 2025, '2025-01-01 10:00:00')""")
+        conn.commit()
+    with _open(cloud) as conn:
+        conn.executemany("INSERT INTO donation_dates (date, year, created_at) VALUES (?, 2025, ?)",
+                         [("2025-03-05", "2025-02-01 10:00:00"), ("2025-04-02", "2025-02-01 10:00:00")])
+        conn.commit()
+
+    assert _merge(DONATION_DATES, local, cloud) == [("2025-04-02",)]
+    assert _rows(local, "donation_dates", "date, created_at") == [
+        ("2025-03-05", "2025-01-01 10:00:00"), ("2025-04-02", "2025-02-01 10:00:00")]
+
+
+def test_merge_pair_updates_stats_of_each_copy(copies, monkeypatch):
+    monkeypatch.setattr(merge_sync, "is_yearly_storage", lambda: False)
+    local, cloud = copies
+    with get_db_connection(str(local)) as conn:
+        _reserve(conn, "08:00", "Mario", "2025-03-01 10:00:00", stato="Sì")
+    with get_db_connection(str(cloud)) as conn:
+        _reserve(conn, "08:15", "Anna", "2025-03-01 10:00:00")
+
+    assert merge_pair(str(local), str(cloud)) == (1, 1)
+    for prefix in ("local_", ""):
+        stats = _rows(local.parent / f"{prefix}hemodos_2025.db", "annual_stats",
+                      "date, total_donations, completed_donations")
+        assert stats == [("2025-03-05", 2, 1)]
+    assert merge_pair(str(local), str(cloud)) == (0, 0)
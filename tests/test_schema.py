@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+
+import pytest
+
+from core.schema import MIGRATIONS, ensure_schema
+
+DB_NAMES = {
+    "prenotazioni": "prenotazioni_05_03.db",
+    "hemodos": "hemodos_2025.db",
+    "cronologia": "cronologia_2025.db",
+    "date_donazione": "date_donazione_2025.db",
+}
+
+
+def _schema(conn):
+    return conn.execute("""SELECT type, name, sql FROM sqlite_master
+                           WHERE name NOT LIKE 'sqlite_%' ORDER BY type, name""").fetchall()
+
+
+def _user_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+@pytest.mark.parametrize("kind", sorted(MIGRATIONS))
+def test_ensure_schema_twice_is_noop(year_path, kind):
+    db_path = str(year_path / DB_NAMES[kind])
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn, db_path)
+    schema = _schema(conn)
+    assert _user_version(conn) == len(MIGRATIONS[kind])
+
+    ensure_schema(conn, db_path)
+    assert _schema(conn) == schema
+    assert _user_version(conn) == len(MIGRATIONS[kind])
+    conn.close()
+
+
+def test_ensure_schema_keeps_migrated_rows(year_path):
+    db_path = str(year_path / DB_NAMES["prenotazioni"])
+    conn = sqlite3.connect(db_path)
+    # Struttura di init_db: chiave id e più righe per lo stesso orario
+    conn.execute("""CREATE TABLE reservations
+                    (id INTEGER PRIMARY KEY, time TEXT, name TEXT, surname TEXT)""")
+    conn.executemany("INSERT INTO reservations (time, name, surname) VALUES (?, ?, ?)",
+                     [("08:00", "Mario", "Rossi"), ("08:00", "Anna", "Bianchi"),
+                      ("08:15", "Luca", "Verdi")])
+    conn.commit()
+
+    ensure_schema(conn, db_path)
+    rows = conn.execute("SELECT time, name, surname FROM reservations ORDER BY time").fetchall()
+    assert rows == [("08:00", "Anna", "Bianchi"), ("08:15", "Luca", "Verdi")]
+
+    ensure_schema(conn, db_path)
+    assert conn.execute("SELECT time, name, surname FROM reservations ORDER BY time").fetchall() == rows
+    conn.close()
+
+
+def test_ensure_schema_concurrent_connections(year_path):
+    db_path = str(year_path / DB_NAMES["hemodos"])
+    errors = []
+
+    def migrate():
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            ensure_schema(conn, db_path)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=migrate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    conn = sqlite3.connect(db_path)
+    assert _user_version(conn) == len(MIGRATIONS["hemodos"])
+    conn.close()
+
+
+def test_unknown_file_is_left_alone(tmp_path):
+    db_path = str(tmp_path / "settings.db")
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn, db_path)
+    assert _schema(conn) == []
+    assert _user_version(conn) == 0
+    conn.close()
@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+import time
+
+from core.database import get_db_connection
+from core.snapshot import snapshot_copy
+
+
+def _count(path):
+    with get_db_connection(str(path)) as conn:
+        return conn.execute("SELECT COUNT(*) FROM reservations").fetchone()[0]
+
+
+def _insert(path, start, count):
+    with get_db_connection(str(path)) as conn:
+        conn.executemany("INSERT INTO reservations (time, name, surname) VALUES (?, 'n', 's')",
+                         [(f"t{i:05d}",) for i in range(start, start + count)])
+
+
+def test_snapshot_round_trip_on_live_wal_database(year_path):
+    local = year_path / "local_prenotazioni_05_03.db"
+    cloud = year_path / "prenotazioni_05_03.db"
+    _insert(local, 0, 100)
+    _insert(cloud, 0, 1)
+    assert os.path.exists(f"{local}-wal")
+
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        start = 100
+        while not stop.is_set():
+            _insert(local, start, 10)
+            start += 10
+
+    def reader():
+        # Connessioni del pool su dest in uso durante le copie
+        while not stop.is_set():
+            try:
+                with get_db_connection(str(cloud)) as conn:
+                    if conn.execute("PRAGMA quick_check").fetchone() != ("ok",):
+                        errors.append("quick_check")
+                    time.sleep(0.01)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(5):
+            snapshot_copy(str(local), str(cloud))
+            # L'istantanea corrisponde a una transazione completa
+            assert _count(cloud) % 10 == 0 and 100 <= _count(cloud)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert not errors
+
+    snapshot_copy(str(local), str(cloud))
+    assert _count(cloud) == _count(local)
+    assert os.stat(cloud).st_mtime_ns == os.stat(local).st_mtime_ns
+
+    # Ritorno: le modifiche della copia cloud arrivano a quella locale
+    _insert(cloud, 100000, 5)
+    snapshot_copy(str(cloud), str(local))
+    assert _count(local) == _count(cloud)
+    with get_db_connection(str(local)) as conn:
+        assert conn.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+    assert not [name for name in os.listdir(year_path) if name.startswith(".snapshot_")]
+
+
+def test_snapshot_copy_rewrites_only_changed_blocks(year_path):
+    local = year_path / "local_prenotazioni_05_03.db"
+    cloud = year_path / "prenotazioni_05_03.db"
+    _insert(local, 0, 2000)
+    snapshot_copy(str(local), str(cloud))
+
+    _insert(local, 5000, 1)
+    written, total = snapshot_copy(str(local), str(cloud))
+    assert 0 < written < total
+    assert _count(cloud) == 2001
+
+    # Nessun -wal del file vecchio accanto a quello nuovo
+    conn = sqlite3.connect(str(cloud))
+    assert conn.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+    conn.close()
+
+
+def test_snapshot_checkpoints_source_wal(year_path):
+    local = year_path / "local_prenotazioni_05_03.db"
+    cloud = year_path / "prenotazioni_05_03.db"
+    _insert(local, 0, 1)
+    writer = sqlite3.connect(str(local))
+    writer.execute("PRAGMA wal_autocheckpoint=0")
+    writer.executemany("INSERT INTO reservations (time, name, surname) VALUES (?, 'n', 's')",
+                       [(f"w{i:05d}",) for i in range(2000)])
+    writer.commit()
+    size = os.path.getsize(local)
+
+    snapshot_copy(str(local), str(cloud))
+    # Le pagine del WAL sono tornate nel file principale
+    assert os.path.getsize(local) > size
+    assert _count(cloud) == 2001
+    writer.close()
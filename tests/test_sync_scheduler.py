@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+import core.merge_sync as merge_sync
+from core.database import get_db_connection
+from core.merge_sync import merge_pair
+from core.sync_scheduler import SyncScheduler
+
+
+@pytest.fixture
+def scheduler_factory(monkeypatch):
+    monkeypatch.setattr(merge_sync, "is_yearly_storage", lambda: False)
+    monkeypatch.setattr(SyncScheduler, "DEBOUNCE", 0.1)
+    schedulers = []
+
+    def create(folder, sync_pair):
+        scheduler = SyncScheduler(str(folder), sync_pair)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield create
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+def _reserve(path, time_slot, name):
+    with get_db_connection(str(path)) as conn:
+        conn.execute("""INSERT OR REPLACE INTO reservations (time, name, surname, updated_at)
+                        VALUES (?, ?, 'x', '2025-03-01 10:00:00')""", (time_slot, name))
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_noop_merge_does_not_reschedule(year_path, scheduler_factory):
+    local = year_path / "local_prenotazioni_05_03.db"
+    cloud = year_path / "prenotazioni_05_03.db"
+    _reserve(local, "08:00", "Mario")
+    _reserve(cloud, "08:15", "Anna")
+
+    results = []
+    lock = threading.Lock()
+
+    def sync_pair(local_path, cloud_path):
+        changed = merge_pair(local_path, cloud_path)
+        # L'unione aggiorna anche le statistiche in hemodos_2025.db, sincronizzato a parte
+        if cloud_path == str(cloud):
+            with lock:
+                results.append(changed)
+
+    scheduler = scheduler_factory(year_path, sync_pair)
+    scheduler.start()
+    assert _wait_for(lambda: results)
+    # Le scritture dell'unione generano eventi, ma le copie sono già allineate
+    time.sleep(1.5)
+    assert results[0] == (1, 1)
+    assert all(changed == (0, 0) for changed in results[1:])
+    print("RESULTS", results)
+    assert len(results) <= 2
+
+    # Una modifica vera viene ancora sincronizzata
+    synced = len(results)
+    _reserve(local, "09:00", "Luca")
+    assert _wait_for(lambda: len(results) > synced)
+    assert results[synced] == (1, 0)
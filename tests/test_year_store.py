@@ -0,0 +1,100 @@
+import sqlite3
+
+import pytest
+
+import core.year_store as year_store
+from core.database import get_db_connection
+from core.year_store import get_migration_status, migrate_daily_databases
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def year_db(year_path, monkeypatch):
+    monkeypatch.setattr(year_store, "get_base_path", lambda: str(year_path.parent))
+    path = year_path / "hemodos_2025.db"
+    monkeypatch.setattr(year_store, "get_year_db_path", lambda year: str(path))
+    return path
+
+
+def _daily_file(year_path, day, month, rows):
+    """File giornaliero con lo schema ad id di init_db (più righe per orario)"""
+    conn = sqlite3.connect(str(year_path / f"prenotazioni_{day}_{month}.db"))
+    conn.execute("""CREATE TABLE reservations
+                    (id INTEGER PRIMARY KEY, time TEXT, name TEXT, surname TEXT)""")
+    conn.executemany("INSERT INTO reservations (time, name, surname) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def _reservations(year_db):
+    with get_db_connection(str(year_db)) as conn:
+        return conn.execute("SELECT date, time, name FROM reservations ORDER BY date, time").fetchall()
+
+
+def _markers(year_db):
+    with get_db_connection(str(year_db)) as conn:
+        return conn.execute("SELECT filename, rows_imported FROM migrated_files ORDER BY filename").fetchall()
+
+
+def test_migration_imports_latest_row_per_slot(year_path, year_db):
+    _daily_file(year_path, "05", "03", [("08:00", "Mario", "Rossi"), ("08:00", "Anna", "Bianchi"),
+                                        ("08:15", "Luca", "Verdi")])
+    _daily_file(year_path, "02", "04", [("09:00", "Sara", "Neri")])
+
+    assert get_migration_status(2025) == (0, 2)
+    assert migrate_daily_databases(2025) == 3
+    assert _reservations(year_db) == [("2025-03-05", "08:00", "Anna"), ("2025-03-05", "08:15", "Luca"),
+                                      ("2025-04-02", "09:00", "Sara")]
+    assert _markers(year_db) == [("prenotazioni_02_04.db", 1), ("prenotazioni_05_03.db", 2)]
+    assert get_migration_status(2025) == (2, 2)
+
+
+def test_migration_resumes_after_interruption(year_path, year_db):
+    _daily_file(year_path, "05", "03", [("08:00", "Mario", "Rossi")])
+    _daily_file(year_path, "02", "04", [("09:00", "Sara", "Neri")])
+    _daily_file(year_path, "07", "05", [("10:00", "Luca", "Verdi")])
+
+    def stop_after_first(done, total):
+        if done == 1:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        migrate_daily_databases(2025, stop_after_first)
+    assert _markers(year_db) == [("prenotazioni_05_03.db", 1)]
+    assert get_migration_status(2025) == (1, 3)
+
+    progress = []
+    assert migrate_daily_databases(2025, lambda done, total: progress.append((done, total))) == 2
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+    assert len(_reservations(year_db)) == 3
+    assert get_migration_status(2025) == (3, 3)
+
+
+def test_failed_file_is_rolled_back_without_marker(year_path, year_db):
+    _daily_file(year_path, "05", "03", [("08:00", "Mario", "Rossi")])
+    broken = year_path / "prenotazioni_02_04.db"
+    broken.write_bytes(b"non un database" * 100)
+
+    # Il file già importato resta; quello illeggibile non ha marcatore né righe
+    with pytest.raises(sqlite3.DatabaseError):
+        migrate_daily_databases(2025)
+    assert _markers(year_db) == [("prenotazioni_05_03.db", 1)]
+    assert _reservations(year_db) == [("2025-03-05", "08:00", "Mario")]
+
+    broken.unlink()
+    _daily_file(year_path, "02", "04", [("09:00", "Sara", "Neri")])
+    assert migrate_daily_databases(2025) == 1
+    assert get_migration_status(2025) == (2, 2)
+
+
+def test_migration_keeps_existing_rows(year_path, year_db):
+    with get_db_connection(str(year_db)) as conn:
+        conn.execute("""INSERT INTO reservations (date, time, name, surname)
+                        VALUES ('2025-03-05', '08:00', 'Giulia', 'Blu')""")
+    _daily_file(year_path, "05", "03", [("08:00", "Mario", "Rossi"), ("08:15", "Luca", "Verdi")])
+
+    assert migrate_daily_databases(2025) == 1
+    assert _reservations(year_db) == [("2025-03-05", "08:00", "Giulia"), ("2025-03-05", "08:15", "Luca")]